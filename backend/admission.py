@@ -0,0 +1,143 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when work is turned away because its budget is exhausted; the
+    client should retry after `retry_after` seconds.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Budget:
+    __slots__ = ('limit', 'max_queue', 'in_flight', 'waiting', 'admitted', 'rejected', 'cond')
+
+    def __init__(self, limit, max_queue):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {'queue_full': 0, 'timeout': 0}
+        self.cond = threading.Condition()
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how much LDAP work of each kind runs at once. `budgets` maps a name
+    ('read', 'write', 'bulk') to its (concurrency limit, most callers allowed to
+    queue). A caller over the limit waits up to `timeout` seconds for a slot;
+    when the queue is already full, or the wait times out, AdmissionRejected
+    is raised instead, so an overloaded DC sheds load rather than slowing
+    every request down together.
+    """
+
+    def __init__(self, budgets, timeout=2.0):
+        self.timeout = timeout
+        self._budgets = {name: _Budget(limit, max_queue) for name, (limit, max_queue) in budgets.items()}
+
+    @contextmanager
+    def slot(self, name, timeout=-1):
+        """
+        Holds one slot of budget `name` for the duration of the block. timeout=None waits
+        as long as it takes (for background work); by default the limiter's timeout applies.
+        """
+        budget = self._budgets[name]
+        if budget.limit <= 0:
+            # A limit of 0 leaves the budget unlimited
+            yield
+            return
+        timeout = self.timeout if timeout == -1 else timeout
+        with budget.cond:
+            if budget.in_flight >= budget.limit:
+                if budget.waiting >= budget.max_queue and timeout is not None:
+                    budget.rejected['queue_full'] += 1
+                    raise AdmissionRejected(f"Too many queued {name} requests", self.retry_after())
+                deadline = None if timeout is None else time.monotonic() + timeout
+                budget.waiting += 1
+                try:
+                    while budget.in_flight >= budget.limit:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            budget.rejected['timeout'] += 1
+                            raise AdmissionRejected(f"No {name} capacity within {timeout}s", self.retry_after())
+                        budget.cond.wait(remaining)
+                finally:
+                    budget.waiting -= 1
+            budget.in_flight += 1
+            budget.admitted += 1
+        try:
+            yield
+        finally:
+            with budget.cond:
+                budget.in_flight -= 1
+                budget.cond.notify()
+
+    def retry_after(self):
+        return max(1, math.ceil(self.timeout))
+
+    def stats(self):
+        stats = {}
+        for name, budget in self._budgets.items():
+            with budget.cond:
+                stats[name] = {
+                    'limit': budget.limit,
+                    'in_flight': budget.in_flight,
+                    'queued': budget.waiting,
+                    'max_queue': budget.max_queue,
+                    'admitted': budget.admitted,
+                    'rejected': dict(budget.rejected),
+                }
+        return stats
+
+
+class RateLimiter:
+    """
+    Per-client token buckets: each client may make `rate` requests per second
+    on average and up to `burst` at once. Buckets of the least recently seen
+    clients are forgotten beyond `max_clients`; a forgotten client starts
+    again with a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, monotonic time of last refill)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def take(self, client):
+        """
+        Spends one token of `client`. Returns 0 when the request may go ahead,
+        otherwise the seconds until the bucket has a token again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'clients': len(self._buckets), 'limited': self.limited}
@@ -1,17 +1,53 @@
+import contextvars
+import functools
+import logging
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import click
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
-from ldap3 import Server, Connection, ALL, SUBTREE, MODIFY_ADD, MODIFY_DELETE, MODIFY_REPLACE, Tls
+from flask import Flask, Response, g, has_request_context, request, jsonify, make_response, send_file, stream_with_context
+from ldap3 import Server, ServerPool, Connection, ALL, BASE, FIRST, NONE, SUBTREE, MODIFY_ADD, MODIFY_DELETE, MODIFY_REPLACE, Tls
+from ldap3.utils.conv import escape_filter_chars
 import ssl
 from flask_cors import CORS
+from ldap_pool import LDAPConnectionPool, PoolTimeoutError
+from admission import AdmissionRejected, ConcurrencyLimiter, RateLimiter
+from singleflight import SingleFlight
+from dc_pool import DomainControllerPool
+from logs import configure_logging
+from metrics import (Gauge, Histogram, RequestStats, current_request_stats, instrument_connection,
+                     record_operation, registry)
+from schema_cache import ServerInfoCache
+from cache import DirectoryCache
+from replica import DirectoryReplica
+from membership import MembershipGraph
+from bulk import BulkRowError, parse_rows, validate_row
+from resolver import DNResolver
+from members import domain_root, iter_member_ranges, member_page
+from paging import InvalidCursorError, cursor_server, decode_cursor, encode_cursor, iter_search_pages, search_page
+from search import query_filter, query_scope
+from etags import directory_version, make_etag
+from jobs import JobCancelled, JobQueue, JobTask
+from export import check_format, file_name, iter_export, media_type, FORMATS as EXPORT_FORMATS
+from serializer import FastJSONProvider, entry_to_dict, search_entries
+from util import user_search_attributes, group_search_attributes
 
 # Initialize the Flask app and enable CORS for front-end access
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Load environment variables from a .env file
 load_dotenv()
 
+# Structured logging: JSON lines on stderr (LOG_FORMAT=text for plain text)
+configure_logging(os.environ.get("LOG_LEVEL", "INFO"), os.environ.get("LOG_FORMAT", "json"))
+logger = logging.getLogger(__name__)
+
 # LDAP configuration from environment variables
 try:
     USER_DN = os.environ["USER_DN"]
@@ -23,173 +59,1107 @@ try:
     # Optional: UPN suffix for userPrincipalName (e.g., 'leapad.com')
     UPN_SUFFIX = os.environ.get("UPN_SUFFIX")
 except KeyError as e:
-    print(f"Error: Missing environment variable {e}")
+    logger.error("Missing environment variable %s", e)
     exit(1)
 
-def get_ldap_connection():
+# Connection pool tuning (all optional)
+LDAP_POOL_SIZE = int(os.environ.get("LDAP_POOL_SIZE", "10"))
+LDAP_POOL_IDLE_TIMEOUT = int(os.environ.get("LDAP_POOL_IDLE_TIMEOUT", "300"))
+LDAP_POOL_MAX_LIFETIME = int(os.environ.get("LDAP_POOL_MAX_LIFETIME", "3600"))
+LDAP_POOL_ACQUIRE_TIMEOUT = int(os.environ.get("LDAP_POOL_ACQUIRE_TIMEOUT", "10"))
+LDAP_POOL_HEALTH_CHECK_INTERVAL = int(os.environ.get("LDAP_POOL_HEALTH_CHECK_INTERVAL", "30"))
+# Connections that write (and reads right after a write) use their own, smaller pool
+LDAP_WRITE_POOL_SIZE = int(os.environ.get("LDAP_WRITE_POOL_SIZE", "5"))
+
+# Domain controllers: SERVER_ADDRESS may list several, comma-separated. Reads go to healthy
+# DCs by LDAP_SERVER_SELECTION ('fastest', 'round_robin' or 'first'); writes stay on one DC,
+# and reads follow it for LDAP_REPLICATION_PIN seconds after a write. Every DC is probed
+# each LDAP_SERVER_CHECK_INTERVAL seconds, and a probe or connect slower than
+# LDAP_CONNECT_TIMEOUT seconds counts as down.
+LDAP_SERVERS = [host.strip() for host in LDAP_SERVER.split(',') if host.strip()]
+LDAP_SERVER_SELECTION = os.environ.get("LDAP_SERVER_SELECTION", "fastest")
+LDAP_SERVER_CHECK_INTERVAL = int(os.environ.get("LDAP_SERVER_CHECK_INTERVAL", "10"))
+LDAP_REPLICATION_PIN = int(os.environ.get("LDAP_REPLICATION_PIN", "30"))
+LDAP_CONNECT_TIMEOUT = float(os.environ.get("LDAP_CONNECT_TIMEOUT", "5"))
+
+# Admission control: connections held at once for reads, writes and bulk work (bulk routes
+# and background jobs; 0 = unlimited), callers allowed to wait for each, and seconds a
+# request waits before it is answered 503 with Retry-After
+LDAP_READ_CONCURRENCY = int(os.environ.get("LDAP_READ_CONCURRENCY", "8"))
+LDAP_WRITE_CONCURRENCY = int(os.environ.get("LDAP_WRITE_CONCURRENCY", "4"))
+LDAP_BULK_CONCURRENCY = int(os.environ.get("LDAP_BULK_CONCURRENCY", "4"))
+LDAP_MAX_QUEUE = int(os.environ.get("LDAP_MAX_QUEUE", "50"))
+LDAP_QUEUE_TIMEOUT = float(os.environ.get("LDAP_QUEUE_TIMEOUT", "2"))
+
+# Per-client token buckets: requests per second and burst size (0 turns rate limiting off).
+# With RATE_LIMIT_TRUST_PROXY, clients are told apart by the first X-Forwarded-For address.
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "50"))
+RATE_LIMIT_TRUST_PROXY = os.environ.get("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+
+# Simple Paged Results: page size used when walking a whole listing, and the
+# largest page a client may request (AD's default MaxPageSize is 1000)
+LDAP_PAGE_SIZE = int(os.environ.get("LDAP_PAGE_SIZE", "500"))
+LDAP_MAX_PAGE_SIZE = int(os.environ.get("LDAP_MAX_PAGE_SIZE", "1000"))
+
+# Values per OR-filter when looking many objects up by name at once
+LDAP_OR_FILTER_CHUNK = int(os.environ.get("LDAP_OR_FILTER_CHUNK", "100"))
+
+# GET /users/search and /groups/search: results per query (default and hard cap), and whether
+# unscoped queries use AD's Ambiguous Name Resolution (turn off for servers without ANR)
+SEARCH_DEFAULT_LIMIT = int(os.environ.get("SEARCH_DEFAULT_LIMIT", "20"))
+SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", "100"))
+SEARCH_USE_ANR = os.environ.get("SEARCH_USE_ANR", "true").lower() in ("1", "true", "yes")
+
+# Values per multi-valued member modify, and groups changed in parallel, for POST /groups/members/batch
+MEMBER_MODIFY_CHUNK = int(os.environ.get("MEMBER_MODIFY_CHUNK", "1000"))
+BATCH_GROUP_WORKERS = int(os.environ.get("BATCH_GROUP_WORKERS", "4"))
+
+# Threads shared by all requests for running independent lookups of one request side by side
+LOOKUP_WORKERS = int(os.environ.get("LOOKUP_WORKERS", "8"))
+
+# sAMAccountName -> DN resolution cache (entries, seconds)
+RESOLVER_CACHE_SIZE = int(os.environ.get("RESOLVER_CACHE_SIZE", "10000"))
+RESOLVER_TTL = int(os.environ.get("RESOLVER_TTL", "600"))
+
+# POST /users/bulk: concurrent creates (each holds one pooled connection) and batch size limit
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "4"))
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", "5000"))
+
+# Subtree searched for group member details; members may live outside BASE_DN_USERS
+MEMBER_SEARCH_BASE = os.environ.get("MEMBER_SEARCH_BASE") or domain_root(BASE_DN_GROUPS)
+# Pseudo-filter binding /groups/one member cursors to ranged `member` reads
+MEMBER_RANGE_QUERY = 'member;range'
+
+USER_FILTER = '(objectClass=user)'
+GROUP_FILTER = '(objectClass=group)'
+
+# In-process read cache (per-kind TTLs in seconds, LRU-bounded)
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1000"))
+CACHE_TTL_LIST = int(os.environ.get("CACHE_TTL_LIST", "30"))
+CACHE_TTL_ENTRY = int(os.environ.get("CACHE_TTL_ENTRY", "60"))
+CACHE_TTL_MEMBERSHIP = int(os.environ.get("CACHE_TTL_MEMBERSHIP", "30"))
+
+# Identical searches running at the same time share one LDAP round trip (independent of the cache)
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Cache tags for the full user and group listings; every other tag is a DN
+USERS_TAG = 'users'
+GROUPS_TAG = 'groups'
+
+directory_cache = DirectoryCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    ttls={
+        'user_list': CACHE_TTL_LIST,
+        'group_list': CACHE_TTL_LIST,
+        'user': CACHE_TTL_ENTRY,
+        'group': CACHE_TTL_ENTRY,
+        'group_members': CACHE_TTL_MEMBERSHIP,
+        'user_groups': CACHE_TTL_MEMBERSHIP,
+    },
+    enabled=CACHE_ENABLED,
+)
+
+# Root DSE/schema cache: read from the server once, persisted, and reused on later starts
+SCHEMA_CACHE_FILE = os.environ.get("SCHEMA_CACHE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".schema_cache.json"))
+SCHEMA_CHECK_INTERVAL = int(os.environ.get("SCHEMA_CHECK_INTERVAL", "3600"))
+
+server_info_cache = ServerInfoCache(SCHEMA_CACHE_FILE)
+server_info_cache.load()
+
+# Local SQLite replica of users and groups (opt-in). Read routes serve from it while
+# it has synced within REPLICA_MAX_STALENESS seconds; `?consistency=live` bypasses it.
+REPLICA_ENABLED = os.environ.get("REPLICA_ENABLED", "false").lower() in ("1", "true", "yes")
+REPLICA_PATH = os.environ.get("REPLICA_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".replica.sqlite3"))
+REPLICA_SYNC_INTERVAL = int(os.environ.get("REPLICA_SYNC_INTERVAL", "60"))
+REPLICA_FULL_SYNC_INTERVAL = int(os.environ.get("REPLICA_FULL_SYNC_INTERVAL", "3600"))
+REPLICA_MAX_STALENESS = int(os.environ.get("REPLICA_MAX_STALENESS", "300"))
+
+# Conditional GET on /users, /groups, /users/one and /groups/one: ETags derived from the
+# DC's highestCommittedUSN (one root DSE read per request), answered with 304 when unchanged
+ETAGS_ENABLED = os.environ.get("ETAGS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Background jobs (POST /jobs): the SQLite queue, worker threads (each holds at most one
+# pooled connection at a time), where export jobs write their files, how long finished
+# jobs and their files are kept (days), and the most items one job may have
+JOBS_PATH = os.environ.get("JOBS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_ARTIFACT_DIR = os.environ.get("JOB_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".job_files"))
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", "7"))
+JOB_MAX_ITEMS = int(os.environ.get("JOB_MAX_ITEMS", "100000"))
+
+# Seconds before the in-memory membership graph is reloaded in the background
+MEMBERSHIP_GRAPH_MAX_AGE = int(os.environ.get("MEMBERSHIP_GRAPH_MAX_AGE", "300"))
+
+# LDAP_MATCHING_RULE_IN_CHAIN: walks nested group membership on the DC (live reads only)
+IN_CHAIN_RULE = '1.2.840.113556.1.4.1941'
+
+# Transport negotiated by the first successful connection ('ldaps', 'starttls' or 'plain').
+# Once known, every later connection goes straight to it instead of re-running the fallback probe.
+_negotiated_transport = None
+_transport_lock = threading.Lock()
+
+
+_servers = {}
+
+
+def _make_server(transport, get_info, host=None):
+    host = host or LDAP_SERVERS[0]
+    if transport == 'ldaps':
+        ldaps_port = int(os.environ.get("LDAP_SSL_PORT", "636"))
+        # Optionally ignore certificate validation for testing via LDAP_IGNORE_CERT env var
+        ignore_cert = os.environ.get("LDAP_IGNORE_CERT", "false").lower() in ("1", "true", "yes")
+        tls = Tls(validate=ssl.CERT_NONE) if ignore_cert else Tls()  # default validation
+        return Server(host, port=ldaps_port, use_ssl=True, tls=tls, get_info=get_info, connect_timeout=LDAP_CONNECT_TIMEOUT)
+    return Server(host, port=389, get_info=get_info, connect_timeout=LDAP_CONNECT_TIMEOUT)
+
+
+def _get_server(transport, hosts=None):
+    """
+    Returns the process-wide Server of a transport for one DC with the cached
+    DSE/schema attached, or for several DCs an ldap3 ServerPool that tries
+    them in the given order and moves on when one does not accept a connection.
+    Only while the cache is still empty are Servers built with get_info=ALL.
+    """
+    hosts = hosts or LDAP_SERVERS
+    servers = []
+    for host in hosts:
+        server = _servers.get((transport, host))
+        if server is None:
+            server = _make_server(transport, NONE if server_info_cache.loaded else ALL, host)
+            server_info_cache.attach(server)
+            server = _servers.setdefault((transport, host), server)
+        servers.append(server)
+    if len(servers) == 1:
+        return servers[0]
+    # active=1: one pass over the list, then give up instead of retrying forever
+    return ServerPool(servers, FIRST, active=1, exhaust=False)
+
+
+def _bind(transport, server):
+    """
+    Opens and binds a connection to `server` using a single transport.
+    Raises an exception if the transport is unavailable or the bind fails.
+    """
+    if transport == 'ldaps':
+        return Connection(server, user=USER_DN, password=PASSWORD, auto_bind=True, collect_usage=True)
+
+    if transport == 'starttls':
+        conn = Connection(server, user=USER_DN, password=PASSWORD, auto_bind=False, collect_usage=True)
+        # Open and start TLS if supported
+        conn.open()
+        try:
+            if not conn.start_tls():
+                raise Exception("StartTLS not supported or failed")
+            if not conn.bind():
+                raise Exception(f"StartTLS bind failed: {conn.result['description']}")
+            return conn
+        except Exception:
+            try:
+                conn.unbind()
+            except Exception:
+                pass
+            raise
+
+    # Simple bind on the standard port (insecure). Use only as last resort.
+    return Connection(server, user=USER_DN, password=PASSWORD, auto_bind=True, collect_usage=True)
+
+
+def _open_connection(transport, server=None, hosts=None):
     """
-    Establishes and returns an LDAP connection.
+    Opens and binds a connection using a single transport, with the bind timed
+    and every later operation recorded in the LDAP metrics.
+    """
+    server = server or _get_server(transport, hosts)
+    started = time.perf_counter()
+    try:
+        conn = _bind(transport, server)
+    except Exception:
+        record_operation(getattr(server, 'host', None) or (hosts or LDAP_SERVERS)[0], 'bind',
+                         time.perf_counter() - started, 'exception')
+        raise
+    record_operation(conn.server.host, 'bind', time.perf_counter() - started, 'success')
+    return instrument_connection(conn)
+
+
+def get_ldap_connection(hosts=None):
+    """
+    Establishes and returns a new bound LDAP connection to the first of `hosts`
+    (by default every configured DC) that accepts it.
     Raises an exception if the connection fails.
     
+    Routes should not call this directly; they borrow from `ldap_pool` through
+    `ldap_connection()`, which uses this function to create new pool members.
+    
     NOTE: This is a simplified approach using a single service account. 
     For a production environment, it is highly recommended to implement 
     per-user authentication for security and proper access control.
     """
+    global _negotiated_transport
+    if _negotiated_transport:
+        try:
+            conn = _open_connection(_negotiated_transport, hosts=hosts)
+        except Exception as e:
+            logger.error("LDAP connection failed: %s", e, extra={'transport': _negotiated_transport})
+            raise Exception(f"Cannot connect to LDAP server: {str(e)}")
+        _check_server_info(conn)
+        return conn
+
     # Try to establish a secure connection first (LDAPS or StartTLS), then fall back
     # to an insecure bind only if secure options fail. Active Directory requires a
     # secure channel to set unicodePwd; this helps avoid "failed to set password" errors.
-    try:
-        # If an explicit LDAPS port or flag is provided, attempt LDAPS
-        use_ldaps = os.environ.get("LDAP_USE_SSL", "false").lower() in ("1", "true", "yes")
-        ldaps_port = int(os.environ.get("LDAP_SSL_PORT", "636"))
+    with _transport_lock:
+        if _negotiated_transport:
+            return _open_connection(_negotiated_transport, hosts=hosts)
 
-        if use_ldaps:
+        use_ldaps = os.environ.get("LDAP_USE_SSL", "false").lower() in ("1", "true", "yes")
+        transports = ['ldaps', 'starttls', 'plain'] if use_ldaps else ['starttls', 'plain']
+        last_error = None
+        for transport in transports:
             try:
-                # Optionally ignore certificate validation for testing via LDAP_IGNORE_CERT env var
-                ignore_cert = os.environ.get("LDAP_IGNORE_CERT", "false").lower() in ("1", "true", "yes")
-                tls = None
-                if ignore_cert:
-                    tls = Tls(validate=ssl.CERT_NONE)
-                else:
-                    tls = Tls()  # default validation
-
-                server = Server(LDAP_SERVER, port=ldaps_port, use_ssl=True, tls=tls, get_info=ALL, connect_timeout=5)
-                conn = Connection(server, user=USER_DN, password=PASSWORD, auto_bind=True)
-                return conn
+                conn = _open_connection(transport, hosts=hosts)
             except Exception as e:
-                print(f"LDAPS connection attempt failed: {e}")
+                logger.warning("%s connection attempt failed: %s", transport, e, extra={'transport': transport})
+                last_error = e
+                continue
+            _negotiated_transport = transport
+            logger.info("Negotiated LDAP transport: %s", transport, extra={'transport': transport})
+            _check_server_info(conn)
+            return conn
+
+    logger.error("LDAP connection failed: %s", last_error)
+    # Re-raise the exception to be caught by the API route's error handler
+    raise Exception(f"Cannot connect to LDAP server: {str(last_error)}")
+
+
+def _check_server_info(conn):
+    """
+    Keeps the DSE/schema cache current: captures it from the first get_info=ALL
+    bind and, at most every SCHEMA_CHECK_INTERVAL seconds, compares the cached
+    schema timestamp with the server's so a schema change triggers a refresh.
+    """
+    if not server_info_cache.loaded:
+        server_info_cache.capture(conn.server)
+        return
+    if not server_info_cache.check_due(SCHEMA_CHECK_INTERVAL):
+        return
+    try:
+        if server_info_cache.schema_changed(conn):
+            logger.info("Directory schema changed; refreshing cached server info")
+            refresh_server_info()
+    except Exception as e:
+        logger.warning("Schema change check failed: %s", e)
+
+
+def refresh_server_info():
+    """
+    Re-reads the root DSE and schema from the server over a dedicated
+    get_info=ALL connection, then persists and re-attaches them.
+    """
+    transport = _negotiated_transport or 'plain'
+    conn = _open_connection(transport, server=_make_server(transport, ALL, domain_controllers.write_order()[0]))
+    try:
+        if not server_info_cache.capture(conn.server):
+            raise Exception("Server did not return DSE/schema information")
+    finally:
+        conn.unbind()
+    return server_info_cache.status()
+
+
+def probe_server(host):
+    """
+    Health check of one DC: an anonymous root DSE read within LDAP_CONNECT_TIMEOUT seconds.
+    """
+    transport = 'ldaps' if _negotiated_transport == 'ldaps' else 'plain'
+    conn = Connection(_make_server(transport, NONE, host), receive_timeout=LDAP_CONNECT_TIMEOUT)
+    try:
+        conn.open()
+        if not conn.search('', '(objectClass=*)', search_scope=BASE, attributes=['dsServiceName']):
+            raise Exception(f"Root DSE read failed: {conn.result['description']}")
+    finally:
+        conn.unbind()
+
+
+def _drop_connections(host):
+    """
+    Closes idle pooled connections to a DC that went down.
+    """
+    for pool in {id(ldap_pool): ldap_pool, id(write_pool): write_pool}.values():
+        pool.discard_idle(lambda conn: conn.server.host == host)
+
+
+def _prefer_read_server(host):
+    # Reads move to the new fastest DC as idle connections to the others are replaced
+    ldap_pool.discard_idle(lambda conn: conn.server.host != host)
+
+
+domain_controllers = DomainControllerPool(
+    LDAP_SERVERS,
+    probe_server,
+    selection=LDAP_SERVER_SELECTION,
+    interval=LDAP_SERVER_CHECK_INTERVAL,
+    pin_seconds=LDAP_REPLICATION_PIN,
+    on_down=_drop_connections,
+    on_preferred=_prefer_read_server,
+)
+
+# The DC a request reads from once it has to stay on one, e.g. the DC its ETag came from
+read_server = contextvars.ContextVar('read_server', default=None)
+
+ldap_pool = LDAPConnectionPool(
+    lambda: get_ldap_connection(domain_controllers.read_order(read_server.get())),
+    size=LDAP_POOL_SIZE,
+    idle_timeout=LDAP_POOL_IDLE_TIMEOUT,
+    max_lifetime=LDAP_POOL_MAX_LIFETIME,
+    acquire_timeout=LDAP_POOL_ACQUIRE_TIMEOUT,
+    health_check_interval=LDAP_POOL_HEALTH_CHECK_INTERVAL,
+)
+# With one DC there is nothing to pin writes to, and a second pool would only hold more connections
+write_pool = ldap_pool
+if domain_controllers.multiple:
+    write_pool = LDAPConnectionPool(
+        lambda: get_ldap_connection(domain_controllers.write_order()),
+        size=LDAP_WRITE_POOL_SIZE,
+        idle_timeout=LDAP_POOL_IDLE_TIMEOUT,
+        max_lifetime=LDAP_POOL_MAX_LIFETIME,
+        acquire_timeout=LDAP_POOL_ACQUIRE_TIMEOUT,
+        health_check_interval=LDAP_POOL_HEALTH_CHECK_INTERVAL,
+    )
+domain_controllers.start()
+
+# True while the current request or job may write: its connections come from write_pool
+writing = contextvars.ContextVar('writing', default=False)
+
+admission = ConcurrencyLimiter(
+    {
+        'read': (LDAP_READ_CONCURRENCY, LDAP_MAX_QUEUE),
+        'write': (LDAP_WRITE_CONCURRENCY, LDAP_MAX_QUEUE),
+        'bulk': (LDAP_BULK_CONCURRENCY, LDAP_MAX_QUEUE),
+    },
+    timeout=LDAP_QUEUE_TIMEOUT,
+)
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+# The admission budget the current request or job draws from
+workload = contextvars.ContextVar('workload', default='read')
+# Routes that are bulk work however they are called
+BULK_ENDPOINTS = {'bulk_create_users', 'batch_update_group_members', 'export_directory'}
+# Routes that never touch LDAP; asgi.py runs them apart from the LDAP work
+LOCAL_ENDPOINTS = {'get_metrics', 'get_cache_stats', 'get_admission_stats', 'get_server_status',
+                   'get_replica_status', 'get_membership_stats', 'list_jobs', 'get_job'}
+
+
+@contextmanager
+def ldap_connection(conn=None, write=False):
+    """
+    Yields `conn` when the caller already holds a connection, otherwise borrows
+    one from the pool for the duration of the block: the write DC's pool for
+    writes and for reads shortly after one, the read pool otherwise.
+    """
+    if conn is not None:
+        yield conn
+        return
+    # Background work waits for its turn; only requests are turned away
+    timeout = LDAP_QUEUE_TIMEOUT if has_request_context() else None
+    try:
+        with admission.slot(workload.get(), timeout):
+            # A read bound to one DC (by its cursor or ETag) stays there even while reads follow the write DC
+            if write or writing.get() or (domain_controllers.pinned() and read_server.get() is None):
+                with write_pool.connection() as pooled:
+                    yield pooled
+                return
+            host = read_server.get()
+            with ldap_pool.connection(None if host is None else lambda conn: conn.server.host == host) as pooled:
+                yield pooled
+    except (AdmissionRejected, PoolTimeoutError) as e:
+        if has_request_context():
+            # The route reports it as a 500; shed_overload turns that into a 503
+            g.retry_after = getattr(e, 'retry_after', admission.retry_after())
+        raise
+
+
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    'leapad_http_request_duration_seconds',
+    'Latency of HTTP requests by route, method and status, streamed bodies included.',
+    ('route', 'method', 'status')))
+registry.register(Gauge(
+    'leapad_ldap_pool_size', 'Most LDAP connections the pool opens.',
+    lambda: [((), ldap_pool.size)]))
+registry.register(Gauge(
+    'leapad_ldap_pool_connections', 'Open pooled LDAP connections by state.',
+    lambda: [((state,), ldap_pool.stats()[state]) for state in ('idle', 'in_use')], ('state',)))
+registry.register(Gauge(
+    'leapad_ldap_pool_created_total', 'LDAP connections opened by the pool.',
+    lambda: [((), ldap_pool.created)], kind='counter'))
+registry.register(Gauge(
+    'leapad_ldap_pool_discarded_total', 'Pooled LDAP connections closed as broken or expired.',
+    lambda: [((), ldap_pool.discarded)], kind='counter'))
+registry.register(Gauge(
+    'leapad_ldap_pool_timeouts_total', 'Requests that gave up waiting for a pooled LDAP connection.',
+    lambda: [((), ldap_pool.timeouts)], kind='counter'))
+registry.register(Gauge(
+    'leapad_admission_in_flight', 'LDAP connections held per admission budget.',
+    lambda: [((name,), budget['in_flight']) for name, budget in admission.stats().items()], ('budget',)))
+registry.register(Gauge(
+    'leapad_admission_queue_depth', 'Callers waiting for a slot per admission budget.',
+    lambda: [((name,), budget['queued']) for name, budget in admission.stats().items()], ('budget',)))
+registry.register(Gauge(
+    'leapad_admission_rejected_total', 'Requests refused LDAP capacity, by budget and reason (queue_full or timeout).',
+    lambda: [((name, reason), count) for name, budget in admission.stats().items() for reason, count in budget['rejected'].items()],
+    ('budget', 'reason'), kind='counter'))
+registry.register(Gauge(
+    'leapad_single_flight_shared_total', 'Reads answered with the result of an identical search already in flight.',
+    lambda: [((), single_flight.shared)], kind='counter'))
+registry.register(Gauge(
+    'leapad_rate_limited_total', 'Requests answered 429 by the per-client rate limit.',
+    lambda: [((), rate_limiter.limited)], kind='counter'))
+registry.register(Gauge(
+    'leapad_ldap_server_up', 'Whether a domain controller is in rotation (1) or failed its last health check (0).',
+    lambda: [((host,), up) for host, up in domain_controllers.up()], ('server',)))
+registry.register(Gauge(
+    'leapad_ldap_server_probe_seconds', 'Smoothed latency of the health check of each domain controller.',
+    lambda: [((host,), seconds) for host, seconds in domain_controllers.latencies()], ('server',)))
+
+
+@app.before_request
+def start_request_stats():
+    g.request_started = time.perf_counter()
+    g.ldap_stats = RequestStats()
+    current_request_stats.set(g.ldap_stats)
+    writing.set(request.method not in ('GET', 'HEAD', 'OPTIONS'))
+    workload.set('bulk' if request.endpoint in BULK_ENDPOINTS else 'write' if writing.get() else 'read')
+    read_server.set(None)
+
+
+def client_address():
+    if RATE_LIMIT_TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr
+
+
+@app.before_request
+def limit_rate():
+    """
+    Answers 429 with Retry-After once a client has used up its token bucket.
+    """
+    if not rate_limiter.enabled or request.method == 'OPTIONS' or request.endpoint == 'get_metrics':
+        return None
+    wait = rate_limiter.take(client_address())
+    if wait:
+        response = jsonify({"error": "Too many requests"})
+        response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+        return response, 429
+    return None
+
+
+@app.before_request
+def follow_cursor():
+    """
+    A paging cursor's cookie is only valid on the DC that issued it, so the
+    request reads from that DC, its ETag included. A cursor from a DC that is
+    out of rotation has expired.
+    """
+    cursor = request.args.get('cursor')
+    server = cursor_server(cursor) if cursor and domain_controllers.multiple else None
+    if server is None:
+        return None
+    if not domain_controllers.in_rotation(server):
+        return jsonify({"error": f"Cursor expired: {server} is unavailable; start again without a cursor"}), 400
+    g.cursor_server = server
+    read_server.set(server)
+    return None
+
+
+def cursor_connection_server(conn):
+    """
+    The DC to name in the next cursor of a paged search on `conn` (None with a single DC).
+    Raises InvalidCursorError when the cursor's DC could not be reached and `conn` went to another one.
+    """
+    if not domain_controllers.multiple:
+        return None
+    expected = g.get('cursor_server')
+    if expected is not None and conn.server.host != expected:
+        raise InvalidCursorError(f"Cursor expired: {expected} is unavailable; start again without a cursor")
+    return conn.server.host
+
+
+@app.after_request
+def remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.after_request
+def shed_overload(response):
+    """
+    Turns the error response of a request that was refused LDAP capacity into a 503 with Retry-After.
+    """
+    retry_after = g.get('retry_after')
+    if retry_after is None or response.status_code < 500:
+        return response
+    response = jsonify({"error": "The directory is busy, retry later"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+@app.teardown_request
+def record_request(error=None):
+    """
+    Runs once the response is finished (streamed bodies included): observes the
+    route latency and writes one access log line with the request's LDAP operations.
+    """
+    stats = g.pop('ldap_stats', None)
+    current_request_stats.set(None)
+    if stats is None:
+        return
+    seconds = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = g.get('response_status', 500)
+    HTTP_REQUEST_DURATION.observe(seconds, route=route, method=request.method, status=status)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s %s %s %.1fms", request.method, request.path, status, seconds * 1000,
+                    extra=dict(method=request.method, route=route, path=request.path, status=status,
+                               duration_ms=round(seconds * 1000, 2), **stats.as_log_fields()))
+
+
+lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix='ldap-lookup')
+
+
+def run_concurrently(*calls):
+    """
+    Runs independent lookups of one request side by side and returns their
+    results in order. Each call borrows its own pooled connection, so the
+    request costs the slowest lookup instead of the sum; the first exception
+    is re-raised once every call has finished.
+    """
+    if len(calls) == 1:
+        return [calls[0]()]
+    futures = [lookup_executor.submit(contextvars.copy_context().run, call) for call in calls]
+    results = []
+    for future in futures:
+        # result() re-raises; wait for the rest first so no lookup outlives the request
+        exception = future.exception()
+        if exception is not None:
+            for other in futures:
+                other.exception()
+            raise exception
+        results.append(future.result())
+    return results
+
+
+directory_replica = None
+if REPLICA_ENABLED:
+    directory_replica = DirectoryReplica(
+        REPLICA_PATH,
+        # USN watermarks are per DC, so syncs stay on the write DC
+        functools.partial(ldap_connection, write=True),
+        {
+            'user': (BASE_DN_USERS, USER_FILTER, user_search_attributes),
+            'group': (BASE_DN_GROUPS, GROUP_FILTER, group_search_attributes),
+        },
+        serialize=app.json.dumps,
+        deserialize=app.json.loads,
+        page_size=LDAP_PAGE_SIZE,
+        interval=REPLICA_SYNC_INTERVAL,
+        full_sync_interval=REPLICA_FULL_SYNC_INTERVAL,
+    )
+    directory_replica.start()
+
+
+def read_consistency():
+    """
+    Parses the optional `consistency` query parameter of a read route:
+    'bounded' (default) may be served from the replica or the read cache,
+    'live' always reads from the directory.
+    Raises ValueError for any other value.
+    """
+    consistency = request.args.get('consistency', 'bounded')
+    if consistency not in ('bounded', 'live'):
+        raise ValueError("consistency must be 'bounded' or 'live'")
+    return consistency
+
 
-        # Try StartTLS on standard LDAP port (389)
+def from_replica(consistency, kind, attributes):
+    """
+    True when a read can be answered by the local replica: it is enabled, has
+    synced within REPLICA_MAX_STALENESS seconds with no local write pending,
+    replicates every requested attribute, and the client did not ask for a live read.
+    """
+    return (consistency != 'live'
+            and directory_replica is not None
+            and directory_replica.covers(kind, attributes)
+            and directory_replica.is_fresh(REPLICA_MAX_STALENESS))
+
+
+def cached_read(consistency, kind, key, loader, tags=()):
+    """
+    directory_cache.get_or_load(), bypassed for live reads.
+
+    The key leaves out the directory version: highestCommittedUSN moves with
+    every change on the DC, in any partition, so a versioned key would miss on
+    nearly every read. Writes through the API drop the entries they affect;
+    other changes show up within the TTL. Each value is cached with the version
+    it was read at, and a conditional GET sends the ETag of that version (see
+    conditional_get), so a client never holds an ETag newer than its body.
+    """
+    if consistency == 'live':
+        return loader()
+    version = g.get('read_version')
+
+    def load():
+        value = loader()
+        return None if value is None else (version, value)
+
+    cached_tags = (lambda pair: tags(pair[1])) if callable(tags) else tags
+    pair = directory_cache.get_or_load(kind, key, load, cached_tags)
+    if pair is None:
+        return None
+    read_at, value = pair
+    if version is not None:
+        # Bodies read at different versions (or at an unknown one) get no ETag
+        g.body_version = read_at if g.get('body_version', read_at) == read_at else None
+    return value
+
+
+def conditional_get(view):
+    """
+    Adds ETag / If-None-Match handling to a read route. The ETag is derived from
+    the request and the version of everything the route may read from: the DC's
+    (dsServiceName, highestCommittedUSN) and, while it serves reads, the
+    replica's sync watermark. A matching If-None-Match is answered with 304
+    before the route runs, so an unchanged listing costs one root DSE read.
+    A body from the read cache gets the ETag of the version it was read at.
+    When the DC does not report a USN the route runs without an ETag.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ETAGS_ENABLED:
+            return view(*args, **kwargs)
         try:
-            server = Server(LDAP_SERVER, port=389, get_info=ALL, connect_timeout=5)
-            conn = Connection(server, user=USER_DN, password=PASSWORD, auto_bind=False)
-            # Open and start TLS if supported
-            conn.open()
-            try:
-                if conn.start_tls():
-                    if conn.bind():
-                        return conn
-                else:
-                    print("StartTLS not supported or failed")
-            except Exception as e:
-                print(f"StartTLS bind failed: {e}")
-            # if StartTLS path didn't return, unbind and continue to fallback
-            try:
-                conn.unbind()
-            except Exception:
-                pass
+            with ldap_connection() as conn:
+                version = directory_version(conn)
+                if domain_controllers.multiple and read_server.get() is None:
+                    # USNs are per DC: the route must read from the DC the version came from
+                    read_server.set(conn.server.host)
         except Exception as e:
-            print(f"StartTLS attempt failed: {e}")
+            logger.debug("No directory version for conditional GET: %s", e)
+            return view(*args, **kwargs)
+        if directory_replica is not None and directory_replica.is_fresh(REPLICA_MAX_STALENESS):
+            version += directory_replica.version()
+        etag = make_etag(request.full_path, wants_stream(), *version)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            g.read_version = version
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if 'body_version' in g:
+                # The body came from the cache: label it with the version it was read at
+                if g.body_version is None:
+                    return response
+                etag = make_etag(request.full_path, wants_stream(), *g.body_version)
+                if request.if_none_match.contains_weak(etag):
+                    response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        # Lets browsers keep the body but revalidate it on every use
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+
+def invalidate_reads(*tags):
+    """
+    Called after a successful write: drops the affected cache entries and sends
+    reads back to the directory until the replica has synced the change.
+    """
+    directory_cache.invalidate(*tags)
+    single_flight.forget()
+    domain_controllers.note_write()
+    if directory_replica is not None:
+        directory_replica.mark_dirty()
+
+
+def load_membership_edges():
+    """
+    Yields (group_dn, member_dns) for every group, from the replica when it is fresh.
+    """
+    attributes = ['distinguishedName', 'member']
+    if from_replica('bounded', 'group', attributes):
+        groups = directory_replica.iter_objects('group', attributes)
+    else:
+        groups = iter_entries(BASE_DN_GROUPS, GROUP_FILTER, attributes)
+    for group in groups:
+        if group.get('distinguishedName'):
+            yield group['distinguishedName'], group.get('member')
+
+
+membership_graph = MembershipGraph(load_membership_edges, max_age=MEMBERSHIP_GRAPH_MAX_AGE)
+
+
+def group_names(value):
+    """
+    The group sAMAccountNames (or names) in a request's `memberOf` list.
+    Anything but a non-empty string is skipped, like a name that matches no group.
+    """
+    if not isinstance(value, list):
+        return []
+    return [name for name in value if isinstance(name, str) and name.strip()]
+
 
-        # Fallback: simple bind on configured port (insecure). Use only as last resort.
+def lookup_dns(kind, names, conn=None):
+    """
+    Yields (sAMAccountName, dn) for the users or groups named in `names`, batched into OR-filter searches.
+    """
+    base_dn, object_filter = (BASE_DN_USERS, USER_FILTER) if kind == 'user' else (BASE_DN_GROUPS, GROUP_FILTER)
+    for entry in search_by_values(base_dn, object_filter, 'sAMAccountName', names,
+                                  ['sAMAccountName', 'distinguishedName'], conn=conn):
+        yield entry['sAMAccountName'], entry['distinguishedName']
+
+
+dn_resolver = DNResolver(lookup_dns, max_entries=RESOLVER_CACHE_SIZE, ttl=RESOLVER_TTL)
+
+
+def page_request(base_dn, search_filter, attributes):
+    """
+    Parses the optional `cursor` and `page_size` query parameters of a listing route.
+    Returns (cookie, page_size); page_size is None when the client wants the full listing.
+    Raises ValueError for an invalid page size or cursor.
+    """
+    cursor = request.args.get('cursor')
+    page_size = request.args.get('page_size')
+    cookie = None
+    if cursor:
+        cookie, cursor_page_size = decode_cursor(cursor, base_dn, search_filter, attributes)
+        page_size = page_size or cursor_page_size
+    if page_size is None:
+        return None, None
+    try:
+        page_size = int(page_size)
+    except (TypeError, ValueError):
+        raise ValueError("page_size must be an integer")
+    if not 1 <= page_size <= LDAP_MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {LDAP_MAX_PAGE_SIZE}")
+    return cookie, page_size
+
+
+def page_response(items, next_cookie, page_size, base_dn, search_filter, attributes, server=None):
+    """
+    Builds the body of a paged listing response. `server` is the DC the page was read from.
+    """
+    next_cursor = encode_cursor(next_cookie, page_size, base_dn, search_filter, attributes, server) if next_cookie else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def wants_stream():
+    """
+    True when the client asked for an NDJSON stream via `?stream=1` or `Accept: application/x-ndjson`.
+    """
+    if request.args.get('stream') in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+
+def ndjson_response(items):
+    """
+    Streams an iterable of dicts as newline-delimited JSON, one entry per line.
+
+    The first item is pulled before the response starts so that connection and
+    search errors still surface as a normal 500 from the route. An error after
+    streaming has started is reported as a final {"error": ...} line.
+    """
+    items = iter(items)
+    try:
+        first = [next(items)]
+    except StopIteration:
+        first = []
+
+    def generate():
         try:
-            server = Server(LDAP_SERVER, port=389, get_info=ALL, connect_timeout=5)
-            conn = Connection(server, user=USER_DN, password=PASSWORD, auto_bind=True)
-            return conn
+            for item in first:
+                yield app.json.dumps(item) + '\n'
+            for item in items:
+                yield app.json.dumps(item) + '\n'
         except Exception as e:
-            print(f"Insecure bind attempt failed: {e}")
-            raise
-    except Exception as e:
-        print(f"LDAP connection failed: {e}")
-        # Re-raise the exception to be caught by the API route's error handler
-        raise Exception(f"Cannot connect to LDAP server: {str(e)}")
+            yield app.json.dumps({"error": f"An error occurred: {str(e)}"}) + '\n'
 
-def fetch_groups(base_dn):
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def search_directory(base_dn, object_filter, default_attributes):
     """
-    Fetches all groups from a given base DN.
+    Runs the search-box query of a search route: `q` matched by ANR, or by prefix
+    on the attributes listed in `in`, returning at most `limit` entries projected
+    to `fields`. The DC stops at limit + 1 entries; the extra one only tells the
+    client the results were cut off: { items: [...], truncated: bool }
+    Raises ValueError for a missing query or an invalid limit or scope.
     """
-    conn = None
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise ValueError("q parameter is required")
     try:
-        conn = get_ldap_connection()
-        conn.search(base_dn, '(objectClass=group)', search_scope=SUBTREE, attributes=['*'])
-        groups = []
-        for entry in conn.entries:
-            group = {attr: entry[attr].value for attr in entry.entry_attributes_as_dict}
-            groups.append(group)
-            print(groups)
-        return groups
-    finally:
-        if conn:
-            conn.unbind()
+        limit = int(request.args.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {SEARCH_MAX_LIMIT}")
+    scope = query_scope(request.args.get('in', ''))
+    attributes = requested_attributes(default_attributes)
+    with ldap_connection() as conn:
+        conn.search(base_dn, query_filter(object_filter, query, scope, SEARCH_USE_ANR),
+                    search_scope=SUBTREE, attributes=attributes, size_limit=limit + 1)
+        entries = search_entries(conn)
+    items = [entry_to_dict(entry, attributes) for entry in entries[:limit]]
+    return {"items": items, "truncated": len(entries) > limit}
+
+
+def requested_attributes(default, fields=None):
+    """
+    Returns the attribute projection for a read route: `default`, or the
+    attributes named in the comma-separated `fields` (by default the query parameter).
+    Raises ValueError for attributes the directory schema does not define.
+    """
+    if fields is None:
+        fields = request.args.get('fields')
+    if not fields:
+        return default
+    attributes = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    schema = server_info_cache.schema_info
+    if schema is not None:
+        unknown = [name for name in attributes if name not in schema.attribute_types]
+    else:
+        # Without a schema only the default projection can be vouched for
+        known = {name.lower() for name in default}
+        unknown = [name for name in attributes if name.lower() not in known]
+    if unknown:
+        raise ValueError(f"Unknown attribute(s) in fields: {', '.join(unknown)}")
+    return attributes
+
+
+single_flight = SingleFlight()
+
+
+def coalesced(shape, base_dn, search_filter, attributes, load):
+    """
+    Runs `load()`, which performs the given search, at most once at a time per
+    search: concurrent callers asking for the same `shape` ('all' entries or
+    'one') of the same base DN, filter and attributes get the result of the run
+    in flight. Callers bound to a particular DC (writers, ETag reads) only share
+    with callers bound to the same one.
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return load()
+    routing = read_server.get(), writing.get() or domain_controllers.pinned()
+    key = (shape, base_dn.lower(), search_filter, tuple(attributes), routing)
+    try:
+        return single_flight.do(key, load)
+    except (AdmissionRejected, PoolTimeoutError) as e:
+        # Raised in whichever request ran the search; each waiting request answers 503 too
+        if has_request_context():
+            g.retry_after = getattr(e, 'retry_after', admission.retry_after())
+        raise
 
 
-def fetch_group_by_samaccountname(base_dn, samaccountname):
+def fetch_entries(base_dn, search_filter, attributes, conn=None):
+    """
+    Every entry matching a filter as a list of dicts, with identical concurrent searches run once.
+    """
+    return coalesced('all', base_dn, search_filter, attributes,
+                     lambda: list(iter_entries(base_dn, search_filter, attributes, conn=conn)))
+
+
+def iter_entries(base_dn, search_filter, attributes, conn=None):
+    """
+    Yields every entry matching a filter as a dict, one paged search page at a time.
+    The connection is held only while the generator is being consumed.
+    """
+    with ldap_connection(conn) as conn:
+        for entries in iter_search_pages(conn, base_dn, search_filter, attributes, LDAP_PAGE_SIZE):
+            for entry in entries:
+                yield entry_to_dict(entry, attributes)
+
+
+def fetch_groups(base_dn, attributes=group_search_attributes, conn=None):
+    """
+    Fetches all groups from a given base DN.
+    """
+    return fetch_entries(base_dn, GROUP_FILTER, attributes, conn=conn)
+
+
+def fetch_groups_page(base_dn, page_size, cookie=None, attributes=group_search_attributes, conn=None):
+    """
+    Fetches one page of groups from a given base DN.
+    Returns (groups, next_cookie, server); next_cookie is None after the last page,
+    server is the DC that must continue the search (see cursor_connection_server).
+    """
+    with ldap_connection(conn) as conn:
+        server = cursor_connection_server(conn)
+        entries, next_cookie = search_page(conn, base_dn, GROUP_FILTER, attributes, page_size, cookie)
+        groups = [entry_to_dict(entry, attributes) for entry in entries]
+        return groups, next_cookie, server
+
+
+def fetch_group_by_samaccountname(base_dn, samaccountname, attributes=group_search_attributes, conn=None):
     """
     Fetches a single group by sAMAccountName from a given base DN.
     """
-    conn = None
-    try:
-        conn = get_ldap_connection()
-        search_filter = f'(&(objectClass=group)(sAMAccountName={samaccountname}))'
-        conn.search(base_dn, search_filter, search_scope=SUBTREE, attributes=['*'])
+    search_filter = f'(&(objectClass=group)(sAMAccountName={escape_filter_chars(samaccountname)}))'
 
-        if not conn.entries:
-            return None
+    def load():
+        with ldap_connection(conn) as connection:
+            connection.search(base_dn, search_filter, search_scope=SUBTREE, attributes=attributes)
 
-        group = {attr: conn.entries[0][attr].value for attr in conn.entries[0].entry_attributes_as_dict}
-        return group
-    finally:
-        if conn:
-            conn.unbind()
+            entries = search_entries(connection)
+            if not entries:
+                return None
+
+            return entry_to_dict(entries[0], attributes)
+
+    return coalesced('one', base_dn, search_filter, attributes, load)
 
 
 
 
 @app.route('/groups', methods=['GET'])
+@conditional_get
 def get_all_groups():
     """
     API endpoint to get all groups from the configured base DN.
+    With `page_size` and/or `cursor` query params, returns a single page instead:
+    { items: [...], next_cursor: str|null }
+    With `?stream=1` or `Accept: application/x-ndjson`, streams every group as NDJSON.
+    `fields=a,b,c` limits each group to the listed attributes.
+    Full listings come from the replica when it is fresh; `consistency=live` forces a directory read.
     """
     try:
-        groups = fetch_groups(BASE_DN_GROUPS)
-        return jsonify(groups), 200
+        consistency = read_consistency()
+        attributes = requested_attributes(group_search_attributes)
+        replica = from_replica(consistency, 'group', attributes)
+        if wants_stream():
+            if replica:
+                return ndjson_response(directory_replica.iter_objects('group', attributes))
+            return ndjson_response(iter_entries(BASE_DN_GROUPS, GROUP_FILTER, attributes))
+        cookie, page_size = page_request(BASE_DN_GROUPS, GROUP_FILTER, attributes)
+        if page_size is None:
+            if replica:
+                return jsonify(list(directory_replica.iter_objects('group', attributes))), 200
+            groups = cached_read(consistency, 'group_list', tuple(attributes),
+                                 lambda: fetch_groups(BASE_DN_GROUPS, attributes),
+                                 tags=[GROUPS_TAG])
+            return jsonify(groups), 200
+        groups, next_cookie, server = fetch_groups_page(BASE_DN_GROUPS, page_size, cookie, attributes)
+        return jsonify(page_response(groups, next_cookie, page_size, BASE_DN_GROUPS, GROUP_FILTER, attributes, server)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-def fetch_user_by_samaccountname(base_dn, samaccountname):
+@app.route('/groups/search', methods=['GET'])
+def search_groups():
     """
-    Fetches a single user by sAMAccountName from a given base DN.
+    API endpoint for the group search box: `q=` matched by ANR (or by prefix on the
+    comma-separated `in=` attributes: sAMAccountName, displayName, mail), at most
+    `limit` groups, each limited to `fields=a,b,c` when given.
+    Always a live directory read: { items: [...], truncated: bool }
     """
-    conn = None
     try:
-        conn = get_ldap_connection()
-        search_filter = f'(&(objectClass=user)(sAMAccountName={samaccountname}))'
-        conn.search(base_dn, search_filter, search_scope=SUBTREE, attributes=['*'])
+        return jsonify(search_directory(BASE_DN_GROUPS, GROUP_FILTER, group_search_attributes)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+def fetch_user_by_samaccountname(base_dn, samaccountname, attributes=user_search_attributes, conn=None):
+    """
+    Fetches a single user by sAMAccountName from a given base DN.
+    """
+    search_filter = f'(&(objectClass=user)(sAMAccountName={escape_filter_chars(samaccountname)}))'
 
-        if not conn.entries:
-            return None
+    def load():
+        with ldap_connection(conn) as connection:
+            connection.search(base_dn, search_filter, search_scope=SUBTREE, attributes=attributes)
 
-        user = {attr: conn.entries[0][attr].value for attr in conn.entries[0].entry_attributes_as_dict}
-        return user
-    finally:
-        if conn:
-            conn.unbind()
+            entries = search_entries(connection)
+            if not entries:
+                return None
 
-def fetch_user_groups(user_dn):
-    conn = None
-    try:
-        conn = get_ldap_connection()
+            return entry_to_dict(entries[0], attributes)
+
+    return coalesced('one', base_dn, search_filter, attributes, load)
+
+def fetch_member_details(member_dns, attributes, conn=None):
+    """
+    Fetches the given members anywhere under MEMBER_SEARCH_BASE with one OR-filter
+    search per LDAP_OR_FILTER_CHUNK DNs, projected to `attributes`. Returns them in
+    `member_dns` order; members that cannot be read come back as just their DN.
+    """
+    attributes = list(dict.fromkeys(list(attributes) + ['distinguishedName']))
+    found = {}
+    for entry in search_by_values(MEMBER_SEARCH_BASE, '(objectClass=*)', 'distinguishedName', member_dns, attributes, conn=conn):
+        found[entry['distinguishedName'].lower()] = entry
+    return [found.get(dn.lower(), {'distinguishedName': dn}) for dn in member_dns]
+
+def iter_group_members(group_dn, attributes, conn=None):
+    """
+    Yields every member of a group with its `attributes`: the group's `member`
+    values are read with ranged retrieval, one range at a time, and each range's
+    details fetched with fetch_member_details.
+    """
+    with ldap_connection(conn) as conn:
+        for member_dns, _ in iter_member_ranges(conn, group_dn):
+            yield from fetch_member_details(member_dns, attributes, conn=conn)
+
+def fetch_user_groups(user_dn, conn=None):
+    with ldap_connection(conn) as conn:
         conn.search(user_dn, '(objectClass=user)', attributes=['memberOf'])
-        if not conn.entries:
+        entries = search_entries(conn)
+        if not entries:
             return []
-        return list(conn.entries[0]['memberOf'].values) if 'memberOf' in conn.entries[0] else []
-    finally:
-        if conn:
-            conn.unbind()
+        return entry_to_dict(entries[0], ['memberOf'])['memberOf']
+
+def fetch_user_groups_cached(user_dn, consistency='bounded'):
+    """
+    fetch_user_groups() for read routes, served from the replica or the directory cache when possible.
+    """
+    if from_replica(consistency, 'user', ['memberOf']):
+        group_dns = directory_replica.groups_of(user_dn)
+        if group_dns:
+            return group_dns
+    return cached_read(consistency, 'user_groups', user_dn.lower(), lambda: fetch_user_groups(user_dn), tags=[user_dn])
 
 @app.route('/groups/one', methods=['GET'])
+@conditional_get
 def get_group():
     """
     API endpoint to get a single group and its members by the group's name.
+    With `?stream=1` or `Accept: application/x-ndjson`, streams only the members as NDJSON.
+    `fields=a,b,c` limits each member to the listed attributes.
+    Served from the replica when it is fresh; `consistency=live` forces a directory read.
+    With `page_size` and/or `cursor`, returns one page of the group's `member`
+    values instead, read with ranged retrieval so very large groups are never
+    loaded whole: { group, items: [...], next_cursor: str|null }
     """
-    conn = None
     try:
         samaccountname = request.args.get('name')
         
         if not samaccountname:
             return jsonify({"error": "name parameter is required"}), 400
         
-        group = fetch_group_by_samaccountname(BASE_DN_GROUPS, samaccountname)
+        consistency = read_consistency()
+        member_attributes = requested_attributes(user_search_attributes)
+        paged = 'page_size' in request.args or 'cursor' in request.args
+        # A paged member listing must not pull the group's whole member attribute along
+        group_attributes = [name for name in group_search_attributes if name != 'member'] if paged else group_search_attributes
+        
+        group = None
+        if from_replica(consistency, 'group', group_attributes):
+            # A miss falls through to the directory: the group may be newer than the last sync
+            group = directory_replica.get_by_sam('group', samaccountname, group_attributes)
+        if group is None:
+            group = cached_read(consistency, 'group', (samaccountname.lower(), tuple(group_attributes)),
+                                lambda: fetch_group_by_samaccountname(BASE_DN_GROUPS, samaccountname, group_attributes),
+                                tags=lambda g: [g.get('distinguishedName')])
         
         if not group:
             return jsonify({"error": "Group not found"}), 404
@@ -197,22 +1167,79 @@ def get_group():
         # Get the distinguished name of the group to search for members
         group_dn = group.get("distinguishedName")
         
-        conn = get_ldap_connection()    
-        # Search for users who are members of this group
-        search_filter = f'(memberOf={group_dn})'
-        conn.search(BASE_DN_USERS, search_filter, search_scope=SUBTREE, attributes=['*'])
+        if paged:
+            cookie, page_size = page_request(group_dn, MEMBER_RANGE_QUERY, member_attributes)
+            offset = int(cookie) if cookie else 0
+            with ldap_connection() as conn:
+                member_dns, next_offset = member_page(conn, group_dn, offset, page_size)
+                members = fetch_member_details(member_dns, member_attributes, conn=conn)
+            next_cookie = str(next_offset).encode('ascii') if next_offset is not None else None
+            return jsonify(dict(page_response(members, next_cookie, page_size, group_dn, MEMBER_RANGE_QUERY, member_attributes),
+                                group=group)), 200
+        
+        # Members are the group's own `member` values, wherever they live
+        if from_replica(consistency, 'user', member_attributes):
+            member_dns = group.get('member') or []
+            found = directory_replica.get_by_dns(member_dns, list(dict.fromkeys(member_attributes + ['distinguishedName'])))
+            # Members outside the replicated OUs are only in the directory
+            if len(found) == len({dn.lower() for dn in member_dns}):
+                members = [found[dn.lower()] for dn in member_dns]
+                if wants_stream():
+                    return ndjson_response(members)
+                return jsonify({"group": group, "members": members}), 200
+        if wants_stream():
+            return ndjson_response(iter_group_members(group_dn, member_attributes))
         
-        users = []
-        for entry in conn.entries:
-            user = {attr: entry[attr].value for attr in entry.entry_attributes_as_dict}
-            users.append(user)
+        users = cached_read(consistency, 'group_members', (group_dn.lower(), tuple(member_attributes)),
+                            lambda: coalesced('all', group_dn, MEMBER_RANGE_QUERY, member_attributes,
+                                              lambda: list(iter_group_members(group_dn, member_attributes))),
+                            tags=lambda members: [group_dn] + [m.get('distinguishedName') for m in members])
         
         return jsonify({"group": group, "members": users}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+@app.route('/groups/effective-members', methods=['GET'])
+def get_group_effective_members():
+    """
+    API endpoint to list every member of a group, including members of nested groups.
+    Selector: query param 'group_dn', or 'name' (sAMAccountName).
+    Answered from the in-memory membership graph; `consistency=live` asks the DC
+    with an LDAP_MATCHING_RULE_IN_CHAIN search instead.
+    """
+    try:
+        consistency = read_consistency()
+        group_dn = request.args.get('group_dn')
+        samaccountname = request.args.get('name')
+        if not group_dn and not samaccountname:
+            return jsonify({"error": "group_dn or name parameter is required"}), 400
+        if not group_dn:
+            group_dn = dn_resolver.resolve_one('group', samaccountname)
+            if not group_dn:
+                return jsonify({"error": "Group not found"}), 404
+
+        if consistency == 'live':
+            search_filter = f'(memberOf:{IN_CHAIN_RULE}:={escape_filter_chars(group_dn)})'
+            users, groups = run_concurrently(
+                lambda: [entry['distinguishedName'] for entry in iter_entries(BASE_DN_USERS, f'(&{USER_FILTER}{search_filter})', ['distinguishedName'])],
+                lambda: [entry['distinguishedName'] for entry in iter_entries(BASE_DN_GROUPS, f'(&{GROUP_FILTER}{search_filter})', ['distinguishedName'])])
+            return jsonify({"group_dn": group_dn, "users": users, "groups": groups}), 200
+
+        membership_graph.ensure_built()
+        if not membership_graph.knows(group_dn):
+            return jsonify({"error": "Group not found"}), 404
+        users, groups = membership_graph.effective_members(group_dn)
+        # Nesting loops reachable from this group, reported so they can be cleaned up
+        nested = {dn.lower() for dn in groups} | {group_dn.lower()}
+        cycles = [cycle for cycle in membership_graph.cycles() if any(dn.lower() in nested for dn in cycle)]
+        return jsonify({"group_dn": group_dn, "users": users, "groups": groups, "cycles": cycles}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
 
 
 @app.route('/groups', methods=['POST'])
@@ -220,14 +1247,12 @@ def add_group():
     """
     API endpoint to create a new group.
     """
-    conn = None
     try:
         data = request.json
         required_fields = ['name', 'description']
         if not all(field in data for field in required_fields):
             return jsonify({"error": "Missing required fields"}), 400
         
-        conn = get_ldap_connection()
         group_dn = f"CN={data['name']},{BASE_DN_GROUPS}"
         attributes = {
             'objectClass': ['top', 'group'],
@@ -236,48 +1261,63 @@ def add_group():
             'description': data['description']
         }
         
-        conn.add(group_dn, attributes=attributes)
-        
-        if conn.result['description'] != 'success':
-            return jsonify({"error": f"Failed to add group: {conn.result['description']}"}), 500
+        with ldap_connection() as conn:
+            conn.add(group_dn, attributes=attributes)
+            
+            if conn.result['description'] != 'success':
+                return jsonify({"error": f"Failed to add group: {conn.result['description']}"}), 500
+            invalidate_reads(GROUPS_TAG)
+            membership_graph.add_group(group_dn)
         
         return jsonify({"message": "Group added successfully"}), 201
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
+
+def delete_group_entry(samaccountname, conn=None):
+    """
+    Deletes one group by sAMAccountName and drops it from every cache.
+    Returns the outcome: { name, status: deleted|not-found|failed, ... }
+    """
+    outcome = {"name": samaccountname}
+    with ldap_connection(conn) as conn:
+        group = fetch_group_by_samaccountname(BASE_DN_GROUPS, samaccountname, ['distinguishedName', 'member'], conn=conn)
+
+        if not group:
+            return dict(outcome, status='not-found', error="Group non existent")
+
+        group_dn = group.get('distinguishedName')
+
+        conn.delete(group_dn)
+
+        if conn.result['description'] != 'success':
+            return dict(outcome, status='failed', error=f"Failed to delete group: {conn.result['description']}")
+        # Former members lose a memberOf value
+        invalidate_reads(GROUPS_TAG, USERS_TAG, group_dn, *(group.get('member') or []))
+        if directory_replica is not None:
+            directory_replica.delete_dn(group_dn)
+        membership_graph.remove(group_dn)
+        dn_resolver.forget_dn(group_dn)
+    return dict(outcome, status='deleted', distinguishedName=group_dn)
 
 @app.route('/groups', methods=['DELETE'])
 def delete_group():
     """
     API endpoint to delete a group by its sAMAccountName.
     """
-    conn = None
     try:
         samaccountname = request.args.get('name')
         if not samaccountname: 
             return jsonify({"error": "name argument (param) is required"}), 400
         
-        group = fetch_group_by_samaccountname(BASE_DN_GROUPS, samaccountname)
-        
-        if not group:
-            return jsonify({"error": "Group non existent"}), 404
-        
-        group_dn = group.get('distinguishedName')
-        
-        conn = get_ldap_connection()
-        conn.delete(group_dn)
-        
-        if conn.result['description'] != 'success':
-            return jsonify({"error": f"Failed to delete group: {conn.result['description']}"}), 500
+        outcome = delete_group_entry(samaccountname)
+        if outcome['status'] == 'not-found':
+            return jsonify({"error": outcome['error']}), 404
+        if outcome['status'] == 'failed':
+            return jsonify({"error": outcome['error']}), 500
         
         return jsonify({"message": "Group deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
 
 @app.route('/groups', methods=['PUT'])
 def update_group():
@@ -286,7 +1326,6 @@ def update_group():
     Selector: query param 'name' (sAMAccountName)
     Body: { new_name?, description? }
     """
-    conn = None
     try:
         current_name = request.args.get('name')
         if not current_name:
@@ -295,52 +1334,54 @@ def update_group():
         new_name = data.get('new_name')
         description = data.get('description')
 
-        group = fetch_group_by_samaccountname(BASE_DN_GROUPS, current_name)
-        if not group:
-            return jsonify({"error": "Group not found"}), 404
-
-        group_dn = group.get('distinguishedName')
-        if not group_dn:
-            return jsonify({"error": "Group DN not found"}), 400
-
-        conn = get_ldap_connection()
-        # Update description and sAMAccountName/name if provided
-        modifications = {}
-        if description is not None:
-            modifications['description'] = [(MODIFY_REPLACE, [description])]
-        if new_name is not None and new_name != current_name:
-            modifications['sAMAccountName'] = [(MODIFY_REPLACE, [new_name])]
-            modifications['name'] = [(MODIFY_REPLACE, [new_name])]
-
-        if modifications:
-            conn.modify(group_dn, modifications)
-            if conn.result['description'] != 'success':
-                return jsonify({"error": f"Failed to update attributes: {conn.result['description']}"}), 500
-
-        # If new_name provided, rename RDN (CN)
-        if new_name is not None and new_name != current_name:
-            try:
-                conn.modify_dn(group_dn, f"CN={new_name}", delete_old_dn=True)
+        with ldap_connection() as conn:
+            group = fetch_group_by_samaccountname(BASE_DN_GROUPS, current_name, ['distinguishedName', 'member'], conn=conn)
+            if not group:
+                return jsonify({"error": "Group not found"}), 404
+
+            group_dn = group.get('distinguishedName')
+            if not group_dn:
+                return jsonify({"error": "Group DN not found"}), 400
+
+            # Update description and sAMAccountName/name if provided
+            modifications = {}
+            if description is not None:
+                modifications['description'] = [(MODIFY_REPLACE, [description])]
+            if new_name is not None and new_name != current_name:
+                modifications['sAMAccountName'] = [(MODIFY_REPLACE, [new_name])]
+                modifications['name'] = [(MODIFY_REPLACE, [new_name])]
+
+            if modifications:
+                conn.modify(group_dn, modifications)
                 if conn.result['description'] != 'success':
-                    return jsonify({"error": f"Failed to rename group: {conn.result['description']}"}), 500
-                # success: compute new DN for response
-                group_dn = f"CN={new_name},{BASE_DN_GROUPS}"
-            except Exception as e:
-                return jsonify({"error": f"Rename failed: {str(e)}"}), 500
+                    return jsonify({"error": f"Failed to update attributes: {conn.result['description']}"}), 500
+                invalidate_reads(GROUPS_TAG, group_dn)
+                dn_resolver.forget('group', current_name)
+
+            # If new_name provided, rename RDN (CN)
+            if new_name is not None and new_name != current_name:
+                try:
+                    conn.modify_dn(group_dn, f"CN={new_name}", delete_old_dn=True)
+                    if conn.result['description'] != 'success':
+                        return jsonify({"error": f"Failed to rename group: {conn.result['description']}"}), 500
+                    # Members' memberOf values now carry the new DN
+                    invalidate_reads(GROUPS_TAG, USERS_TAG, group_dn, *(group.get('member') or []))
+                    # success: compute new DN for response
+                    membership_graph.rename(group_dn, f"CN={new_name},{BASE_DN_GROUPS}")
+                    dn_resolver.forget_dn(group_dn)
+                    group_dn = f"CN={new_name},{BASE_DN_GROUPS}"
+                except Exception as e:
+                    return jsonify({"error": f"Rename failed: {str(e)}"}), 500
 
         return jsonify({"message": "Group updated successfully", "distinguishedName": group_dn}), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
 
 @app.route('/groups/members', methods=['POST'])
 def add_user_to_group():
     """
     API endpoint to add a user to a group.
     """
-    conn = None
     try:
         data = request.json
         user_dn = data.get('user_dn')
@@ -348,27 +1389,24 @@ def add_user_to_group():
         if not user_dn or not group_dn:
             return jsonify({"error": "user_dn and group_dn are required"}), 400
 
-        conn = get_ldap_connection()
-        
-        # Add the user to the group by modifying the group's 'member' attribute
-        conn.modify(group_dn, {'member': [(MODIFY_ADD, [user_dn])]})
-        
-        if conn.result['description'] != 'success':
-            return jsonify({"error": conn.result['description']}), 500
+        with ldap_connection() as conn:
+            # Add the user to the group by modifying the group's 'member' attribute
+            conn.modify(group_dn, {'member': [(MODIFY_ADD, [user_dn])]})
+            
+            if conn.result['description'] != 'success':
+                return jsonify({"error": conn.result['description']}), 500
+            invalidate_reads(GROUPS_TAG, USERS_TAG, group_dn, user_dn)
+            membership_graph.add_member(group_dn, user_dn)
         
         return jsonify({"message": "User added to group successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
 
 @app.route('/groups/members', methods=['DELETE'])
 def remove_user_from_group():
     """
     API endpoint to remove a user from a group.
     """
-    conn = None
     try:
         user_dn = request.args.get('user_dn')
         group_dn = request.args.get('group_dn')
@@ -376,48 +1414,166 @@ def remove_user_from_group():
         if not user_dn or not group_dn:
             return jsonify({"error": "user_dn and group_dn parameters are required"}), 400
         
-        print(f"Removing user {user_dn} from group {group_dn}")  # Debug log
-        
-        conn = get_ldap_connection()
-        if not conn:
-            return jsonify({"error": "Failed to establish LDAP connection"}), 500
-
-        # Direct modification attempt without pre-validation
-        modifications = {'member': [(MODIFY_DELETE, [user_dn])]}
+        logger.debug("Removing user %s from group %s", user_dn, group_dn)
         
-        try:
-            conn.modify(group_dn, modifications)
-            result = conn.result
-            
-            # Log the LDAP result for debugging
-            print(f"LDAP modify result: {result}")
+        with ldap_connection() as conn:
+            # Direct modification attempt without pre-validation
+            modifications = {'member': [(MODIFY_DELETE, [user_dn])]}
             
-            if result['description'] == 'success':
-                return jsonify({"message": "User removed from group successfully"}), 200
-            else:
+            try:
+                conn.modify(group_dn, modifications)
+                result = conn.result
+                
+                logger.debug("LDAP modify result: %s", result)
+                
+                if result['description'] == 'success':
+                    invalidate_reads(GROUPS_TAG, USERS_TAG, group_dn, user_dn)
+                    membership_graph.remove_member(group_dn, user_dn)
+                    return jsonify({"message": "User removed from group successfully"}), 200
+                else:
+                    return jsonify({
+                        "error": "Failed to remove user from group",
+                        "ldap_error": result.get('description', 'Unknown error'),
+                        "message": result.get('message', '')
+                    }), 500
+                    
+            except Exception as modify_error:
+                logger.warning("LDAP modify error: %s", modify_error)
                 return jsonify({
-                    "error": "Failed to remove user from group",
-                    "ldap_error": result.get('description', 'Unknown error'),
-                    "message": result.get('message', '')
+                    "error": "LDAP modification failed",
+                    "details": str(modify_error)
                 }), 500
-                
-        except Exception as modify_error:
-            print(f"LDAP modify error: {str(modify_error)}")  # Debug log
-            return jsonify({
-                "error": "LDAP modification failed",
-                "details": str(modify_error)
-            }), 500
             
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")  # Debug log
+        logger.exception("Unexpected error removing user from group")
         return jsonify({"error": str(e)}), 500
-        
-    finally:
-        if conn:
-            try:
-                conn.unbind()
-            except Exception as unbind_error:
-                print(f"Unbind error (ignored): {str(unbind_error)}")  # Debug log
+
+# LDAP result codes that mean a membership change was already in effect
+_ALREADY_MEMBER_RESULTS = ('attributeOrValueExists', 'entryAlreadyExists')
+_NOT_MEMBER_RESULTS = ('noSuchAttribute', 'unwillingToPerform')
+
+
+def apply_member_changes(group_dn, adds, removes):
+    """
+    Applies many member adds/removes to one group with one multi-valued modify per
+    MEMBER_MODIFY_CHUNK values. A chunk that fails because a value is already
+    (or no longer) present is replayed one value at a time so those values are
+    reported as already-member/not-member instead of failing the rest.
+    Returns one outcome dict per (op, user_dn).
+    """
+    outcomes = []
+    changes = [('add', MODIFY_ADD, user_dn) for user_dn in adds] + [('remove', MODIFY_DELETE, user_dn) for user_dn in removes]
+    done = {'add': 'added', 'remove': 'removed'}
+    with ldap_connection() as conn:
+        for start in range(0, len(changes), MEMBER_MODIFY_CHUNK):
+            chunk = changes[start:start + MEMBER_MODIFY_CHUNK]
+            operations = []
+            for op, operation in (('add', MODIFY_ADD), ('remove', MODIFY_DELETE)):
+                values = [user_dn for change_op, _, user_dn in chunk if change_op == op]
+                if values:
+                    operations.append((operation, values))
+            conn.modify(group_dn, {'member': operations})
+            result = conn.result['description']
+            if result == 'success':
+                outcomes.extend({"group_dn": group_dn, "user_dn": user_dn, "op": op, "status": done[op]} for op, _, user_dn in chunk)
+                continue
+            if result not in _ALREADY_MEMBER_RESULTS + _NOT_MEMBER_RESULTS:
+                outcomes.extend({"group_dn": group_dn, "user_dn": user_dn, "op": op, "status": 'failed', "error": result}
+                                for op, _, user_dn in chunk)
+                continue
+            for op, operation, user_dn in chunk:
+                conn.modify(group_dn, {'member': [(operation, [user_dn])]})
+                result = conn.result['description']
+                if result == 'success':
+                    status = done[op]
+                elif op == 'add' and result in _ALREADY_MEMBER_RESULTS:
+                    status = 'already-member'
+                elif op == 'remove' and result in _NOT_MEMBER_RESULTS:
+                    status = 'not-member'
+                else:
+                    outcomes.append({"group_dn": group_dn, "user_dn": user_dn, "op": op, "status": 'failed', "error": result})
+                    continue
+                outcomes.append({"group_dn": group_dn, "user_dn": user_dn, "op": op, "status": status})
+
+    changed = [outcome for outcome in outcomes if outcome['status'] in ('added', 'removed')]
+    if changed:
+        invalidate_reads(GROUPS_TAG, USERS_TAG, group_dn, *(outcome['user_dn'] for outcome in changed))
+        for outcome in changed:
+            if outcome['status'] == 'added':
+                membership_graph.add_member(group_dn, outcome['user_dn'])
+            else:
+                membership_graph.remove_member(group_dn, outcome['user_dn'])
+    return outcomes
+
+
+def member_changes_by_group(data):
+    """
+    Merges the { add?: [{ user_dn, group_dn }], remove?: [...] } body of a member
+    batch into one change set per group: [{ group_dn, add: [user_dn], remove: [user_dn] }].
+    DNs are compared case-insensitively. Raises ValueError for a malformed body.
+    """
+    by_group = {}
+    for op in ('add', 'remove'):
+        pairs = data.get(op) or []
+        if not isinstance(pairs, list):
+            raise ValueError(f"{op} must be a list")
+        for pair in pairs:
+            if not isinstance(pair, dict) or not pair.get('user_dn') or not pair.get('group_dn'):
+                raise ValueError(f"Every {op} entry needs user_dn and group_dn")
+            group = by_group.setdefault(pair['group_dn'].lower(), {'group_dn': pair['group_dn'], 'add': {}, 'remove': {}})
+            group[op].setdefault(pair['user_dn'].lower(), pair['user_dn'])
+    if not by_group:
+        raise ValueError("add or remove is required")
+    for group in by_group.values():
+        conflicting = set(group['add']) & set(group['remove'])
+        if conflicting:
+            raise ValueError(f"Cannot both add and remove {group['add'][conflicting.pop()]} in {group['group_dn']}")
+    return [{'group_dn': group['group_dn'], 'add': list(group['add'].values()), 'remove': list(group['remove'].values())}
+            for group in by_group.values()]
+
+
+@app.route('/groups/members/batch', methods=['POST'])
+def batch_update_group_members():
+    """
+    API endpoint to add and remove many users across many groups at once.
+    Body: { add?: [{ user_dn, group_dn }], remove?: [{ user_dn, group_dn }] }
+    Changes are merged into one modify per group (chunked by MEMBER_MODIFY_CHUNK
+    values) and groups are processed in parallel. Returns one outcome per change:
+    added, removed, already-member, not-member (the last two are not errors) or failed.
+    The status is 200 when nothing failed, 207 otherwise.
+    """
+    try:
+        try:
+            groups = member_changes_by_group(request.json or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        results = []
+        with ThreadPoolExecutor(max_workers=min(BATCH_GROUP_WORKERS, len(groups)), thread_name_prefix='member-batch') as executor:
+            futures = {executor.submit(contextvars.copy_context().run, apply_member_changes, group['group_dn'], group['add'], group['remove']): group
+                       for group in groups}
+            for future, group in futures.items():
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    results.extend({"group_dn": group['group_dn'], "user_dn": user_dn, "op": op, "status": 'failed', "error": str(e)}
+                                   for op in ('add', 'remove') for user_dn in group[op])
+
+        summary = {}
+        for outcome in results:
+            summary[outcome['status']] = summary.get(outcome['status'], 0) + 1
+        code = 207 if summary.get('failed') else 200
+        return jsonify({"results": results, "summary": summary}), code
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Prometheus scrape endpoint: per-route latency histograms, LDAP operation
+    counts, results and latencies per DC, and connection pool utilization.
+    """
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
 # USER APIS
 @app.route('/test-connection', methods=['GET'])
@@ -426,70 +1582,281 @@ def test_connection():
     API endpoint to test the LDAP connection.
     """
     try:
-        conn = get_ldap_connection()
-        conn.unbind()
-        return jsonify({"message": "LDAP connection successful"}), 200
+        with ldap_connection():
+            pass
+        return jsonify({"message": "LDAP connection successful", "pool": ldap_pool.stats()}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    API endpoint exposing read cache hit/miss/eviction counters per kind,
+    plus the sAMAccountName -> DN resolver's and the single-flight layer's counters.
+    """
+    return jsonify(dict(directory_cache.stats(), resolver=dn_resolver.stats(), single_flight=single_flight.stats())), 200
+
+@app.route('/admission', methods=['GET'])
+def get_admission_stats():
+    """
+    API endpoint showing each admission budget's limit, connections in use,
+    queue depth and rejections, and the per-client rate limit.
+    """
+    return jsonify(dict(admission.stats(), rate_limit=rate_limiter.stats())), 200
+
+@app.route('/servers', methods=['GET'])
+def get_server_status():
+    """
+    API endpoint showing every configured domain controller's health, probe latency,
+    the DC writes are pinned to, and how much longer reads follow it.
+    """
+    return jsonify(dict(domain_controllers.status(), write_pool=write_pool.stats() if write_pool is not ldap_pool else None)), 200
+
+@app.route('/replica', methods=['GET'])
+def get_replica_status():
+    """
+    API endpoint to inspect the local replica: object counts, USN watermark and sync age.
+    """
+    if directory_replica is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(dict(directory_replica.status(), enabled=True,
+                        fresh=directory_replica.is_fresh(REPLICA_MAX_STALENESS),
+                        max_staleness=REPLICA_MAX_STALENESS)), 200
+
+@app.route('/replica/sync', methods=['POST'])
+def sync_replica():
+    """
+    API endpoint to run a replica sync now. Pass full=1 to reload every object.
+    """
+    if directory_replica is None:
+        return jsonify({"error": "Replica is not enabled"}), 404
+    try:
+        return jsonify(directory_replica.sync(full=request.args.get('full') in ('1', 'true', 'yes'))), 200
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@app.route('/membership/stats', methods=['GET'])
+def get_membership_stats():
+    """
+    API endpoint exposing the membership graph's size, age and nesting cycles.
+    """
+    return jsonify(dict(membership_graph.stats(), cycle_groups=membership_graph.cycles())), 200
+
+@app.route('/schema', methods=['GET'])
+def get_schema_status():
+    """
+    API endpoint to inspect the cached server DSE/schema.
+    Pass check=1 to compare it against the live server schema.
+    """
+    try:
+        status = server_info_cache.status()
+        if request.args.get('check') in ('1', 'true', 'yes'):
+            with ldap_connection() as conn:
+                status['changed'] = server_info_cache.schema_changed(conn)
+        return jsonify(status), 200
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@app.route('/schema/refresh', methods=['POST'])
+def refresh_schema():
+    """
+    API endpoint to re-read the server DSE/schema and replace the cached copy.
+    """
+    try:
+        return jsonify(refresh_server_info()), 200
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@app.cli.command('refresh-schema')
+def refresh_schema_command():
+    """
+    Re-read the server DSE/schema and replace the cached copy.
+    """
+    print(refresh_server_info())
+
 @app.route('/users', methods=['GET'])
+@conditional_get
 def list_users():
     """
     API endpoint to list all users.
+    With `page_size` and/or `cursor` query params, returns a single page instead:
+    { items: [...], next_cursor: str|null }
+    With `?stream=1` or `Accept: application/x-ndjson`, streams every user as NDJSON.
+    `fields=a,b,c` limits each user to the listed attributes.
+    Full listings come from the replica when it is fresh; `consistency=live` forces a directory read.
     """
-    conn = None
     try:
-        conn = get_ldap_connection()
-        search_filter = '(objectClass=user)'
-        conn.search(BASE_DN_USERS, search_filter, search_scope=SUBTREE, attributes=['*'])
-        
-        if not conn.entries:
+        consistency = read_consistency()
+        attributes = requested_attributes(user_search_attributes)
+        replica = from_replica(consistency, 'user', attributes)
+        if wants_stream():
+            if replica:
+                return ndjson_response(directory_replica.iter_objects('user', attributes))
+            return ndjson_response(iter_entries(BASE_DN_USERS, USER_FILTER, attributes))
+        cookie, page_size = page_request(BASE_DN_USERS, USER_FILTER, attributes)
+        if page_size is not None:
+            with ldap_connection() as conn:
+                server = cursor_connection_server(conn)
+                entries, next_cookie = search_page(conn, BASE_DN_USERS, USER_FILTER, attributes, page_size, cookie)
+                users = [entry_to_dict(entry, attributes) for entry in entries]
+            return jsonify(page_response(users, next_cookie, page_size, BASE_DN_USERS, USER_FILTER, attributes, server)), 200
+
+        def load_users():
+            return fetch_entries(BASE_DN_USERS, USER_FILTER, attributes)
+
+        if replica:
+            users = list(directory_replica.iter_objects('user', attributes))
+        else:
+            users = cached_read(consistency, 'user_list', tuple(attributes), load_users, tags=[USERS_TAG])
+
+        if not users:
             return jsonify({"error": "No users found"}), 404
         
-        users = []
-        for entry in conn.entries:
-            user = {attr: entry[attr].value for attr in entry.entry_attributes_as_dict}
-            users.append(user)
-            print(users)
-        
         return jsonify(users), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"LDAP connection failed: {str(e)}"}), 500
+
+@app.route('/users/search', methods=['GET'])
+def search_users():
+    """
+    API endpoint for the user search box: `q=` matched by ANR (or by prefix on the
+    comma-separated `in=` attributes: sAMAccountName, displayName, mail), at most
+    `limit` users, each limited to `fields=a,b,c` when given.
+    Always a live directory read: { items: [...], truncated: bool }
+    """
+    try:
+        return jsonify(search_directory(BASE_DN_USERS, USER_FILTER, user_search_attributes)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"LDAP connection failed: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
 
 @app.route('/users/membership', methods=['GET'])
 def list_user_groups():
     """
     API endpoint to list all groups a user is a member of.
     """
-    conn = None
     try:
         user_dn = request.args.get('user_dn')
         if not user_dn:
             return jsonify({"error": "user_dn param is required"}), 400
-        
-        conn = get_ldap_connection()
+        consistency = read_consistency()
         
         # The memberOf attribute is a list of group DNs the user belongs to.
         # This is a standard operational attribute on user objects in Active Directory.
-        conn.search(user_dn, '(objectClass=user)', attributes=['memberOf'])
+        groups_dns = fetch_user_groups_cached(user_dn, consistency)
         
-        if not conn.entries or 'memberOf' not in conn.entries[0]:
+        if not groups_dns:
             return jsonify({"error": "No groups found for user or user does not exist"}), 404
-        
-        groups_dns = conn.entries[0]['memberOf'].values
-        conn.unbind()
 
         # You might want to fetch more details about each group if needed.
         # For this example, we'll just return the DNs.
         return jsonify(groups_dns), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
+
+@app.route('/users/effective-groups', methods=['GET'])
+def list_user_effective_groups():
+    """
+    API endpoint to list every group a user belongs to, directly or through nested groups.
+    Answered from the in-memory membership graph; `consistency=live` asks the DC
+    with an LDAP_MATCHING_RULE_IN_CHAIN search instead.
+    """
+    try:
+        user_dn = request.args.get('user_dn')
+        if not user_dn:
+            return jsonify({"error": "user_dn param is required"}), 400
+        consistency = read_consistency()
+
+        if consistency == 'live':
+            search_filter = f'(&{GROUP_FILTER}(member:{IN_CHAIN_RULE}:={escape_filter_chars(user_dn)}))'
+            groups, direct = run_concurrently(
+                lambda: [entry['distinguishedName'] for entry in iter_entries(BASE_DN_GROUPS, search_filter, ['distinguishedName'])],
+                lambda: fetch_user_groups(user_dn))
+        else:
+            membership_graph.ensure_built()
+            groups = membership_graph.effective_groups(user_dn)
+            direct = membership_graph.direct_groups(user_dn)
+
+        if not groups:
+            return jsonify({"error": "No groups found for user or user does not exist"}), 404
+        return jsonify({"user_dn": user_dn, "direct_groups": direct, "effective_groups": groups}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+def add_user_entry(data, group_dns, conn):
+    """
+    Creates a disabled user from the POST /users fields and adds it to
+    DEFAULT_GROUP_DN plus every DN in `group_dns`.
+    Returns (user_dn, result, added_groups, failed_groups), where `result` is the
+    LDAP result description of the add; groups are only touched when it is 'success'.
+    """
+    first_name = data['first_name']
+    last_name = data['last_name']
+    email = data['email']
+    sAMAccountName = data['sAMAccountName']
+    full_name = f"{first_name} {last_name}"
+    user_dn = f"CN={full_name},{BASE_DN_USERS}"
+    
+    # Derive userPrincipalName: prefer configured UPN suffix; fall back to email
+    if UPN_SUFFIX:
+        user_principal_name = f"{sAMAccountName}@{UPN_SUFFIX}"
+    else:
+        user_principal_name = email
+
+    attributes = {
+        'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+        'cn': full_name,
+        'sn': last_name,
+        'givenName': first_name,
+        'displayName': full_name,
+        'userPrincipalName': user_principal_name,
+        'mail': email,
+        'sAMAccountName': sAMAccountName,
+        # Create as disabled account without password; can be enabled after setting password
+        'userAccountControl': 546,
+    }
+
+    conn.add(user_dn, attributes=attributes)
+    if conn.result['description'] != 'success':
+        return user_dn, conn.result['description'], [], []
+    invalidate_reads(USERS_TAG)
+
+    target_group_dns = set(group_dns)
+    if DEFAULT_GROUP_DN:
+        target_group_dns.add(DEFAULT_GROUP_DN)
+
+    added_groups = []
+    failed_groups = []
+    for grp_dn in target_group_dns:
+        conn.modify(grp_dn, {'member': [(MODIFY_ADD, [user_dn])]} )
+        if conn.result['description'] == 'success':
+            added_groups.append(grp_dn)
+            membership_graph.add_member(grp_dn, user_dn)
+        else:
+            failed_groups.append({ 'group_dn': grp_dn, 'error': conn.result['description'] })
+    invalidate_reads(GROUPS_TAG, USERS_TAG, user_dn, *added_groups)
+    return user_dn, 'success', added_groups, failed_groups
+
+
+def search_by_values(base_dn, object_filter, attribute, values, attributes, conn=None):
+    """
+    Fetches every object whose `attribute` equals one of `values`, using one
+    OR-filter search per LDAP_OR_FILTER_CHUNK values instead of one search each.
+    """
+    values = list(dict.fromkeys(values))
+    with ldap_connection(conn) as conn:
+        for start in range(0, len(values), LDAP_OR_FILTER_CHUNK):
+            chunk = values[start:start + LDAP_OR_FILTER_CHUNK]
+            clauses = ''.join(f'({attribute}={escape_filter_chars(value)})' for value in chunk)
+            yield from iter_entries(base_dn, f'(&{object_filter}(|{clauses}))', attributes, conn=conn)
+
 
 @app.route('/users', methods=['POST'])
 def create_user():
@@ -497,72 +1864,23 @@ def create_user():
     API endpoint to create a new user and add them to the default group.
     Now requires a password field and enforces password complexity.
     """
-    conn = None
     try:
         data = request.json
         required_fields = ['first_name', 'last_name', 'email', 'sAMAccountName']
         if not all(field in data for field in required_fields):
             return jsonify({"error": "Missing required fields"}), 400
 
-        first_name = data['first_name']
-        last_name = data['last_name']
-        email = data['email']
-        sAMAccountName = data['sAMAccountName']
-        requested_groups = data.get('memberOf', []) or []  # list of group sAMAccountName or name strings
-        full_name = f"{first_name} {last_name}"
-        user_dn = f"CN={full_name},{BASE_DN_USERS}"
-        
-        # Derive userPrincipalName: prefer configured UPN suffix; fall back to email
-        if UPN_SUFFIX:
-            user_principal_name = f"{sAMAccountName}@{UPN_SUFFIX}"
-        else:
-            user_principal_name = email
-
-        attributes = {
-            'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
-            'cn': full_name,
-            'sn': last_name,
-            'givenName': first_name,
-            'displayName': full_name,
-            'userPrincipalName': user_principal_name,
-            'mail': email,
-            'sAMAccountName': sAMAccountName,
-            # Create as disabled account without password; can be enabled after setting password
-            'userAccountControl': 546,
-        }
-
-        conn = get_ldap_connection()
-        
-        # Step 1: Add the user
-        conn.add(user_dn, attributes=attributes)
-        if conn.result['description'] != 'success':
-            return jsonify({'error': f"Failed to add user: {conn.result['description']}"}), 400
-
+        requested_groups = group_names(data.get('memberOf'))
 
-        # Step 2: Compute target groups to add membership to (default + requested)
-        target_group_dns = set()
-        if DEFAULT_GROUP_DN:
-            target_group_dns.add(DEFAULT_GROUP_DN)
+        with ldap_connection() as conn:
+            # Step 1: Resolve all requested group names to DNs in one lookup (the default group is always added);
+            # unknown names are ignored
+            target_group_dns = set(dn_resolver.resolve('group', requested_groups, conn=conn).values())
 
-        # Resolve each requested group to its DN
-        for grp_name in requested_groups:
-            try:
-                group = fetch_group_by_samaccountname(BASE_DN_GROUPS, grp_name)
-                if group and group.get('distinguishedName'):
-                    target_group_dns.add(group['distinguishedName'])
-            except Exception:
-                # Ignore resolution errors for individual groups; continue with others
-                continue
-
-        # Step 3: Add user to each target group
-        added_groups = []
-        failed_groups = []
-        for grp_dn in target_group_dns:
-            conn.modify(grp_dn, {'member': [(MODIFY_ADD, [user_dn])]} )
-            if conn.result['description'] == 'success':
-                added_groups.append(grp_dn)
-            else:
-                failed_groups.append({ 'group_dn': grp_dn, 'error': conn.result['description'] })
+            # Step 2: Add the user and its memberships
+            user_dn, result, added_groups, failed_groups = add_user_entry(data, target_group_dns, conn)
+            if result != 'success':
+                return jsonify({'error': f"Failed to add user: {result}"}), 400
 
         if failed_groups and not added_groups:
             return jsonify({'error': 'User created, but failed to add to any groups', 'details': failed_groups}), 500
@@ -570,58 +1888,180 @@ def create_user():
         return jsonify({'message': 'User created successfully', 'added_groups': added_groups, 'failed_groups': failed_groups}), 201
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
 
-@app.route('/users', methods=['DELETE'])
-def delete_user():
+@app.route('/users/bulk', methods=['POST'])
+def bulk_create_users():
     """
-    API endpoint to delete a user by sAMAccountName.
+    API endpoint to create many users from a CSV (text/csv) or NDJSON
+    (application/x-ndjson) body. Rows carry the POST /users fields; CSV
+    `memberOf` cells separate group names with ';'.
+
+    Every row is validated and every group name resolved before anything is
+    created; any problem returns a 400 listing the bad rows. Users are then
+    created across BULK_WORKERS pooled connections and one NDJSON line is
+    streamed per row as soon as it finishes:
+    { row, sAMAccountName, status: created|failed|skipped-existing, ... }
+    followed by a final { summary: {...} } line.
     """
-    conn = None
     try:
-        sAM = request.args.get('sam')
-        if not sAM:
-            return jsonify({"error": "sam query parameter is required"}), 400
+        rows = []
+        for row in parse_rows(request.stream, request.mimetype):
+            rows.append(row)
+            if len(rows) > BULK_MAX_ROWS:
+                return jsonify({"error": f"At most {BULK_MAX_ROWS} rows can be imported at once"}), 413
+    except BulkRowError as e:
+        return jsonify({"error": str(e)}), 400
+    if not rows:
+        return jsonify({"error": "No rows found"}), 400
+
+    errors = {}
+    first_row = {}
+    for number, row in enumerate(rows, start=1):
+        problems = validate_row(row)
+        sam = row.get('sAMAccountName')
+        if isinstance(sam, str) and sam:
+            if sam.lower() in first_row:
+                problems.append(f"duplicate sAMAccountName (first seen in row {first_row[sam.lower()]})")
+            else:
+                first_row[sam.lower()] = number
+        if problems:
+            errors[number] = problems
+
+    try:
+        # One pass for all group names and one for already existing accounts, side by side
+        requested_groups = {name for row in rows for name in row.get('memberOf') or [] if isinstance(name, str)}
+        sams = [rows[number - 1]['sAMAccountName'] for number in first_row.values()]
+        resolved, existing = run_concurrently(
+            lambda: dn_resolver.resolve('group', requested_groups),
+            lambda: {user['sAMAccountName'].lower()
+                     for user in search_by_values(BASE_DN_USERS, USER_FILTER, 'sAMAccountName', sams, ['sAMAccountName'])})
+        group_dns = {name.lower(): dn for name, dn in resolved.items()}
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-        user = fetch_user_by_samaccountname(BASE_DN_USERS, sAM)
+    for number, row in enumerate(rows, start=1):
+        unknown = [name for name in row.get('memberOf') or [] if isinstance(name, str) and name.lower() not in group_dns]
+        if unknown:
+            errors.setdefault(number, []).append(f"unknown group(s): {', '.join(unknown)}")
+    if errors:
+        return jsonify({
+            "error": "Invalid rows; no users were created",
+            "rows": [{"row": number, "sAMAccountName": rows[number - 1].get('sAMAccountName'), "errors": problems}
+                     for number, problems in sorted(errors.items())],
+        }), 400
+
+    def create_row(number, row):
+        outcome = {"row": number, "sAMAccountName": row['sAMAccountName']}
+        if row['sAMAccountName'].lower() in existing:
+            return dict(outcome, status='skipped-existing')
+        try:
+            with ldap_connection() as conn:
+                user_dn, result, added_groups, failed_groups = add_user_entry(
+                    row, {group_dns[name.lower()] for name in row.get('memberOf') or []}, conn)
+        except Exception as e:
+            return dict(outcome, status='failed', error=str(e))
+        if result == 'entryAlreadyExists':
+            return dict(outcome, status='skipped-existing', distinguishedName=user_dn)
+        if result != 'success':
+            return dict(outcome, status='failed', error=f"Failed to add user: {result}")
+        return dict(outcome, status='created', distinguishedName=user_dn,
+                    added_groups=added_groups, failed_groups=failed_groups)
+
+    def results():
+        counts = {'created': 0, 'failed': 0, 'skipped-existing': 0}
+        executor = ThreadPoolExecutor(max_workers=min(BULK_WORKERS, len(rows)), thread_name_prefix='bulk-users')
+        try:
+            futures = [executor.submit(contextvars.copy_context().run, create_row, number, row) for number, row in enumerate(rows, start=1)]
+            for future in as_completed(futures):
+                outcome = future.result()
+                counts[outcome['status']] += 1
+                yield outcome
+        finally:
+            # Stop queued rows if the client goes away mid-import
+            executor.shutdown(wait=False, cancel_futures=True)
+        yield {"summary": dict(counts, total=len(rows))}
+
+    return ndjson_response(results())
+
+def delete_user_entry(samaccountname, conn=None):
+    """
+    Deletes one user by sAMAccountName and drops it from every cache.
+    Returns the outcome: { sAMAccountName, status: deleted|not-found|failed, ... }
+    """
+    outcome = {"sAMAccountName": samaccountname}
+    with ldap_connection(conn) as conn:
+        user = fetch_user_by_samaccountname(BASE_DN_USERS, samaccountname, ['distinguishedName', 'memberOf'], conn=conn)
         if not user:
-            return jsonify({"error": "User not found"}), 404
+            return dict(outcome, status='not-found', error="User not found")
 
         user_dn = user.get('distinguishedName')
         if not user_dn:
-            return jsonify({"error": "User DN not found"}), 400
+            return dict(outcome, status='failed', error="User DN not found")
 
-        conn = get_ldap_connection()
         conn.delete(user_dn)
 
         if conn.result['description'] != 'success':
-            return jsonify({"error": f"Failed to delete user: {conn.result['description']}"}), 500
+            return dict(outcome, status='failed', error=f"Failed to delete user: {conn.result['description']}")
+        # The user disappears from the member list of every group it belonged to
+        invalidate_reads(USERS_TAG, GROUPS_TAG, user_dn, *(user.get('memberOf') or []))
+        if directory_replica is not None:
+            directory_replica.delete_dn(user_dn)
+        membership_graph.remove(user_dn)
+        dn_resolver.forget_dn(user_dn)
+    return dict(outcome, status='deleted', distinguishedName=user_dn)
+
+@app.route('/users', methods=['DELETE'])
+def delete_user():
+    """
+    API endpoint to delete a user by sAMAccountName.
+    """
+    try:
+        sAM = request.args.get('sam')
+        if not sAM:
+            return jsonify({"error": "sam query parameter is required"}), 400
+
+        outcome = delete_user_entry(sAM)
+        if outcome['status'] == 'not-found':
+            return jsonify({"error": outcome['error']}), 404
+        if outcome['status'] == 'failed':
+            return jsonify({"error": outcome['error']}), 400 if outcome['error'] == "User DN not found" else 500
 
         return jsonify({"message": "User deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.unbind()
 
 @app.route('/users/one', methods=['GET'])
+@conditional_get
 def get_user():
     """
     API endpoint to get a single user by sAMAccountName including group DNs.
+    `fields=a,b,c` limits the user to the listed attributes.
+    Served from the replica when it is fresh; `consistency=live` forces a directory read.
     """
     try:
         sAM = request.args.get('sam')
         if not sAM:
             return jsonify({"error": "sam query parameter is required"}), 400
-        user = fetch_user_by_samaccountname(BASE_DN_USERS, sAM)
+        consistency = read_consistency()
+        requested = requested_attributes(user_search_attributes)
+        # The user's group DNs come back with the user itself instead of a second lookup
+        attributes = requested + [name for name in ('distinguishedName', 'memberOf') if name not in requested]
+        user = None
+        if from_replica(consistency, 'user', attributes):
+            # A miss falls through to the directory: the user may be newer than the last sync
+            user = directory_replica.get_by_sam('user', sAM, attributes)
+        if user is None:
+            user = cached_read(consistency, 'user', (sAM.lower(), tuple(attributes)),
+                               lambda: fetch_user_by_samaccountname(BASE_DN_USERS, sAM, attributes),
+                               tags=lambda u: [u.get('distinguishedName')])
         if not user:
             return jsonify({"error": "User not found"}), 404
-        member_dns = []
-        if 'distinguishedName' in user:
-            member_dns = fetch_user_groups(user['distinguishedName'])
+        member_dns = user.get('memberOf') or []
+        if 'memberOf' not in requested:
+            user = {name: value for name, value in user.items() if name != 'memberOf'}
         return jsonify({"user": user, "memberOf": member_dns}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
@@ -633,88 +2073,372 @@ def update_user():
     Update user basic attributes and group memberships by sAMAccountName selector.
     Accepts JSON: { first_name, last_name, email, memberOf: [group names], new_password?: string }
     """
-    conn = None
     try:
         sAM = request.args.get('sam')
         if not sAM:
             return jsonify({"error": "sam query parameter is required"}), 400
         data = request.json or {}
-        user = fetch_user_by_samaccountname(BASE_DN_USERS, sAM)
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-        user_dn = user.get('distinguishedName')
-        if not user_dn:
-            return jsonify({"error": "User DN not found"}), 400
-
-        # Prepare attribute modifications
-        modifications = {}
-        first_name = data.get('first_name')
-        last_name = data.get('last_name')
-        email = data.get('email')
-        if first_name is not None:
-            modifications['givenName'] = [(MODIFY_REPLACE, [first_name])]
-        if last_name is not None:
-            modifications['sn'] = [(MODIFY_REPLACE, [last_name])]
-        # update displayName (but do NOT touch cn here; cn is the RDN)
-        if first_name is not None or last_name is not None:
-            display = f"{first_name or user.get('givenName', '')} {last_name or user.get('sn', '')}".strip()
-            modifications['displayName'] = [(MODIFY_REPLACE, [display])]
-        if email is not None:
-            modifications['mail'] = [(MODIFY_REPLACE, [email])]
-            # Update UPN to match policy
-            if 'sAMAccountName' in user:
-                upn = f"{user['sAMAccountName']}@{UPN_SUFFIX}" if 'UPN_SUFFIX' in globals() and UPN_SUFFIX else email
-                modifications['userPrincipalName'] = [(MODIFY_REPLACE, [upn])]
-
-        conn = get_ldap_connection()
-        if modifications:
-            conn.modify(user_dn, modifications)
-            if conn.result['description'] != 'success':
-                return jsonify({"error": f"Failed to update attributes: {conn.result['description']}"}), 500
-
-        # If name changed, attempt to rename CN (modify DN). Safe to skip on failure.
-        if (first_name is not None) or (last_name is not None):
-            new_cn = f"{first_name or user.get('givenName', '')} {last_name or user.get('sn', '')}".strip()
-            current_cn = user.get('cn')
-            if new_cn and current_cn and new_cn != current_cn:
-                try:
-                    conn.modify_dn(user_dn, f"CN={new_cn}", delete_old_dn=True)
+        with ldap_connection() as conn:
+            user = fetch_user_by_samaccountname(BASE_DN_USERS, sAM, ['distinguishedName', 'sAMAccountName', 'cn', 'givenName', 'sn', 'memberOf'], conn=conn)
+            if not user:
+                return jsonify({"error": "User not found"}), 404
+            user_dn = user.get('distinguishedName')
+            if not user_dn:
+                return jsonify({"error": "User DN not found"}), 400
+
+            # Prepare attribute modifications
+            modifications = {}
+            first_name = data.get('first_name')
+            last_name = data.get('last_name')
+            email = data.get('email')
+            if first_name is not None:
+                modifications['givenName'] = [(MODIFY_REPLACE, [first_name])]
+            if last_name is not None:
+                modifications['sn'] = [(MODIFY_REPLACE, [last_name])]
+            # update displayName (but do NOT touch cn here; cn is the RDN)
+            if first_name is not None or last_name is not None:
+                display = f"{first_name or user.get('givenName', '')} {last_name or user.get('sn', '')}".strip()
+                modifications['displayName'] = [(MODIFY_REPLACE, [display])]
+            if email is not None:
+                modifications['mail'] = [(MODIFY_REPLACE, [email])]
+                # Update UPN to match policy
+                if 'sAMAccountName' in user:
+                    upn = f"{user['sAMAccountName']}@{UPN_SUFFIX}" if 'UPN_SUFFIX' in globals() and UPN_SUFFIX else email
+                    modifications['userPrincipalName'] = [(MODIFY_REPLACE, [upn])]
+
+            if modifications:
+                conn.modify(user_dn, modifications)
+                if conn.result['description'] != 'success':
+                    return jsonify({"error": f"Failed to update attributes: {conn.result['description']}"}), 500
+                # Group member listings embed the user's attributes
+                invalidate_reads(USERS_TAG, user_dn)
+
+            # If name changed, attempt to rename CN (modify DN). Safe to skip on failure.
+            if (first_name is not None) or (last_name is not None):
+                new_cn = f"{first_name or user.get('givenName', '')} {last_name or user.get('sn', '')}".strip()
+                current_cn = user.get('cn')
+                if new_cn and current_cn and new_cn != current_cn:
+                    try:
+                        conn.modify_dn(user_dn, f"CN={new_cn}", delete_old_dn=True)
+                        if conn.result['description'] == 'success':
+                            # Every group the user belongs to now lists the new DN
+                            invalidate_reads(USERS_TAG, GROUPS_TAG, user_dn, *(user.get('memberOf') or []))
+                            membership_graph.rename(user_dn, f"CN={new_cn},{BASE_DN_USERS}")
+                            dn_resolver.forget_dn(user_dn)
+                            user_dn = f"CN={new_cn},{BASE_DN_USERS}"
+                    except Exception:
+                        pass
+
+            # Handle groups
+            requested_groups = data.get('memberOf')
+            added_groups = []
+            removed_groups = []
+            if isinstance(requested_groups, list):
+                current_group_dns = set(fetch_user_groups(user_dn, conn=conn))
+                target_dns = set()
+                # Always include default group
+                if DEFAULT_GROUP_DN:
+                    target_dns.add(DEFAULT_GROUP_DN)
+                target_dns |= set(dn_resolver.resolve('group', group_names(requested_groups), conn=conn).values())
+                to_add = target_dns - current_group_dns
+                to_remove = current_group_dns - target_dns
+                for dn in to_add:
+                    conn.modify(dn, {'member': [(MODIFY_ADD, [user_dn])]} )
                     if conn.result['description'] == 'success':
-                        user_dn = f"CN={new_cn},{BASE_DN_USERS}"
-                except Exception:
-                    pass
-
-        # Handle groups
-        requested_groups = data.get('memberOf')
-        added_groups = []
-        removed_groups = []
-        if isinstance(requested_groups, list):
-            current_group_dns = set(fetch_user_groups(user_dn))
-            target_dns = set()
-            # Always include default group
-            if DEFAULT_GROUP_DN:
-                target_dns.add(DEFAULT_GROUP_DN)
-            for grp_name in requested_groups:
-                group = fetch_group_by_samaccountname(BASE_DN_GROUPS, grp_name)
-                if group and group.get('distinguishedName'):
-                    target_dns.add(group['distinguishedName'])
-            to_add = target_dns - current_group_dns
-            to_remove = current_group_dns - target_dns
-            for dn in to_add:
-                conn.modify(dn, {'member': [(MODIFY_ADD, [user_dn])]} )
-                if conn.result['description'] == 'success':
-                    added_groups.append(dn)
-            for dn in to_remove:
-                conn.modify(dn, {'member': [(MODIFY_DELETE, [user_dn])]} )
-                if conn.result['description'] == 'success':
-                    removed_groups.append(dn)
+                        added_groups.append(dn)
+                        membership_graph.add_member(dn, user_dn)
+                for dn in to_remove:
+                    conn.modify(dn, {'member': [(MODIFY_DELETE, [user_dn])]} )
+                    if conn.result['description'] == 'success':
+                        removed_groups.append(dn)
+                        membership_graph.remove_member(dn, user_dn)
+                if added_groups or removed_groups:
+                    invalidate_reads(USERS_TAG, GROUPS_TAG, user_dn, *added_groups, *removed_groups)
 
         return jsonify({"message": "User updated successfully", "added_groups": added_groups, "removed_groups": removed_groups}), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+# EXPORT
+# Whole listings streamed from a paged search into a file, for GET /export, `flask export` and export jobs
+
+# kind -> (base DN, filter, default attributes) of the listings that can be exported
+EXPORT_SOURCES = {
+    'users': (BASE_DN_USERS, USER_FILTER, user_search_attributes),
+    'groups': (BASE_DN_GROUPS, GROUP_FILTER, group_search_attributes),
+}
+
+
+def iter_export_entries(kind, attributes):
+    """
+    Yields every entry of an export listing, always read from the DC, one page at a time.
+    """
+    base_dn, search_filter, _ = EXPORT_SOURCES[kind]
+    with ldap_connection() as conn:
+        for entries in iter_search_pages(conn, base_dn, search_filter, attributes, LDAP_PAGE_SIZE):
+            for entry in entries:
+                yield entry_to_dict(entry, attributes)
+
+
+def write_export_file(path, kind, fmt, attributes, cancelled=None):
+    """
+    Writes one export listing to `path`, through a `.part` file that is renamed
+    into place once complete. `cancelled()`, when given, is checked every
+    LDAP_PAGE_SIZE entries. Returns the number of entries written.
+    """
+    count = 0
+
+    def entries():
+        nonlocal count
+        for entry in iter_export_entries(kind, attributes):
+            yield entry
+            count += 1
+            if cancelled is not None and count % LDAP_PAGE_SIZE == 0 and cancelled():
+                raise JobCancelled()
+
+    try:
+        with open(path + '.part', 'wb') as out:
+            for chunk in iter_export(entries(), fmt, attributes, app.json.dumps):
+                out.write(chunk)
+        os.replace(path + '.part', path)
     finally:
-        if conn:
-            conn.unbind()
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+    return count
+
+
+@app.route('/export', methods=['GET'])
+def export_directory():
+    """
+    API endpoint to download every user or group as one file, streamed from a
+    paged search as it is read.
+    Query params: kind=users|groups (default users), format=ndjson|csv|parquet
+    (default ndjson), fields=a,b,c. NDJSON and CSV are gzip-compressed; Parquet needs pyarrow.
+    """
+    kind = request.args.get('kind', 'users')
+    fmt = request.args.get('format', 'ndjson')
+    try:
+        if kind not in EXPORT_SOURCES:
+            raise ValueError(f"kind must be one of: {', '.join(EXPORT_SOURCES)}")
+        check_format(fmt)
+        attributes = requested_attributes(EXPORT_SOURCES[kind][2])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        chunks = iter_export(iter_export_entries(kind, attributes), fmt, attributes, app.json.dumps)
+        # The first chunk is read before the response starts, so a failed bind or search is still a 500
+        first = next(chunks, b'')
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+    def generate():
+        try:
+            yield first
+            yield from chunks
+        except Exception:
+            # There is no way to report an error in a compressed file; the download ends
+            # truncated, which gzip and Parquet readers reject
+            logger.exception("Export of %s failed after streaming started", kind)
+            raise
+
+    name = file_name(kind, fmt)
+    response = Response(stream_with_context(generate()), mimetype=media_type(name))
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+@app.cli.command('export')
+@click.option('--kind', 'kinds', type=click.Choice(list(EXPORT_SOURCES)), multiple=True,
+              help='Listing to export; repeat for several (default: all).')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson', show_default=True)
+@click.option('--fields', default='', help='Comma-separated attributes (default: those of GET /users or GET /groups).')
+@click.option('--output-dir', default='.', type=click.Path(file_okay=False), show_default=True)
+def export_command(kinds, fmt, fields, output_dir):
+    """
+    Write every user and group to files in OUTPUT_DIR (users.ndjson.gz, groups.ndjson.gz, ...).
+    """
+    try:
+        check_format(fmt)
+        plan = [(kind, requested_attributes(EXPORT_SOURCES[kind][2], fields)) for kind in kinds or EXPORT_SOURCES]
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    os.makedirs(output_dir, exist_ok=True)
+    for kind, attributes in plan:
+        path = os.path.join(output_dir, file_name(kind, fmt))
+        started = time.perf_counter()
+        count = write_export_file(path, kind, fmt, attributes)
+        print(f"{path}: {count} entries, {os.path.getsize(path)} bytes in {time.perf_counter() - started:.1f}s")
+
+# BACKGROUND JOBS
+# Every job kind is a route's logic run item by item on a job worker
+
+
+def _job_step(run, write=False):
+    """
+    A job task drawing on the bulk admission budget, with its connections from
+    the write DC's pool when it writes, like a bulk request's.
+    """
+    def run_step(item, context):
+        tokens = (workload.set('bulk'), writing.set(write))
+        try:
+            return run(item, context)
+        finally:
+            workload.reset(tokens[0])
+            writing.reset(tokens[1])
+    return run_step
+
+
+def _plan_names(params, key):
+    names = params.get(key)
+    if not isinstance(names, list) or not names or not all(isinstance(name, str) and name.strip() for name in names):
+        raise ValueError(f"params.{key} must be a non-empty list of names")
+    # Duplicates would only fail as not-found the second time
+    return list({name.strip().lower(): name.strip() for name in names}.values())
+
+
+def _run_member_changes(item, context):
+    outcomes = apply_member_changes(item['group_dn'], item['add'], item['remove'])
+    summary = {}
+    for outcome in outcomes:
+        summary[outcome['status']] = summary.get(outcome['status'], 0) + 1
+    return {"status": 'failed' if summary.get('failed') else 'applied', "group_dn": item['group_dn'],
+            "results": outcomes, "summary": summary}
+
+
+def _plan_export(params):
+    kinds = params.get('kinds') or list(EXPORT_SOURCES)
+    if not isinstance(kinds, list) or any(kind not in EXPORT_SOURCES for kind in kinds):
+        raise ValueError(f"params.kinds must be a list of: {', '.join(EXPORT_SOURCES)}")
+    fields = params.get('fields')
+    if fields is not None and not isinstance(fields, str):
+        raise ValueError("params.fields must be a comma-separated string")
+    fmt = params.get('format', 'ndjson')
+    check_format(fmt)
+    return [{'kind': kind, 'format': fmt, 'attributes': requested_attributes(EXPORT_SOURCES[kind][2], fields or '')}
+            for kind in dict.fromkeys(kinds)]
+
+
+def _run_export(item, context):
+    """
+    Writes one listing into the job's files, checking for cancellation every LDAP_PAGE_SIZE entries.
+    """
+    # Jobs queued before export formats existed have no format
+    fmt = item.get('format', 'ndjson')
+    name = file_name(item['kind'], fmt)
+    path = context.artifact_path(name)
+    count = write_export_file(path, item['kind'], fmt, item['attributes'], context.cancelled)
+    return {"status": 'exported', "kind": item['kind'], "file": name, "entries": count, "bytes": os.path.getsize(path)}
+
+
+job_queue = JobQueue(
+    JOBS_PATH,
+    {
+        'users.delete': JobTask(lambda params: _plan_names(params, 'sAMAccountNames'),
+                                _job_step(lambda name, context: delete_user_entry(name), write=True)),
+        'groups.delete': JobTask(lambda params: _plan_names(params, 'names'),
+                                 _job_step(lambda name, context: delete_group_entry(name), write=True)),
+        'groups.members.batch': JobTask(member_changes_by_group, _job_step(_run_member_changes, write=True)),
+        'export': JobTask(_plan_export, _job_step(_run_export)),
+    },
+    JOB_ARTIFACT_DIR,
+    workers=JOB_WORKERS,
+    retention=JOB_RETENTION_DAYS * 24 * 3600,
+    max_items=JOB_MAX_ITEMS,
+    serialize=app.json.dumps,
+    deserialize=app.json.loads,
+)
+job_queue.start()
+registry.register(Gauge(
+    'leapad_jobs', 'Background jobs by status.',
+    lambda: list(((status,), count) for status, count in job_queue.counts().items()), ('status',)))
+
+
+def _int_arg(name, default, low, high):
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    API endpoint to queue a background job.
+    Body: { kind, params }, where kind is one of
+        users.delete:          params { sAMAccountNames: [...] }
+        groups.delete:         params { names: [...] }
+        groups.members.batch:  params as the body of POST /groups/members/batch
+        export:                params { kinds?: ["users", "groups"], format?: "ndjson"|"csv"|"parquet", fields?: "a,b" }
+    Returns 202 with the job; poll GET /jobs/<id> for progress and results.
+    """
+    try:
+        data = request.json or {}
+        params = data.get('params') or {}
+        if not isinstance(params, dict):
+            return jsonify({"error": "params must be an object"}), 400
+        job = job_queue.submit(data.get('kind'), params)
+        response = jsonify(job)
+        response.headers['Location'] = f"/jobs/{job['id']}"
+        return response, 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    API endpoint listing the most recent jobs (without item results), optionally filtered by status.
+    """
+    try:
+        return jsonify(job_queue.list(request.args.get('status'), _int_arg('limit', 50, 1, 500))), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    API endpoint for a job's progress (done of total, summary by item status) and
+    the results of its items, `limit` at a time from `offset`.
+    """
+    try:
+        job = job_queue.get(job_id, _int_arg('offset', 0, 0, JOB_MAX_ITEMS), _int_arg('limit', 100, 0, 1000))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    API endpoint to cancel a job. A queued job is cancelled at once; a running
+    one stops before its next item, keeping the results of the items already done.
+    """
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] not in ('queued', 'running', 'cancelled'):
+        return jsonify({"error": f"Job already {job['status']}"}), 409
+    return jsonify(job), 202 if job['status'] == 'running' else 200
+
+@app.route('/jobs/<job_id>/files/<name>', methods=['GET'])
+def get_job_file(job_id, name):
+    """
+    API endpoint to download a file written by a job (e.g. users.ndjson.gz from an export).
+    """
+    job = job_queue.get(job_id, limit=JOB_MAX_ITEMS)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    # Only names a job reported, so the path cannot escape the artifact directory
+    if name not in {(item['result'] or {}).get('file') for item in job['items']}:
+        return jsonify({"error": "File not found"}), 404
+    path = os.path.join(JOB_ARTIFACT_DIR, f"{job_id}.{name}")
+    if not os.path.exists(path):
+        return jsonify({"error": "File not found"}), 404
+    return send_file(path, mimetype=media_type(name), as_attachment=True, download_name=name)
 
 if __name__ == '__main__':
     app.run(debug=True)
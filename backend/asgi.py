@@ -0,0 +1,213 @@
+"""
+ASGI entry point: serves the same routes as app.py from an asyncio event loop.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Connections are held by the event loop, so thousands of open requests cost
+coroutines instead of threads. The Flask views themselves do blocking LDAP
+I/O; they run on a bounded thread pool (ASGI_WORKERS, by default as many as
+pooled LDAP connections) so a burst queues cheaply on the loop instead of
+spawning threads that would only wait for a pooled connection. The queue in
+front of that pool is bounded too: past ASGI_MAX_BACKLOG waiting requests, or
+after ASGI_QUEUE_TIMEOUT seconds of waiting, a request is answered with 503
+and Retry-After, as the LDAP admission budgets would. Routes that never touch
+LDAP (app.LOCAL_ENDPOINTS, e.g. /metrics) run on a small pool of their own so
+they are not stuck behind LDAP work.
+Streamed responses (NDJSON) are pulled one chunk at a time on the same pool.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+from app import (app, admission, ldap_pool, write_pool, lookup_executor, LDAP_MAX_QUEUE, LDAP_POOL_SIZE,
+                 LDAP_QUEUE_TIMEOUT, LOCAL_ENDPOINTS)
+
+ASGI_WORKERS = int(os.environ.get("ASGI_WORKERS", str(LDAP_POOL_SIZE)))
+# Largest request body accepted (bytes); POST /users/bulk is the biggest caller
+ASGI_MAX_BODY = int(os.environ.get("ASGI_MAX_BODY", str(32 * 1024 * 1024)))
+
+# Most requests left waiting for a worker, and the longest one may wait (seconds),
+# before requests are turned away with 503
+ASGI_MAX_BACKLOG = int(os.environ.get("ASGI_MAX_BACKLOG", str(LDAP_MAX_QUEUE)))
+ASGI_QUEUE_TIMEOUT = float(os.environ.get("ASGI_QUEUE_TIMEOUT", str(LDAP_QUEUE_TIMEOUT)))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix='asgi')
+# LOCAL_ENDPOINTS run here
+local_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='asgi-local')
+
+# Requests whose view is queued or running on `executor`; only touched on the event loop
+_starting = 0
+
+
+def _environ(scope, body):
+    """
+    Builds the WSGI environ for one ASGI HTTP scope.
+    """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    """
+    Collects the request body; returns None once it grows past ASGI_MAX_BODY.
+    """
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return bytes(body)
+        body += message.get('body', b'')
+        if len(body) > ASGI_MAX_BODY:
+            return None
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+async def _send_error(send, status, message, headers=()):
+    body = f'{{"error": "{message}"}}'.encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                            *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _endpoint(scope):
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(scope['path'], method=scope['method'])
+    except HTTPException:
+        return None
+    return endpoint
+
+
+async def _overloaded(send, message):
+    await _send_error(send, 503, message, [(b'retry-after', str(admission.retry_after()).encode())])
+
+
+async def _http(scope, receive, send):
+    global _starting
+    body = await _read_body(receive)
+    if body is None:
+        await _send_error(send, 413, "Request body too large")
+        return
+
+    local = _endpoint(scope) in LOCAL_ENDPOINTS
+    pool = local_executor if local else executor
+    if not local and _starting >= ASGI_WORKERS + ASGI_MAX_BACKLOG:
+        await _overloaded(send, "Too many requests waiting for a worker")
+        return
+
+    loop = asyncio.get_running_loop()
+    # Every step of one request runs in the same context: Flask keeps the request
+    # context in context variables, and a streamed body is resumed on whichever
+    # pool thread is free
+    context = contextvars.copy_context()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return lambda data: None  # the legacy write() callable; Flask never uses it
+
+    queued_at = time.monotonic()
+
+    def call():
+        if not local and time.monotonic() - queued_at > ASGI_QUEUE_TIMEOUT:
+            # Waited too long for a worker: the client is better off retrying than waiting more
+            return None, None
+        chunks = app.wsgi_app(_environ(scope, body), start_response)
+        return chunks, iter(chunks)
+
+    def next_chunk(iterator):
+        return next(iterator, None)
+
+    if not local:
+        _starting += 1
+    try:
+        chunks, iterator = await loop.run_in_executor(pool, context.run, call)
+    finally:
+        if not local:
+            _starting -= 1
+    if chunks is None:
+        await _overloaded(send, f"No worker free within {ASGI_QUEUE_TIMEOUT}s")
+        return
+    try:
+        # Flask calls start_response before returning; the first chunk is read
+        # before sending headers so simple responses go out in one message
+        first = await loop.run_in_executor(pool, context.run, next_chunk, iterator)
+        await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        chunk = first
+        while chunk is not None:
+            following = await loop.run_in_executor(pool, context.run, next_chunk, iterator)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': following is not None})
+            chunk = following
+        if first is None:
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(chunks, 'close'):
+            # Ends a stream abandoned by the client and returns its LDAP connection
+            await loop.run_in_executor(pool, context.run, chunks.close)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            local_executor.shutdown(wait=True)
+            lookup_executor.shutdown(wait=True)
+            ldap_pool.close()
+            write_pool.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """
+    The ASGI application.
+    """
+    if scope['type'] == 'http':
+        await _http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'websocket':
+        # No websocket routes: closing before accepting makes the server refuse the handshake
+        await receive()
+        await send({'type': 'websocket.close', 'code': 1008})
+    # Other scope types are ignored
@@ -0,0 +1,280 @@
+"""
+Benchmarks every route of app.py against a synthetic directory served by
+ldap3's MOCK_SYNC strategy, through the Flask test client.
+
+    cd backend
+    python -m benchmarks.run --users 100000 --groups 10000
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Per scenario it reports throughput, p50/p99 latency, LDAP operations and
+entries per request (from the per-request LDAP stats) and the process's peak
+RSS. --compare exits with status 1 when a scenario got slower or more
+expensive than the baseline by more than --tolerance.
+
+The mock evaluates every filter by scanning the whole directory, so absolute
+latencies are far above a real DC's; compare runs against a baseline taken on
+the same machine with the same directory. LDAP operations and entries per
+request do not depend on the machine.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+
+# Compared against baselines; True when a higher value is worse
+COMPARED_METRICS = {'p50_ms': True, 'p99_ms': True, 'rps': False, 'ldap_ops': True, 'ldap_entries': True}
+
+# Error statuses that are the correct answer in the benchmark setup
+EXPECTED_STATUSES = {'replica.sync': 404}
+
+
+def _configure_environment(args):
+    """
+    Points app.py at the synthetic directory. Must run before app is imported.
+    """
+    workdir = tempfile.mkdtemp(prefix='leapad-bench-')
+    os.environ.update({
+        'USER_DN': synthetic.SERVICE_DN,
+        'PASSWORD': synthetic.SERVICE_PASSWORD,
+        'SERVER_ADDRESS': 'bench-dc',
+        'BASE_DN_USERS': synthetic.USERS_DN,
+        'BASE_DN_GROUPS': synthetic.GROUPS_DN,
+        'DEFAULT_GROUP_DN': synthetic.DEFAULT_GROUP_DN,
+        'SCHEMA_CACHE_FILE': os.path.join(workdir, 'schema.json'),
+        'JOBS_PATH': os.path.join(workdir, 'jobs.sqlite3'),
+        'JOB_ARTIFACT_DIR': os.path.join(workdir, 'job_files'),
+        # The mock has no root DSE to sync a replica from
+        'REPLICA_ENABLED': 'false',
+        'CACHE_ENABLED': 'true' if args.cache else 'false',
+        # Nor does it resolve anr= filters; searches fall back to prefix matches
+        'SEARCH_USE_ANR': 'false',
+    })
+
+
+class RequestStatsCapture(logging.Handler):
+    """
+    Keeps the LDAP fields of the latest access log line written by app.py.
+    """
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.last = None
+
+    def emit(self, record):
+        if hasattr(record, 'ldap_ops'):
+            self.last = record
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def scenarios(directory, rng):
+    """
+    (name, iterations weight, request builder) for every route. Builders take
+    the iteration number and return (method, url, keyword arguments for the
+    test client). Write scenarios run last and clean up after each other.
+    """
+    user = lambda: rng.randrange(len(directory.user_sams))
+    group = lambda: rng.choice(directory.group_names)
+    largest = directory.largest_group
+
+    def bulk_body(i):
+        rows = [{'first_name': 'Bulk', 'last_name': f'{i}-{n}', 'email': f'bulk{i}x{n}@bench.local',
+                 'sAMAccountName': f'bulk{i:04d}x{n:03d}', 'memberOf': [group()]} for n in range(25)]
+        return '\n'.join(json.dumps(row) for row in rows)
+
+    return [
+        ('groups.list', 0.1, lambda i: ('GET', '/groups', {})),
+        ('groups.page', 1, lambda i: ('GET', '/groups?page_size=100', {})),
+        ('groups.stream', 0.1, lambda i: ('GET', '/groups?stream=1', {})),
+        ('groups.one', 1, lambda i: ('GET', f'/groups/one?name={group()}', {})),
+        ('groups.one.largest', 0.2, lambda i: ('GET', f'/groups/one?name={largest}', {})),
+        ('groups.one.paged', 1, lambda i: ('GET', f'/groups/one?name={largest}&page_size=200', {})),
+        ('groups.search', 1, lambda i: ('GET', f'/groups/search?q={group()[:4]}', {})),
+        ('groups.effective_members', 1, lambda i: ('GET', f'/groups/effective-members?name={group()}', {})),
+        ('users.list', 0.1, lambda i: ('GET', '/users', {})),
+        ('users.page', 1, lambda i: ('GET', '/users?page_size=100', {})),
+        ('users.stream', 0.1, lambda i: ('GET', '/users?stream=1', {})),
+        ('users.export', 0.1, lambda i: ('GET', '/export?kind=users', {})),
+        ('users.export.csv', 0.1, lambda i: ('GET', '/export?kind=users&format=csv', {})),
+        ('users.one', 1, lambda i: ('GET', f'/users/one?sam={directory.user_sams[user()]}', {})),
+        ('users.search', 1, lambda i: ('GET', f'/users/search?q={directory.user_sams[user()][:6]}&fields=sAMAccountName,displayName,mail', {})),
+        ('users.membership', 1, lambda i: ('GET', f'/users/membership?user_dn={directory.user_dns[user()]}', {})),
+        ('users.effective_groups', 1, lambda i: ('GET', f'/users/effective-groups?user_dn={directory.user_dns[user()]}', {})),
+        ('test_connection', 1, lambda i: ('GET', '/test-connection', {})),
+        ('cache.stats', 1, lambda i: ('GET', '/cache/stats', {})),
+        ('membership.stats', 1, lambda i: ('GET', '/membership/stats', {})),
+        ('schema', 1, lambda i: ('GET', '/schema?check=1', {})),
+        ('schema.refresh', 0.2, lambda i: ('POST', '/schema/refresh', {})),
+        ('replica', 1, lambda i: ('GET', '/replica', {})),
+        ('replica.sync', 1, lambda i: ('POST', '/replica/sync', {})),
+        ('metrics', 1, lambda i: ('GET', '/metrics', {})),
+        # Writes
+        ('groups.create', 1, lambda i: ('POST', '/groups', {'json': {'name': f'bench{i:05d}', 'description': 'Benchmark group'}})),
+        ('groups.update', 1, lambda i: ('PUT', f'/groups?name=bench{i:05d}', {'json': {'description': f'Updated {i}'}})),
+        ('groups.members.add', 1, lambda i: ('POST', '/groups/members', {'json': {
+            'user_dn': directory.user_dns[i % len(directory.user_dns)], 'group_dn': f'CN=bench{i:05d},{synthetic.GROUPS_DN}'}})),
+        ('groups.members.batch', 1, lambda i: ('POST', '/groups/members/batch', {'json': {'add': [
+            {'user_dn': directory.user_dns[(i * 50 + n) % len(directory.user_dns)], 'group_dn': f'CN=bench{i:05d},{synthetic.GROUPS_DN}'}
+            for n in range(1, 51)]}})),
+        ('groups.members.remove', 1, lambda i: ('DELETE', f'/groups/members?user_dn={directory.user_dns[i % len(directory.user_dns)]}'
+                                                          f'&group_dn=CN=bench{i:05d},{synthetic.GROUPS_DN}', {})),
+        ('users.create', 1, lambda i: ('POST', '/users', {'json': {
+            'first_name': 'Bench', 'last_name': f'{i:05d}', 'email': f'bench{i}@bench.local',
+            'sAMAccountName': f'bench{i:05d}', 'memberOf': [group(), group()]}})),
+        ('users.update', 1, lambda i: ('PUT', f'/users?sam=bench{i:05d}', {'json': {'email': f'bench{i}.new@bench.local'}})),
+        ('users.bulk', 0.2, lambda i: ('POST', '/users/bulk', {'data': bulk_body(i), 'content_type': 'application/x-ndjson'})),
+        ('users.delete', 1, lambda i: ('DELETE', f'/users?sam=bench{i:05d}', {})),
+        ('groups.delete', 1, lambda i: ('DELETE', f'/groups?name=bench{i:05d}', {})),
+    ]
+
+
+def run_scenario(client, capture, build, iterations, warmup, expected_status=None):
+    latencies, ops, entries, failures = [], [], [], 0
+    for i in range(warmup + iterations):
+        method, url, kwargs = build(i)
+        capture.last = None
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()  # streamed bodies are produced here
+        response.close()
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        if response.status_code >= 400 and response.status_code != expected_status:
+            failures += 1
+        if capture.last is not None:
+            ops.append(capture.last.ldap_ops)
+            entries.append(capture.last.ldap_entries)
+    latencies.sort()
+    return {
+        'requests': iterations,
+        'failures': failures,
+        'rps': round(iterations / sum(latencies), 2) if latencies else 0.0,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+        'ldap_ops': round(sum(ops) / len(ops), 2) if ops else 0.0,
+        'ldap_entries': round(sum(entries) / len(entries), 1) if entries else 0.0,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Lists (scenario, metric, baseline, current) for every metric that got worse by more than `tolerance`.
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            # Small absolute values (e.g. 0 -> 0.5 ms) are noise, not regressions
+            slack = max(abs(before) * tolerance, 0.5 if metric.endswith('_ms') else 0.0)
+            worse = after - before > slack if higher_is_worse else before - after > slack
+            if worse:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+_HEADER = f"{'scenario':<28}{'reqs':>6}{'fail':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'ops/req':>9}{'entries/req':>13}{'peak RSS MB':>13}"
+
+
+def _format_row(name, result):
+    return (f"{name:<28}{result['requests']:>6}{result['failures']:>6}{result['rps']:>10}{result['p50_ms']:>10}"
+            f"{result['p99_ms']:>10}{result['ldap_ops']:>9}{result['ldap_entries']:>13}{result['peak_rss_mb']:>13}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--groups', type=int, default=200)
+    parser.add_argument('--groups-per-user', type=int, default=3)
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of group sizes (default 1.1)')
+    parser.add_argument('--nested', type=float, default=0.1, help='fraction of groups nested in another group')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=10, help='requests per scenario, scaled down for full listings')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--cache', action='store_true', help='keep the read cache on (off by default, so every read hits the directory)')
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression (default 0.2)')
+    args = parser.parse_args(argv)
+
+    _configure_environment(args)
+    server = synthetic.mock_server()
+    started = time.perf_counter()
+    directory = synthetic.populate(server, args.users, args.groups, args.groups_per_user, args.skew, args.nested, args.seed)
+    build_seconds = time.perf_counter() - started
+
+    import app as backend
+    backend._bind = lambda transport, server_: synthetic.mock_connection(server)
+    # Only the access log's LDAP fields are needed; keep stderr quiet
+    for handler in logging.getLogger().handlers:
+        handler.setLevel(logging.WARNING)
+    capture = RequestStatsCapture()
+    logging.getLogger('app').addHandler(capture)
+
+    only = set(args.only.split(',')) if args.only else None
+    if not args.json:
+        print(_HEADER)
+    client = backend.app.test_client()
+    rng = random.Random(args.seed)
+    results = {
+        'directory': {'users': args.users, 'groups': args.groups, 'groups_per_user': args.groups_per_user,
+                      'skew': args.skew, 'nested': args.nested, 'seed': args.seed, 'cache': args.cache,
+                      'largest_group': directory.group_sizes[directory.largest_group], 'build_seconds': round(build_seconds, 2)},
+        'scenarios': {},
+    }
+    for name, weight, build in scenarios(directory, rng):
+        if only and name not in only:
+            continue
+        iterations = max(1, int(args.requests * weight))
+        results['scenarios'][name] = run_scenario(client, capture, build, iterations, args.warmup, EXPECTED_STATUSES.get(name))
+        if not args.json:
+            print(_format_row(name, results['scenarios'][name]), flush=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('directory', {}).get('users') != args.users or baseline.get('directory', {}).get('groups') != args.groups:
+            print("warning: baseline was recorded against a different directory size", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name} {metric}: {before} -> {after}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import itertools
+import random
+import struct
+import uuid
+
+from ldap3 import Connection, MOCK_SYNC, OFFLINE_AD_2012_R2, Server
+
+# Domain, containers and service account of the synthetic directory
+DOMAIN_DN = 'DC=bench,DC=local'
+USERS_DN = f'CN=Users,{DOMAIN_DN}'
+GROUPS_DN = f'OU=Groups,{DOMAIN_DN}'
+SERVICE_DN = f'CN=svc-leapad,{USERS_DN}'
+SERVICE_PASSWORD = 'bench'
+DEFAULT_GROUP_DN = f'CN=Employees,{GROUPS_DN}'
+
+# 2024-01-01T00:00:00Z as an AD FILETIME (pwdLastSet)
+_PWD_LAST_SET = str(133485408000000000)
+_WHEN = '20240101000000.0Z'
+
+
+def _sid(rid):
+    return struct.pack('<BB6s5I', 1, 5, (5).to_bytes(6, 'big'), 21, 1111, 2222, 3333, rid)
+
+
+class SyntheticDirectory:
+    """
+    Names and DNs of a generated directory, for building requests against it.
+    """
+
+    def __init__(self, user_sams, user_dns, group_names, group_dns, group_sizes):
+        self.user_sams = user_sams
+        self.user_dns = user_dns
+        self.group_names = group_names
+        self.group_dns = group_dns
+        self.group_sizes = group_sizes
+
+    @property
+    def largest_group(self):
+        return max(self.group_names, key=lambda name: self.group_sizes[name])
+
+
+def mock_server(name='bench-dc'):
+    """
+    A MOCK_SYNC server with Active Directory's schema; its DIT is shared by every connection to it.
+    """
+    return Server(name, get_info=OFFLINE_AD_2012_R2)
+
+
+def mock_connection(server):
+    """
+    A bound connection to the mock server, as the pool would get from a real DC.
+
+    The mock does not maintain the attributes AD computes on add, which the
+    backend reads back (distinguishedName, objectGUID, ...), so `add` fills them in.
+    """
+    conn = Connection(server, user=SERVICE_DN, password=SERVICE_PASSWORD, client_strategy=MOCK_SYNC, collect_usage=True)
+    conn.bind()
+    add = conn.add
+
+    def add_with_computed_attributes(dn, object_class=None, attributes=None, controls=None):
+        attributes = dict(attributes or {})
+        attributes.setdefault('distinguishedName', dn)
+        attributes.setdefault('objectGUID', uuid.uuid4().bytes_le)
+        attributes.setdefault('whenCreated', _WHEN)
+        attributes.setdefault('whenChanged', _WHEN)
+        return add(dn, object_class, attributes, controls)
+
+    conn.add = add_with_computed_attributes
+    return conn
+
+
+def populate(server, users=1000, groups=100, groups_per_user=3, skew=1.1, nested=0.1, seed=42):
+    """
+    Fills the mock server with `users` users and `groups` groups.
+
+    Each user joins 1 to 2*groups_per_user-1 groups, picked with Zipf-like
+    weights (1/rank^skew) so a few groups are very large and most are small.
+    A `nested` fraction of the groups is also made a member of one
+    lower-ranked group, so nesting is several levels deep but never cyclic.
+    The same seed always produces the same directory.
+    """
+    rng = random.Random(seed)
+    seed_conn = Connection(server, user=SERVICE_DN, password=SERVICE_PASSWORD, client_strategy=MOCK_SYNC)
+    strategy = seed_conn.strategy
+    usn = itertools.count(1000)
+    strategy.add_entry(SERVICE_DN, {'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+                                    'sAMAccountName': 'svc-leapad', 'userPassword': SERVICE_PASSWORD})
+    for dn, object_class in ((DOMAIN_DN, 'domainDNS'), (USERS_DN, 'container'), (GROUPS_DN, 'organizationalUnit')):
+        strategy.add_entry(dn, {'objectClass': ['top', object_class], 'distinguishedName': dn})
+
+    group_names = [f'group{j:05d}' for j in range(groups)]
+    group_dns = [f'CN={name},{GROUPS_DN}' for name in group_names]
+    members = [[] for _ in range(groups)]
+    member_of = {}
+    cumulative_weights = list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(groups)))
+
+    user_sams, user_dns = [], []
+    for i in range(users):
+        sam = f'user{i:06d}'
+        dn = f'CN=User {i:06d},{USERS_DN}'
+        picked = set(rng.choices(range(groups), cum_weights=cumulative_weights,
+                                 k=rng.randint(1, max(1, 2 * groups_per_user - 1)))) if groups else set()
+        for j in picked:
+            members[j].append(dn)
+        member_of[dn] = [group_dns[j] for j in sorted(picked)]
+        user_sams.append(sam)
+        user_dns.append(dn)
+
+    for j in range(1, groups):
+        if rng.random() < nested:
+            parent = rng.randrange(j)
+            members[parent].append(group_dns[j])
+            member_of.setdefault(group_dns[j], []).append(group_dns[parent])
+
+    for i, (sam, dn) in enumerate(zip(user_sams, user_dns)):
+        strategy.add_entry(dn, {
+            'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+            'objectCategory': f'CN=Person,CN=Schema,CN=Configuration,{DOMAIN_DN}',
+            'distinguishedName': dn, 'cn': f'User {i:06d}', 'name': f'User {i:06d}',
+            'sAMAccountName': sam, 'userPrincipalName': f'{sam}@bench.local',
+            'givenName': 'User', 'sn': f'{i:06d}', 'displayName': f'User {i:06d}', 'mail': f'{sam}@bench.local',
+            'memberOf': member_of[dn], 'objectGUID': uuid.UUID(int=rng.getrandbits(128)).bytes_le,
+            'userAccountControl': '512', 'pwdLastSet': _PWD_LAST_SET,
+            'whenCreated': _WHEN, 'whenChanged': _WHEN, 'uSNChanged': str(next(usn)),
+        })
+    for j, (name, dn) in enumerate(zip(group_names, group_dns)):
+        strategy.add_entry(dn, {
+            'objectClass': ['top', 'group'],
+            'objectCategory': f'CN=Group,CN=Schema,CN=Configuration,{DOMAIN_DN}',
+            'distinguishedName': dn, 'cn': name, 'name': name, 'sAMAccountName': name,
+            'description': f'Synthetic group {j}', 'member': members[j], 'memberOf': member_of.get(dn, []),
+            'objectGUID': uuid.UUID(int=rng.getrandbits(128)).bytes_le, 'objectSid': _sid(10000 + j),
+            'groupType': '-2147483646', 'whenCreated': _WHEN, 'whenChanged': _WHEN, 'uSNChanged': str(next(usn)),
+        })
+    strategy.add_entry(DEFAULT_GROUP_DN, {
+        'objectClass': ['top', 'group'], 'distinguishedName': DEFAULT_GROUP_DN, 'cn': 'Employees',
+        'name': 'Employees', 'sAMAccountName': 'Employees', 'description': 'Default group for new users',
+        'objectGUID': uuid.UUID(int=rng.getrandbits(128)).bytes_le, 'objectSid': _sid(9999),
+        'whenCreated': _WHEN, 'whenChanged': _WHEN, 'uSNChanged': str(next(usn)),
+    })
+    return SyntheticDirectory(user_sams, user_dns, group_names, group_dns,
+                              {name: len(members[j]) for j, name in enumerate(group_names)})
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import re
+
+# Columns/keys of one bulk user row; they match the POST /users body
+REQUIRED_USER_FIELDS = ['first_name', 'last_name', 'email', 'sAMAccountName']
+
+# Characters Active Directory does not allow in a sAMAccountName
+_INVALID_SAM_CHARS = re.compile(r'["/\\\[\]:;|=,+*?<>@]')
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class BulkRowError(ValueError):
+    """
+    Raised when a bulk import body cannot be parsed.
+    """
+
+
+def parse_rows(stream, content_type):
+    """
+    Reads user rows from a CSV (text/csv) or NDJSON (application/x-ndjson) body.
+    CSV `memberOf` cells hold group names separated by ';'.
+    Yields dicts shaped like the POST /users body.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if content_type == 'text/csv':
+        reader = csv.DictReader(text)
+        missing = [field for field in REQUIRED_USER_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise BulkRowError(f"CSV header is missing column(s): {', '.join(missing)}")
+        for row in reader:
+            row = {key: (value or '').strip() for key, value in row.items() if key}
+            row['memberOf'] = [name.strip() for name in row.get('memberOf', '').split(';') if name.strip()]
+            yield row
+    elif content_type in ('application/x-ndjson', 'application/jsonl'):
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise BulkRowError(f"Line {line_number} is not valid JSON: {e}")
+            if not isinstance(row, dict):
+                raise BulkRowError(f"Line {line_number} is not a JSON object")
+            yield row
+    else:
+        raise BulkRowError("Content-Type must be text/csv or application/x-ndjson")
+
+
+def validate_row(row):
+    """
+    Returns a list of problems with one row; empty when the row is valid.
+    """
+    errors = [f"{field} is required" for field in REQUIRED_USER_FIELDS
+              if not isinstance(row.get(field), str) or not row[field].strip()]
+    sam = row.get('sAMAccountName')
+    if isinstance(sam, str) and sam:
+        if len(sam) > 20:
+            errors.append("sAMAccountName must be at most 20 characters")
+        if _INVALID_SAM_CHARS.search(sam):
+            errors.append("sAMAccountName contains invalid characters")
+    email = row.get('email')
+    if isinstance(email, str) and email and not _EMAIL.match(email):
+        errors.append("email is not a valid address")
+    groups = row.get('memberOf', [])
+    if not isinstance(groups, list) or not all(isinstance(name, str) for name in groups):
+        errors.append("memberOf must be a list of group names")
+    return errors
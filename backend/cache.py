@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class DirectoryCache:
+    """
+    Bounded in-process cache for directory reads with per-kind TTLs and LRU eviction.
+
+    Every entry is stored under a (kind, key) pair and can carry tags, usually
+    the lower-cased DNs it was built from plus a list marker such as 'users'.
+    Write paths call `invalidate(*tags)` to drop exactly the entries that
+    depend on the objects they changed. Cached values are shared between
+    callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=1000, ttls=None, default_ttl=60, enabled=True):
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()  # (kind, key) -> (expires_at, value, tags)
+        self._tags = defaultdict(set)  # tag -> {(kind, key)}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0})
+
+    @staticmethod
+    def tag(value):
+        """
+        Normalizes a DN (or list marker) for use as a tag; DNs compare case-insensitively.
+        """
+        return value.lower() if isinstance(value, str) else value
+
+    def _remove(self, cache_key):
+        _, _, tags = self._entries.pop(cache_key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get_or_load(self, kind, key, loader, tags=()):
+        """
+        Returns the cached value for (kind, key), calling `loader()` on a miss.
+        `tags` is an iterable, or a callable that receives the loaded value and returns one.
+        None results are not cached.
+        """
+        if not self.enabled:
+            return loader()
+        cache_key = (kind, key)
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats[kind]
+            cached = self._entries.get(cache_key)
+            if cached is not None:
+                if cached[0] > now:
+                    self._entries.move_to_end(cache_key)
+                    stats['hits'] += 1
+                    return cached[1]
+                self._remove(cache_key)
+                stats['expirations'] += 1
+            stats['misses'] += 1
+            generation = self._generation
+
+        value = loader()
+        if value is None:
+            return value
+        tag_values = tags(value) if callable(tags) else tags
+        tag_set = {self.tag(t) for t in tag_values if t}
+        expires_at = time.monotonic() + self.ttls.get(kind, self.default_ttl)
+
+        with self._lock:
+            # An invalidation ran while we were loading; the value may already be stale.
+            if generation != self._generation:
+                return value
+            if cache_key in self._entries:
+                self._remove(cache_key)
+            self._entries[cache_key] = (expires_at, value, tag_set)
+            for tag in tag_set:
+                self._tags[tag].add(cache_key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats[oldest[0]]['evictions'] += 1
+        return value
+
+    def invalidate(self, *tags):
+        """
+        Drops every entry carrying any of the given tags.
+        """
+        with self._lock:
+            self._generation += 1
+            for tag in {self.tag(t) for t in tags if t}:
+                for cache_key in list(self._tags.get(tag, ())):
+                    if cache_key in self._entries:
+                        self._remove(cache_key)
+                        self._stats[cache_key[0]]['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            sizes = defaultdict(int)
+            for kind, _ in self._entries:
+                sizes[kind] += 1
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'kinds': {kind: dict(counters, size=sizes[kind], ttl=self.ttls.get(kind, self.default_ttl))
+                          for kind, counters in self._stats.items()},
+            }
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How server order is chosen for reads: the lowest health-check latency, a rotation,
+# or the configured order
+SELECTIONS = ('fastest', 'round_robin', 'first')
+
+# Weight of the newest probe in a server's smoothed latency
+_LATENCY_SMOOTHING = 0.3
+# A faster server only takes over reads when it beats the current one by this fraction,
+# so two equally fast DCs do not trade places on every probe
+_SWITCH_MARGIN = 0.25
+
+
+class ServerState:
+    """
+    What the health checks know about one domain controller.
+    """
+    __slots__ = ('host', 'healthy', 'latency', 'last_error', 'last_checked', 'failures')
+
+    def __init__(self, host):
+        self.host = host
+        self.healthy = True  # until a probe says otherwise
+        self.latency = None  # smoothed seconds per probe
+        self.last_error = None
+        self.last_checked = None
+        self.failures = 0
+
+
+class DomainControllerPool:
+    """
+    The domain controllers behind SERVER_ADDRESS and the order connections should try them in.
+
+    A background thread probes every server each `interval` seconds with
+    `probe(host)`, which must raise when the server is unusable. Servers whose
+    probe fails are taken out of rotation until a probe succeeds again, and
+    `on_down(host)` is called so connections to them can be dropped.
+
+    Reads go to healthy servers in `selection` order. Writes stay on one server,
+    kept until it fails, so a client never writes to a DC that has not yet
+    received its previous write. After a write, reads also go to that server
+    for `pin_seconds`, the time allowed for the change to replicate.
+    """
+
+    def __init__(self, hosts, probe, selection='fastest', interval=10, pin_seconds=30, on_down=None, on_preferred=None):
+        if selection not in SELECTIONS:
+            raise ValueError(f"Unknown server selection {selection!r}; use one of: {', '.join(SELECTIONS)}")
+        self.hosts = list(hosts)
+        self._probe = probe
+        self.selection = selection
+        self.interval = interval
+        self.pin_seconds = pin_seconds
+        self._on_down = on_down
+        self._on_preferred = on_preferred
+
+        self._states = {host: ServerState(host) for host in self.hosts}
+        self._lock = threading.Lock()
+        self._rotation = 0
+        self._preferred = None
+        self._write_host = None
+        self._pinned_until = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def multiple(self):
+        return len(self.hosts) > 1
+
+    # -- health checks -------------------------------------------------------
+
+    def check(self):
+        """
+        Probes every server once and updates its state.
+        """
+        for host in self.hosts:
+            started = time.perf_counter()
+            try:
+                self._probe(host)
+            except Exception as e:
+                self._record_failure(host, e)
+            else:
+                self._record_success(host, time.perf_counter() - started)
+        preferred = self.read_order()[0]
+        with self._lock:
+            changed, self._preferred = preferred != self._preferred and self._preferred is not None, preferred
+        if changed and self._on_preferred is not None:
+            self._on_preferred(preferred)
+
+    def _record_success(self, host, seconds):
+        with self._lock:
+            state = self._states[host]
+            recovered = not state.healthy
+            state.healthy = True
+            state.failures = 0
+            state.last_error = None
+            state.last_checked = time.time()
+            state.latency = seconds if state.latency is None else (
+                _LATENCY_SMOOTHING * seconds + (1 - _LATENCY_SMOOTHING) * state.latency)
+        if recovered:
+            logger.info("Domain controller %s is back in rotation", host, extra={'server': host})
+
+    def _record_failure(self, host, error):
+        with self._lock:
+            state = self._states[host]
+            went_down = state.healthy
+            state.healthy = False
+            state.failures += 1
+            state.last_error = str(error)
+            state.last_checked = time.time()
+        if went_down:
+            logger.warning("Domain controller %s taken out of rotation: %s", host, error, extra={'server': host})
+            if self._on_down is not None:
+                self._on_down(host)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Domain controller health check failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        # With a single server there is nothing to choose between
+        if self.multiple and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dc-health-check', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # -- selection -----------------------------------------------------------
+
+    def _split(self):
+        healthy = [host for host in self.hosts if self._states[host].healthy]
+        return healthy, [host for host in self.hosts if host not in healthy]
+
+    def read_order(self, first=None):
+        """
+        Every server, in the order a read connection should try them: healthy
+        ones by the configured selection (or `first` when it is healthy), then
+        the rest as a last resort.
+        """
+        with self._lock:
+            healthy, down = self._split()
+            if first in healthy:
+                return [first] + [host for host in healthy + down if host != first]
+            if self.selection == 'fastest' and healthy:
+                unknown = float('inf')
+                healthy.sort(key=lambda host: unknown if self._states[host].latency is None else self._states[host].latency)
+                current = self._preferred
+                if current in healthy and self._states[current].latency is not None and healthy[0] != current:
+                    # Keep the current server unless the new one is clearly faster
+                    if self._states[healthy[0]].latency > self._states[current].latency * (1 - _SWITCH_MARGIN):
+                        healthy.remove(current)
+                        healthy.insert(0, current)
+            elif self.selection == 'round_robin' and healthy:
+                self._rotation = (self._rotation + 1) % len(healthy)
+                healthy = healthy[self._rotation:] + healthy[:self._rotation]
+            return healthy + down
+
+    def write_order(self):
+        """
+        Every server, in the order a write connection should try them: the
+        pinned write server first, replaced only when it is out of rotation.
+        """
+        with self._lock:
+            healthy, down = self._split()
+            if self._write_host not in healthy and healthy:
+                if self._write_host is not None:
+                    logger.warning("Writes move from %s to %s", self._write_host, healthy[0])
+                self._write_host = healthy[0]
+            first = self._write_host or self.hosts[0]
+            return [first] + [host for host in healthy + down if host != first]
+
+    def note_write(self):
+        """
+        Records a successful write: reads follow the write server for `pin_seconds`.
+        """
+        if self.multiple:
+            self._pinned_until = time.monotonic() + self.pin_seconds
+
+    def pinned(self):
+        return self.multiple and time.monotonic() < self._pinned_until
+
+    def in_rotation(self, host):
+        """
+        True when `host` is one of the servers and its last probe succeeded.
+        """
+        with self._lock:
+            state = self._states.get(host)
+            return state is not None and state.healthy
+
+    def status(self):
+        with self._lock:
+            servers = [{
+                'host': state.host,
+                'healthy': state.healthy,
+                'latency_ms': None if state.latency is None else round(state.latency * 1000, 2),
+                'failures': state.failures,
+                'last_error': state.last_error,
+                'last_checked': None if state.last_checked is None else
+                time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(state.last_checked)),
+            } for state in self._states.values()]
+            write_host = self._write_host
+        return {
+            'selection': self.selection,
+            'servers': servers,
+            'write_server': write_host,
+            'reads_pinned_for': max(0.0, round(self._pinned_until - time.monotonic(), 3)) if self.multiple else 0.0,
+        }
+
+    def up(self):
+        """
+        [(host, 1 if in rotation else 0)] for the metrics.
+        """
+        with self._lock:
+            return [(host, int(self._states[host].healthy)) for host in self.hosts]
+
+    def latencies(self):
+        with self._lock:
+            return [(host, self._states[host].latency) for host in self.hosts if self._states[host].latency is not None]
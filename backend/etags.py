@@ -0,0 +1,33 @@
+import hashlib
+
+from ldap3 import BASE
+
+from serializer import search_entries
+
+
+def directory_version(conn):
+    """
+    (dsServiceName, highestCommittedUSN) of the DC behind `conn`, from one
+    read of its root DSE. The USN grows with every change committed on that DC,
+    so while both stay the same nothing that DC serves has changed.
+    Raises ValueError when the root DSE does not report them.
+    """
+    conn.search('', '(objectClass=*)', search_scope=BASE, attributes=['highestCommittedUSN', 'dsServiceName'])
+    entries = search_entries(conn)
+    attributes = entries[0]['attributes'] if entries else {}
+
+    def first(name):
+        value = attributes.get(name)
+        return value[0] if isinstance(value, list) and value else value
+
+    usn, dc = first('highestCommittedUSN'), first('dsServiceName')
+    if usn is None:
+        raise ValueError("The root DSE does not report highestCommittedUSN")
+    return str(dc), int(usn)
+
+
+def make_etag(*parts):
+    """
+    An opaque ETag value (without quotes) for a response determined by `parts`.
+    """
+    return hashlib.blake2s('\0'.join(str(part) for part in parts).encode('utf-8'), digest_size=12).hexdigest()
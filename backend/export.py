@@ -0,0 +1,171 @@
+import csv
+import io
+import zlib
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    # Parquet output is optional: pip install pyarrow
+    pyarrow = None
+
+from util import attribute_types, multi_valued_attributes
+
+# format -> (file name suffix, media type). NDJSON and CSV are gzip-compressed;
+# Parquet compresses its own columns
+FORMATS = {
+    'ndjson': ('ndjson.gz', 'application/gzip'),
+    'csv': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Output is handed on in chunks of about this many (uncompressed) bytes
+CHUNK_SIZE = 64 * 1024
+
+# Rows per Parquet row group; at most one row group is held in memory
+PARQUET_ROW_GROUP = 10000
+
+# Parquet column types by lower-cased attribute name
+_TYPES = {name.lower(): kind for name, kind in attribute_types.items()}
+_MULTI_VALUED = {name.lower() for name in multi_valued_attributes}
+
+# Joins the values of a multi-valued attribute in one CSV cell
+CSV_VALUE_SEPARATOR = ';'
+
+
+def check_format(fmt):
+    """
+    Raises ValueError for an unknown format, or for Parquet without pyarrow installed.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if fmt == 'parquet' and pyarrow is None:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+
+
+def file_name(kind, fmt):
+    return f"{kind}.{FORMATS[fmt][0]}"
+
+
+def media_type(name):
+    """
+    The media type of an export file, by its name.
+    """
+    for suffix, mimetype in FORMATS.values():
+        if name.endswith('.' + suffix):
+            return mimetype
+    return 'application/octet-stream'
+
+
+def iter_export(entries, fmt, attributes, dumps):
+    """
+    Encodes an iterable of entry dicts as `fmt`, yielding the file in chunks of
+    bytes. Entries are consumed as the chunks are, so memory use does not grow
+    with the number of entries. `attributes` are the CSV and Parquet columns;
+    NDJSON lines are `dumps(entry)`.
+    """
+    check_format(fmt)
+    if fmt == 'parquet':
+        return _parquet(entries, attributes)
+    if fmt == 'csv':
+        return _gzip(_csv_text(entries, attributes))
+    return _gzip(dumps(entry) + '\n' for entry in entries)
+
+
+def _gzip(texts):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    batch, size = [], 0
+    for text in texts:
+        batch.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            data = compressor.compress(''.join(batch).encode('utf-8'))
+            batch, size = [], 0
+            if data:
+                yield data
+    yield compressor.compress(''.join(batch).encode('utf-8')) + compressor.flush()
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return CSV_VALUE_SEPARATOR.join(str(item) for item in value)
+    return value
+
+
+def _csv_text(entries, attributes):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(attributes)
+    for entry in entries:
+        writer.writerow([_cell(entry.get(name)) for name in attributes])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _Chunks:
+    """
+    A write-only file that keeps what is written until it is taken, so
+    ParquetWriter's output can be streamed instead of landing on disk.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def _parquet_column(name):
+    """
+    (arrow type, converter) of an attribute's column: multi-valued attributes
+    are lists of strings, integer attributes int64 and everything else strings.
+    """
+    key = name.lower()
+    if key in _MULTI_VALUED:
+        return pyarrow.list_(pyarrow.string()), lambda value: [] if value is None else (
+            [str(item) for item in value] if isinstance(value, list) else [str(value)])
+    if _TYPES.get(key) == 'integer':
+        return pyarrow.int64(), lambda value: value if isinstance(value, int) else None
+    return pyarrow.string(), lambda value: None if value is None else str(_cell(value))
+
+
+def _parquet(entries, attributes):
+    columns = [_parquet_column(name) for name in attributes]
+    schema = pyarrow.schema([pyarrow.field(name, arrow_type) for name, (arrow_type, _) in zip(attributes, columns)])
+    sink = _Chunks()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        rows = []
+        for entry in entries:
+            rows.append(entry)
+            if len(rows) >= PARQUET_ROW_GROUP:
+                _write_row_group(writer, schema, attributes, columns, rows)
+                rows = []
+                yield sink.take()
+        if rows:
+            _write_row_group(writer, schema, attributes, columns, rows)
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def _write_row_group(writer, schema, attributes, columns, rows):
+    data = {name: [convert(row.get(name)) for row in rows] for name, (_, convert) in zip(attributes, columns)}
+    writer.write_table(pyarrow.Table.from_pydict(data, schema=schema))
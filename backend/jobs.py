@@ -0,0 +1,348 @@
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Job statuses; the last three are final
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = 'queued', 'running', 'completed', 'failed', 'cancelled'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    summary TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    status TEXT,
+    result TEXT,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobCancelled(Exception):
+    """
+    Raised by a task that noticed its job was cancelled part-way through an item.
+    """
+
+
+class JobTask:
+    """
+    One kind of job. `plan(params)` turns the submitted parameters into the
+    list of items to process, raising ValueError when they are invalid; it runs
+    inside the submitting request, so it must not touch the directory.
+    `run(item, context)` processes one item on a worker thread and returns its
+    result, a dict with a `status` ('failed' counts as a failure).
+    """
+
+    def __init__(self, plan, run):
+        self.plan = plan
+        self.run = run
+
+
+class JobContext:
+    """
+    What a running task can see of its job.
+    """
+
+    def __init__(self, queue, job_id, params):
+        self.queue = queue
+        self.id = job_id
+        self.params = params
+
+    def cancelled(self):
+        return self.queue._cancel_requested(self.id)
+
+    def artifact_path(self, name):
+        """
+        Where the job may write a file named `name`; GET /jobs/<id>/files/<name> serves it.
+        """
+        os.makedirs(self.queue.artifact_dir, exist_ok=True)
+        return os.path.join(self.queue.artifact_dir, f'{self.id}.{name}')
+
+
+def _timestamp(value):
+    return None if value is None else time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(value))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    A durable queue of long-running directory operations, kept in SQLite and
+    worked through by a bounded pool of threads.
+
+    A job is a list of items planned when it is submitted. Workers record each
+    item's result as soon as it is done, so progress and per-item results can
+    be read while the job runs, a cancellation takes effect before the next
+    item, and a job interrupted by a restart resumes at its first unfinished item.
+    """
+
+    def __init__(self, path, tasks, artifact_dir, workers=2, poll_interval=1.0, retention=7 * 24 * 3600,
+                 max_items=100000, serialize=json.dumps, deserialize=json.loads):
+        self.path = path
+        self.tasks = tasks
+        self.artifact_dir = artifact_dir
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.max_items = max_items
+        self._serialize = serialize
+        self._deserialize = deserialize
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pruned_at = 0
+        self._db().executescript(_SCHEMA)
+
+    # -- storage -----------------------------------------------------------
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes sharing
+        # the file can never claim the same job
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _row_to_job(self, row):
+        (job_id, kind, params, status, total, done, summary, error, cancel_requested,
+         created_at, started_at, finished_at) = row
+        return {
+            'id': job_id,
+            'kind': kind,
+            'params': self._deserialize(params),
+            'status': status,
+            'total': total,
+            'done': done,
+            'summary': self._deserialize(summary),
+            'error': error,
+            'cancel_requested': bool(cancel_requested),
+            'created_at': _timestamp(created_at),
+            'started_at': _timestamp(started_at),
+            'finished_at': _timestamp(finished_at),
+        }
+
+    _JOB_COLUMNS = ('id, kind, params, status, total, done, summary, error, cancel_requested, '
+                    'created_at, started_at, finished_at')
+
+    # -- API -----------------------------------------------------------------
+
+    def submit(self, kind, params):
+        """
+        Plans and queues a job. Raises ValueError for an unknown kind or invalid parameters.
+        """
+        task = self.tasks.get(kind)
+        if task is None:
+            raise ValueError(f"Unknown job kind: {kind}; known kinds: {', '.join(sorted(self.tasks))}")
+        items = task.plan(params)
+        if not items:
+            raise ValueError("The job has nothing to do")
+        if len(items) > self.max_items:
+            raise ValueError(f"A job may have at most {self.max_items} items")
+        job_id = uuid.uuid4().hex
+        with self._transaction() as db:
+            db.execute('INSERT INTO jobs (id, kind, params, status, total, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                       (job_id, kind, self._serialize(params), QUEUED, len(items), time.time()))
+            db.executemany('INSERT INTO job_items (job_id, seq, item) VALUES (?, ?, ?)',
+                           ((job_id, seq, self._serialize(item)) for seq, item in enumerate(items)))
+        self._wake.set()
+        logger.info("Job queued", extra={'job_id': job_id, 'job_kind': kind, 'items': len(items)})
+        return self.get(job_id, limit=0)
+
+    def get(self, job_id, offset=0, limit=100):
+        """
+        The job with the results of items offset..offset+limit, or None when it does not exist.
+        """
+        row = self._db().execute(f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        rows = self._db().execute(
+            'SELECT seq, item, status, result FROM job_items WHERE job_id = ? ORDER BY seq LIMIT ? OFFSET ?',
+            (job_id, limit, offset))
+        job['items'] = [{'seq': seq, 'item': self._deserialize(item), 'status': status,
+                         'result': None if result is None else self._deserialize(result)}
+                        for seq, item, status, result in rows]
+        return job
+
+    def list(self, status=None, limit=50):
+        """
+        The most recently submitted jobs, without their items.
+        """
+        if status:
+            rows = self._db().execute(f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?',
+                                      (status, limit))
+        else:
+            rows = self._db().execute(f'SELECT {self._JOB_COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,))
+        return [self._row_to_job(row) for row in rows]
+
+    def cancel(self, job_id):
+        """
+        Cancels a job: a queued one at once, a running one before its next item.
+        Returns the job, or None when it does not exist.
+        """
+        with self._transaction() as db:
+            db.execute('UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?',
+                       (CANCELLED, time.time(), job_id, QUEUED))
+            db.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?', (job_id, RUNNING))
+        return self.get(job_id, limit=0)
+
+    def counts(self):
+        """
+        {status: number of jobs}
+        """
+        return dict(self._db().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def _cancel_requested(self, job_id):
+        row = self._db().execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    # -- workers -------------------------------------------------------------
+
+    def _claim(self):
+        with self._transaction() as db:
+            row = db.execute('SELECT id, kind, params FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1',
+                             (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE jobs SET status = ?, owner = ?, started_at = COALESCE(started_at, ?) WHERE id = ?',
+                       (RUNNING, os.getpid(), time.time(), row[0]))
+        return row[0], row[1], self._deserialize(row[2])
+
+    def _finish(self, job_id, status, error=None):
+        with self._transaction() as db:
+            db.execute('UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                       (status, error, time.time(), job_id))
+
+    def _run_job(self, job_id, kind, params):
+        started = time.monotonic()
+        context = JobContext(self, job_id, params)
+        task = self.tasks.get(kind)
+        status, error = COMPLETED, None
+        try:
+            if task is None:
+                raise ValueError(f"Unknown job kind: {kind}")
+            pending = self._db().execute('SELECT seq, item FROM job_items WHERE job_id = ? AND status IS NULL ORDER BY seq',
+                                         (job_id,)).fetchall()
+            for seq, item in pending:
+                if self._stop.is_set():
+                    # Left running: the next start hands it to a worker again
+                    return
+                if context.cancelled():
+                    status = CANCELLED
+                    break
+                try:
+                    result = task.run(self._deserialize(item), context)
+                except JobCancelled:
+                    status = CANCELLED
+                    break
+                except Exception as e:
+                    result = {'status': 'failed', 'error': str(e)}
+                with self._transaction() as db:
+                    db.execute('UPDATE job_items SET status = ?, result = ? WHERE job_id = ? AND seq = ?',
+                               (result.get('status'), self._serialize(result), job_id, seq))
+                    summary = self._deserialize(db.execute('SELECT summary FROM jobs WHERE id = ?', (job_id,)).fetchone()[0])
+                    summary[result.get('status')] = summary.get(result.get('status'), 0) + 1
+                    db.execute('UPDATE jobs SET done = done + 1, summary = ? WHERE id = ?', (self._serialize(summary), job_id))
+        except Exception as e:
+            logger.exception("Job failed", extra={'job_id': job_id, 'job_kind': kind})
+            status, error = FAILED, str(e)
+        self._finish(job_id, status, error)
+        logger.info("Job %s", status, extra={'job_id': job_id, 'job_kind': kind,
+                                             'duration_ms': round((time.monotonic() - started) * 1000, 2)})
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim()
+            except Exception:
+                logger.exception("Could not claim a job")
+                claimed = None
+            if claimed is None:
+                if time.monotonic() - self._pruned_at > 3600:
+                    self.prune()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run_job(*claimed)
+
+    def recover(self):
+        """
+        Puts jobs left running by a process that is gone back in the queue.
+        """
+        with self._transaction() as db:
+            rows = db.execute('SELECT id, owner FROM jobs WHERE status = ?', (RUNNING,)).fetchall()
+            orphans = [job_id for job_id, owner in rows if owner is None or owner == os.getpid() or not _process_alive(owner)]
+            db.executemany('UPDATE jobs SET status = ? WHERE id = ?', ((QUEUED, job_id) for job_id in orphans))
+        if orphans:
+            logger.warning("Resuming %d interrupted job(s)", len(orphans))
+
+    def prune(self):
+        """
+        Forgets finished jobs, and their files, older than `retention` seconds.
+        """
+        self._pruned_at = time.monotonic()
+        cutoff = time.time() - self.retention
+        with self._transaction() as db:
+            expired = [row[0] for row in db.execute('SELECT id FROM jobs WHERE finished_at < ?', (cutoff,))]
+            db.executemany('DELETE FROM job_items WHERE job_id = ?', ((job_id,) for job_id in expired))
+            db.executemany('DELETE FROM jobs WHERE id = ?', ((job_id,) for job_id in expired))
+        for job_id in expired:
+            for path in glob.glob(os.path.join(glob.escape(self.artifact_dir), f'{job_id}.*')):
+                os.remove(path)
+
+    def start(self):
+        self.recover()
+        for number in range(self.workers - len(self._threads)):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from ldap3 import BASE, NO_ATTRIBUTES
+from ldap3.core.exceptions import LDAPCommunicationError
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no pooled connection becomes available within the acquire timeout.
+    """
+
+
+class PooledConnection:
+    """
+    A bound connection plus the bookkeeping the pool needs to expire and health-check it.
+    """
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class LDAPConnectionPool:
+    """
+    Thread-safe pool of long-lived, bound LDAP connections.
+
+    Connections are created lazily with `factory` (which must return a bound
+    ldap3 Connection) up to `size` at a time. Idle connections older than
+    `idle_timeout` seconds or alive for longer than `max_lifetime` seconds are
+    closed instead of being handed out again. A connection that has been idle
+    for more than `health_check_interval` seconds is probed with a cheap root
+    DSE read before use and transparently replaced if the probe fails.
+    """
+
+    def __init__(self, factory, size=10, idle_timeout=300, max_lifetime=3600,
+                 acquire_timeout=10, health_check_interval=30):
+        self._factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = deque()  # most recently released connection on the right
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self.created = 0
+        self.discarded = 0
+        self.timeouts = 0
+
+    def _total(self):
+        return len(self._idle) + self._in_use
+
+    def _expired(self, pooled, now):
+        return (now - pooled.last_used > self.idle_timeout
+                or now - pooled.created_at > self.max_lifetime)
+
+    def _close(self, pooled):
+        self.discarded += 1
+        try:
+            pooled.conn.unbind()
+        except Exception:
+            pass
+
+    def _healthy(self, pooled):
+        conn = pooled.conn
+        if conn.closed or not conn.bound:
+            return False
+        # Any LDAP response proves the socket and bind are alive; a dead
+        # connection raises a communication error instead of returning.
+        try:
+            conn.search('', '(objectClass=*)', search_scope=BASE, attributes=[NO_ATTRIBUTES])
+        except LDAPCommunicationError:
+            return False
+        except Exception:
+            pass
+        return not conn.closed
+
+    def _take_idle(self, prefer):
+        if prefer is None:
+            return self._idle.pop()
+        for pooled in reversed(self._idle):
+            if prefer(pooled.conn):
+                self._idle.remove(pooled)
+                return pooled
+        return None
+
+    def acquire(self, prefer=None):
+        """
+        Borrows a connection, creating one if the pool is below its size limit.
+        With `prefer`, only an idle connection for which `prefer(conn)` is true is
+        reused; otherwise a new one is opened, closing an idle one to make room.
+        Raises PoolTimeoutError if the pool stays exhausted for `acquire_timeout` seconds.
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while not self._idle and self._total() >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeoutError(f"No LDAP connection available after {self.acquire_timeout}s")
+                self._cond.wait(remaining)
+            pooled = self._take_idle(prefer) if self._idle else None
+            replaced = None
+            if pooled is None and self._idle and self._total() >= self.size:
+                replaced = self._idle.popleft()
+            self._in_use += 1
+
+        if replaced is not None:
+            self._close(replaced)
+        try:
+            now = time.monotonic()
+            if pooled is not None and self._expired(pooled, now):
+                self._close(pooled)
+                pooled = None
+            if pooled is not None and now - pooled.last_used > self.health_check_interval:
+                if not self._healthy(pooled):
+                    self._close(pooled)
+                    pooled = None
+            if pooled is None:
+                pooled = PooledConnection(self._factory())
+                self.created += 1
+            return pooled
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, pooled, discard=False):
+        """
+        Returns a borrowed connection. Broken or expired connections are closed
+        so the next borrower gets a fresh bind.
+        """
+        now = time.monotonic()
+        if discard or pooled.conn.closed or self._expired(pooled, now):
+            self._close(pooled)
+            pooled = None
+        else:
+            pooled.last_used = now
+        with self._cond:
+            self._in_use -= 1
+            if pooled is not None:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, prefer=None):
+        """
+        Context manager that borrows a connection and always gives it back.
+        A connection that raised a communication error is discarded rather than reused.
+        """
+        pooled = self.acquire(prefer)
+        discard = False
+        try:
+            yield pooled.conn
+        except LDAPCommunicationError:
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'created': self.created,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts,
+            }
+
+    def discard_idle(self, predicate):
+        """
+        Closes the idle connections for which `predicate(conn)` is true, e.g. those to a server that went down.
+        """
+        with self._cond:
+            matching = [pooled for pooled in self._idle if predicate(pooled.conn)]
+            for pooled in matching:
+                self._idle.remove(pooled)
+            self._cond.notify_all()
+        for pooled in matching:
+            self._close(pooled)
+        return len(matching)
+
+    def close(self):
+        """
+        Unbinds every idle connection. Borrowed connections are closed when released.
+        """
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            self._close(pooled)
@@ -0,0 +1,42 @@
+import json
+import logging
+import sys
+import time
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger and message plus every field
+    passed through `extra=`, so log lines can be filtered and aggregated as data.
+    """
+
+    def format(self, record):
+        item = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES:
+                item[name] = value
+        if record.exc_info:
+            item['exception'] = self.formatException(record.exc_info)
+        return json.dumps(item, default=str)
+
+
+def configure_logging(level='INFO', log_format='json'):
+    """
+    Sends every log record to stderr, as JSON lines or (log_format='text') plain text.
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    if log_format == 'json':
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
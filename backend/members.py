@@ -0,0 +1,80 @@
+from contextlib import closing
+
+from ldap3 import BASE
+from ldap3.utils.dn import parse_dn
+
+# Active Directory's default MaxValRange: most values of one attribute returned per read
+MAX_VAL_RANGE = 1500
+
+
+def _decode(values):
+    return [value.decode('utf-8') if isinstance(value, bytes) else str(value) for value in values or []]
+
+
+def iter_member_ranges(conn, group_dn, start=0, step=MAX_VAL_RANGE):
+    """
+    Walks a group's `member` values with ranged retrieval (`member;range=low-high`),
+    yielding (dns, next_start) per chunk; next_start is None after the last chunk.
+    Only one chunk is held at a time.
+
+    ldap3's auto_range would otherwise read every remaining range in one go, so it
+    is switched off on `conn` for the duration of the walk, together with
+    empty-attribute filling, whose range clean-up expects the plain `member`
+    attribute to be present. Servers that ignore the range option return the
+    whole attribute, which is then sliced locally.
+    """
+    auto_range, empty_attributes = conn.auto_range, conn.empty_attributes
+    conn.auto_range = conn.empty_attributes = False
+    try:
+        low = start
+        while True:
+            conn.search(group_dn, '(objectClass=*)', search_scope=BASE,
+                        attributes=[f'member;range={low}-{low + step - 1}'])
+            if not conn.response:
+                return
+            raw = conn.response[0].get('raw_attributes', {})
+            ranged = next((name for name in raw if name.lower().startswith('member;range=')), None)
+            if ranged is None:
+                # No range support: fall back to the plain attribute
+                conn.search(group_dn, '(objectClass=*)', search_scope=BASE, attributes=['member'])
+                values = _decode(conn.response[0].get('raw_attributes', {}).get('member')) if conn.response else []
+                chunk = values[low:low + step]
+                yield chunk, (low + step if low + step < len(values) else None)
+                return
+            _, _, bounds = ranged.partition('=')
+            _, _, high = bounds.partition('-')
+            values = _decode(raw[ranged])
+            if high == '*':
+                yield values, None
+                return
+            low = int(high) + 1
+            yield values, low
+    finally:
+        conn.auto_range, conn.empty_attributes = auto_range, empty_attributes
+
+
+def member_page(conn, group_dn, offset, count):
+    """
+    Reads up to `count` member DNs of `group_dn` starting at position `offset`.
+    Returns (dns, next_offset); next_offset is None after the last member.
+    """
+    dns = []
+    next_offset = offset
+    # closing() restores the connection's settings as soon as the page is full
+    with closing(iter_member_ranges(conn, group_dn, offset, step=min(count, MAX_VAL_RANGE))) as chunks:
+        for chunk, next_start in chunks:
+            dns.extend(chunk)
+            next_offset = next_start
+            if next_start is None or len(dns) >= count:
+                break
+    if len(dns) > count:
+        dns = dns[:count]
+        next_offset = offset + count
+    return dns, next_offset
+
+
+def domain_root(dn):
+    """
+    The DC= part of a DN (e.g. 'DC=leapad,DC=com'), used as the search base for members anywhere in the domain.
+    """
+    return ','.join(f'{attribute}={value}' for attribute, value, _ in parse_dn(dn) if attribute.upper() == 'DC')
@@ -0,0 +1,305 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+class MembershipGraph:
+    """
+    In-memory user/group adjacency index built from the groups' `member` values.
+
+    Edges run both ways: group -> direct members and member -> direct groups.
+    Nested groups are members like any other DN, so effective (transitive)
+    membership is a graph walk instead of an LDAP_MATCHING_RULE_IN_CHAIN search.
+    Walk results are memoized per node until the next change. DNs compare
+    case-insensitively; results keep the casing they were first seen with.
+
+    `loader` is a callable yielding (group_dn, member_dns) for every group. The
+    graph is built on first use and rebuilt in the background once it is older
+    than `max_age` seconds; write routes apply their changes directly in between.
+    Changes applied while a build is loading are replayed on the graph it swaps
+    in, since the loader may have read the directory (or replica) before them.
+    """
+
+    def __init__(self, loader, max_age=300):
+        self._loader = loader
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._pending = None  # write-through changes made while a build is loading
+        self._reset()
+        self.built_at = None
+        self.build_seconds = None
+        self.last_error = None
+
+    def _reset(self):
+        self._names = {}  # dn_lower -> dn
+        self._groups = set()  # dn_lower of every known group
+        self._members = defaultdict(set)  # group dn_lower -> member dn_lowers
+        self._member_of = defaultdict(set)  # dn_lower -> group dn_lowers
+        self._up_memo = {}
+        self._down_memo = {}
+        self._cycles = None
+
+    def _key(self, dn):
+        key = dn.lower()
+        self._names.setdefault(key, dn)
+        return key
+
+    def _changed(self):
+        self._up_memo.clear()
+        self._down_memo.clear()
+        self._cycles = None
+
+    # -- building ----------------------------------------------------------
+
+    def build(self):
+        """
+        Reloads the whole graph from `loader` and swaps it in.
+        """
+        with self._build_lock:
+            started = time.monotonic()
+            with self._lock:
+                self._pending = []
+            try:
+                names, groups = {}, set()
+                members, member_of = defaultdict(set), defaultdict(set)
+                for group_dn, member_dns in self._loader():
+                    group = group_dn.lower()
+                    names.setdefault(group, group_dn)
+                    groups.add(group)
+                    members[group]  # groups without members still exist
+                    for member_dn in _as_list(member_dns):
+                        member = member_dn.lower()
+                        names.setdefault(member, member_dn)
+                        members[group].add(member)
+                        member_of[member].add(group)
+                with self._lock:
+                    self._reset()
+                    self._names, self._groups = names, groups
+                    self._members, self._member_of = members, member_of
+                    # Every change is a set operation, so replaying one the loader already saw is harmless
+                    for apply, args in self._pending:
+                        apply(*args)
+                    self.built_at = time.monotonic()
+                    self.build_seconds = round(self.built_at - started, 3)
+                    self.last_error = None
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Membership graph rebuild failed: %s", e)
+
+        if not self._build_lock.locked():
+            threading.Thread(target=run, name='membership-graph-build', daemon=True).start()
+
+    def ensure_built(self):
+        """
+        Builds the graph on first use; afterwards a stale graph keeps answering
+        while a fresh one is loaded in the background.
+        """
+        if self.built_at is None:
+            self.build()
+        elif time.monotonic() - self.built_at > self.max_age:
+            self._rebuild_in_background()
+
+    # -- write-through -----------------------------------------------------
+
+    def _write(self, apply, *args):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((apply, args))
+            if self.built_at is not None:
+                apply(*args)
+                self._changed()
+
+    def add_group(self, group_dn):
+        self._write(self._add_group, group_dn)
+
+    def add_member(self, group_dn, member_dn):
+        self._write(self._add_member, group_dn, member_dn)
+
+    def remove_member(self, group_dn, member_dn):
+        self._write(self._remove_member, group_dn, member_dn)
+
+    def remove(self, dn):
+        """
+        Drops a deleted user or group together with every edge touching it.
+        """
+        self._write(self._remove, dn)
+
+    def rename(self, old_dn, new_dn):
+        self._write(self._rename, old_dn, new_dn)
+
+    def _add_group(self, group_dn):
+        self._groups.add(self._key(group_dn))
+
+    def _add_member(self, group_dn, member_dn):
+        group, member = self._key(group_dn), self._key(member_dn)
+        self._groups.add(group)
+        self._members[group].add(member)
+        self._member_of[member].add(group)
+
+    def _remove_member(self, group_dn, member_dn):
+        group, member = group_dn.lower(), member_dn.lower()
+        self._members.get(group, set()).discard(member)
+        self._member_of.get(member, set()).discard(group)
+
+    def _remove(self, dn):
+        key = dn.lower()
+        for group in self._member_of.pop(key, set()):
+            self._members.get(group, set()).discard(key)
+        for member in self._members.pop(key, set()):
+            self._member_of.get(member, set()).discard(key)
+        self._groups.discard(key)
+        self._names.pop(key, None)
+
+    def _rename(self, old_dn, new_dn):
+        old, new = old_dn.lower(), new_dn.lower()
+        self._names.pop(old, None)
+        self._names[new] = new_dn
+        groups = self._member_of.pop(old, set())
+        members = self._members.pop(old, None)
+        for group in groups:
+            self._members[group].discard(old)
+            self._members[group].add(new)
+        self._member_of[new] |= groups
+        if members is not None:
+            self._members[new] |= members
+            for member in members:
+                self._member_of[member].discard(old)
+                self._member_of[member].add(new)
+        if old in self._groups:
+            self._groups.discard(old)
+            self._groups.add(new)
+
+    # -- queries -----------------------------------------------------------
+
+    def _walk(self, start, edges, memo):
+        cached = memo.get(start)
+        if cached is not None:
+            return cached
+        seen = set()
+        queue = deque(edges.get(start, ()))
+        while queue:
+            node = queue.popleft()
+            if node in seen:
+                continue
+            seen.add(node)
+            # Reuse closures already computed for nodes further along
+            done = memo.get(node)
+            if done is not None:
+                seen |= done
+                continue
+            queue.extend(edges.get(node, ()))
+        seen.discard(start)  # a group nested in itself through a cycle
+        result = frozenset(seen)
+        memo[start] = result
+        return result
+
+    def knows(self, dn):
+        with self._lock:
+            return dn.lower() in self._names
+
+    def direct_groups(self, dn):
+        with self._lock:
+            return sorted(self._names[g] for g in self._member_of.get(dn.lower(), ()))
+
+    def effective_groups(self, dn):
+        """
+        Every group `dn` belongs to directly or through nested groups.
+        """
+        with self._lock:
+            return sorted(self._names[g] for g in self._walk(dn.lower(), self._member_of, self._up_memo))
+
+    def effective_members(self, group_dn):
+        """
+        Every member of `group_dn` directly or through nested groups, split
+        into (users, groups). Anything that is not a known group counts as a user.
+        """
+        with self._lock:
+            closure = self._walk(group_dn.lower(), self._members, self._down_memo)
+            users = sorted(self._names[m] for m in closure if m not in self._groups)
+            groups = sorted(self._names[m] for m in closure if m in self._groups)
+            return users, groups
+
+    def cycles(self):
+        """
+        Groups nested in each other in a loop, as lists of DNs (strongly connected
+        components of the group graph, found with an iterative Tarjan walk).
+        """
+        with self._lock:
+            if self._cycles is not None:
+                return self._cycles
+            index, low, on_stack, stack, found = {}, {}, set(), [], []
+            counter = 0
+            for root in self._groups:
+                if root in index:
+                    continue
+                work = [(root, iter(self._members.get(root, ())))]
+                index[root] = low[root] = counter
+                counter += 1
+                stack.append(root)
+                on_stack.add(root)
+                while work:
+                    node, children = work[-1]
+                    advanced = False
+                    for child in children:
+                        if child not in self._groups:
+                            continue
+                        if child not in index:
+                            index[child] = low[child] = counter
+                            counter += 1
+                            stack.append(child)
+                            on_stack.add(child)
+                            work.append((child, iter(self._members.get(child, ()))))
+                            advanced = True
+                            break
+                        if child in on_stack:
+                            low[node] = min(low[node], index[child])
+                    if advanced:
+                        continue
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self._members.get(node, ()):
+                            found.append(sorted(self._names[m] for m in component))
+            self._cycles = found
+            return found
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self.built_at is not None,
+                'age_seconds': None if self.built_at is None else round(time.monotonic() - self.built_at, 3),
+                'build_seconds': self.build_seconds,
+                'groups': len(self._groups),
+                'nodes': len(self._names),
+                'edges': sum(len(members) for members in self._members.values()),
+                'memoized': len(self._up_memo) + len(self._down_memo),
+                'cycles': len(self.cycles()),
+                'last_error': self.last_error,
+            }
@@ -0,0 +1,235 @@
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Request latency buckets in seconds (Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Connection methods recorded per call; each maps to one LDAP operation
+INSTRUMENTED_OPERATIONS = ('search', 'add', 'modify', 'delete', 'modify_dn', 'compare')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _render_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_render_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)!r}"'
+                    lines.append(f'{self.name}_bucket{_render_labels(self.labels, key, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_render_labels(self.labels, key)} {_format_value(total)}')
+                lines.append(f'{self.name}_count{_render_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """
+    A gauge read at scrape time: `collect()` returns [(label values, value), ...].
+    """
+
+    def __init__(self, name, documentation, collect, labels=(), kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.kind = kind
+        self._collect = collect
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in self._collect():
+            lines.append(f'{self.name}{_render_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    """
+    The metrics of one process, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+LDAP_OPERATIONS = registry.register(Counter(
+    'leapad_ldap_operations_total',
+    'LDAP operations by server, operation and result (LDAP result description, or "exception").',
+    ('server', 'operation', 'result')))
+LDAP_DURATION = registry.register(Histogram(
+    'leapad_ldap_operation_duration_seconds',
+    'Latency of LDAP operations, binds included.',
+    ('operation',)))
+LDAP_ENTRIES = registry.register(Counter(
+    'leapad_ldap_search_entries_total',
+    'Entries returned by LDAP searches.'))
+LDAP_BYTES = registry.register(Counter(
+    'leapad_ldap_bytes_total',
+    'Bytes exchanged with LDAP servers.',
+    ('direction',)))
+
+
+class RequestStats:
+    """
+    The LDAP operations made on behalf of one HTTP request. Lookups run on
+    helper threads share the object through the copied context, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+        self.entries = 0
+        self.bytes = 0
+        self.bind_seconds = 0.0
+        self.search_seconds = 0.0
+        self.ldap_seconds = 0.0
+
+    def record(self, operation, seconds, entries=0, size=0):
+        with self._lock:
+            self.operations[operation] = self.operations.get(operation, 0) + 1
+            self.entries += entries
+            self.bytes += size
+            self.ldap_seconds += seconds
+            if operation == 'bind':
+                self.bind_seconds += seconds
+            elif operation == 'search':
+                self.search_seconds += seconds
+
+    def as_log_fields(self):
+        with self._lock:
+            return {
+                'ldap_ops': sum(self.operations.values()),
+                'ldap_op_types': dict(self.operations),
+                'ldap_entries': self.entries,
+                'ldap_bytes': self.bytes,
+                'ldap_bind_ms': round(self.bind_seconds * 1000, 2),
+                'ldap_search_ms': round(self.search_seconds * 1000, 2),
+                'ldap_ms': round(self.ldap_seconds * 1000, 2),
+            }
+
+
+current_request_stats = contextvars.ContextVar('current_request_stats', default=None)
+
+
+def record_operation(server, operation, seconds, result, entries=0, sent=0, received=0):
+    """
+    Records one LDAP operation in the process metrics and, inside a request, in its RequestStats.
+    """
+    LDAP_OPERATIONS.inc(server=server, operation=operation, result=result)
+    LDAP_DURATION.observe(seconds, operation=operation)
+    if entries:
+        LDAP_ENTRIES.inc(entries)
+    if sent:
+        LDAP_BYTES.inc(sent, direction='sent')
+    if received:
+        LDAP_BYTES.inc(received, direction='received')
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.record(operation, seconds, entries, sent + received)
+
+
+def _usage_bytes(conn):
+    usage = conn.usage
+    if usage is None:
+        return 0, 0
+    return usage.bytes_transmitted, usage.bytes_received
+
+
+def _instrumented(conn, operation, method):
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        sent, received = _usage_bytes(conn)
+        started = time.perf_counter()
+        try:
+            outcome = method(*args, **kwargs)
+        except Exception:
+            record_operation(conn.server.host, operation, time.perf_counter() - started, 'exception')
+            raise
+        seconds = time.perf_counter() - started
+        entries = 0
+        if operation == 'search':
+            entries = sum(1 for item in conn.response or () if item.get('type') == 'searchResEntry')
+        after_sent, after_received = _usage_bytes(conn)
+        result = (conn.result or {}).get('description') or 'success'
+        record_operation(conn.server.host, operation, seconds, result, entries,
+                         after_sent - sent, after_received - received)
+        return outcome
+    return call
+
+
+def instrument_connection(conn):
+    """
+    Wraps the operation methods of one ldap3 Connection so every call is timed
+    and counted. Returns the same connection.
+    """
+    for operation in INSTRUMENTED_OPERATIONS:
+        setattr(conn, operation, _instrumented(conn, operation, getattr(conn, operation)))
+    return conn
@@ -0,0 +1,97 @@
+import base64
+import hashlib
+import json
+
+from ldap3 import SUBTREE
+
+from serializer import search_entries
+
+# Simple Paged Results control (RFC 2696)
+PAGED_RESULTS_OID = '1.2.840.113556.1.4.319'
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a client cursor is malformed or was issued for a different query.
+    """
+
+
+def _query_key(base_dn, search_filter, attributes):
+    raw = json.dumps([base_dn, search_filter, sorted(attributes)], separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(cookie, page_size, base_dn, search_filter, attributes, server=None):
+    """
+    Wraps a paged-results cookie into an opaque, URL-safe cursor bound to the query that produced it.
+    `server` is the DC that issued the cookie, which is the only one that can continue the search.
+    """
+    payload = {
+        'c': base64.b64encode(cookie).decode('ascii'),
+        's': page_size,
+        'q': _query_key(base_dn, search_filter, attributes),
+    }
+    if server is not None:
+        payload['h'] = server
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _payload(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+
+def cursor_server(cursor):
+    """
+    The DC a cursor was issued by, or None when it does not name one (or is malformed,
+    which decode_cursor reports).
+    """
+    try:
+        server = _payload(cursor).get('h')
+    except Exception:
+        return None
+    return server if isinstance(server, str) else None
+
+
+def decode_cursor(cursor, base_dn, search_filter, attributes):
+    """
+    Returns (cookie, page_size) for a cursor issued by encode_cursor for the same query.
+    """
+    try:
+        payload = _payload(cursor)
+        cookie = base64.b64decode(payload['c'])
+        page_size = int(payload['s'])
+        query_key = payload['q']
+    except Exception:
+        raise InvalidCursorError("Malformed cursor")
+    if query_key != _query_key(base_dn, search_filter, attributes):
+        raise InvalidCursorError("Cursor does not belong to this query")
+    return cookie, page_size
+
+
+def search_page(conn, base_dn, search_filter, attributes, page_size, cookie=None, search_scope=SUBTREE):
+    """
+    Runs one page of a Simple Paged Results search.
+    Returns (entries, next_cookie), where entries are raw response dicts (see
+    serializer.entry_to_dict); next_cookie is None after the last page.
+    """
+    conn.search(base_dn, search_filter, search_scope=search_scope, attributes=attributes,
+                paged_size=page_size, paged_cookie=cookie)
+    if conn.result['description'] not in ('success', 'noSuchObject'):
+        raise Exception(f"Paged search failed: {conn.result['description']}")
+    control = conn.result.get('controls', {}).get(PAGED_RESULTS_OID, {})
+    next_cookie = control.get('value', {}).get('cookie') or None
+    return search_entries(conn), next_cookie
+
+
+def iter_search_pages(conn, base_dn, search_filter, attributes, page_size, search_scope=SUBTREE):
+    """
+    Walks every page of a paged search, yielding one page of entries at a time.
+    Only the current page is held in memory.
+    """
+    cookie = None
+    while True:
+        entries, cookie = search_page(conn, base_dn, search_filter, attributes, page_size, cookie, search_scope)
+        yield entries
+        if not cookie:
+            break
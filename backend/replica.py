@@ -0,0 +1,306 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from ldap3 import BASE, SUBTREE
+
+from paging import iter_search_pages
+from serializer import entry_to_dict, search_entries
+
+logger = logging.getLogger(__name__)
+
+# LDAP_SERVER_SHOW_DELETED_OID: makes tombstones of deleted objects visible to searches
+SHOW_DELETED_OID = '1.2.840.113556.1.4.417'
+
+# Always replicated on top of each source's attributes: the row key, the sync
+# watermark and the DN used for lookups
+_SYNC_ATTRIBUTES = ['objectGUID', 'uSNChanged', 'distinguishedName']
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS objects (
+    guid TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dn TEXT NOT NULL,
+    dn_lower TEXT NOT NULL,
+    sam_lower TEXT,
+    usn INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_kind_sam ON objects (kind, sam_lower);
+CREATE INDEX IF NOT EXISTS objects_dn ON objects (dn_lower);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+class DirectoryReplica:
+    """
+    Local SQLite copy of the users and groups under the configured base DNs.
+
+    The first sync bulk-loads every object. Later syncs only fetch objects whose
+    uSNChanged is above the high-water mark recorded from the DC's root DSE
+    (highestCommittedUSN) and drop objects whose tombstones appeared since.
+    USNs are local to one DC, so a change of DC (dsServiceName) forces a full
+    reload; a periodic full reload also catches objects moved out of scope.
+
+    `connection` is a callable returning a context manager that yields a bound
+    ldap3 connection. `sources` maps a kind ('user' or 'group') to its
+    (base_dn, search_filter, attributes). `serialize` turns an entry dict into
+    the JSON text stored in SQLite, so replica reads match live responses, and
+    `deserialize` reads it back.
+    """
+
+    def __init__(self, path, connection, sources, serialize=json.dumps, deserialize=json.loads, page_size=500,
+                 interval=60, full_sync_interval=3600):
+        self.path = path
+        self._connection = connection
+        self.sources = sources
+        self._serialize = serialize
+        self._deserialize = deserialize
+        self.page_size = page_size
+        self.interval = interval
+        self.full_sync_interval = full_sync_interval
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Writes made through this process bump dirty_seq; reads go live until a
+        # sync that started after the write has completed.
+        self._dirty_seq = 0
+        self._synced_seq = 0
+        self.last_sync = None  # monotonic time of the last successful sync
+        self.last_full_sync = None
+        self.last_error = None
+
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def _get_state(self, key):
+        row = self._db().execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_state(db, key, value):
+        db.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    # -- syncing -----------------------------------------------------------
+
+    def _read_dse(self, conn):
+        conn.search('', '(objectClass=*)', search_scope=BASE,
+                    attributes=['highestCommittedUSN', 'dsServiceName', 'defaultNamingContext'])
+        attributes = conn.response[0]['attributes'] if conn.response else {}
+
+        def first(name):
+            value = attributes.get(name)
+            return value[0] if isinstance(value, list) and value else value
+
+        return int(first('highestCommittedUSN') or 0), first('dsServiceName'), first('defaultNamingContext')
+
+    def _upsert(self, db, kind, dn, entry):
+        guid = entry.get('objectGUID')
+        if not guid or not dn:
+            return
+        sam = entry.get('sAMAccountName')
+        usn = entry.get('uSNChanged') or 0
+        db.execute('INSERT OR REPLACE INTO objects (guid, kind, dn, dn_lower, sam_lower, usn, data) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (str(guid), kind, dn, dn.lower(), sam.lower() if sam else None, int(usn), self._serialize(entry)))
+
+    def _delete_guids(self, db, guids):
+        for guid in guids:
+            db.execute('DELETE FROM objects WHERE guid = ?', (guid,))
+
+    def _load(self, conn, db, kind, search_filter_extra=None):
+        base_dn, search_filter, attributes = self.sources[kind]
+        if search_filter_extra:
+            search_filter = f'(&{search_filter}{search_filter_extra})'
+        attributes = list(dict.fromkeys(list(attributes) + _SYNC_ATTRIBUTES))
+        seen = set()
+        count = 0
+        for entries in iter_search_pages(conn, base_dn, search_filter, attributes, self.page_size):
+            for entry in entries:
+                item = entry_to_dict(entry, attributes)
+                self._upsert(db, kind, item.get('distinguishedName') or entry['dn'], item)
+                seen.add(str(item.get('objectGUID')))
+                count += 1
+        return count, seen
+
+    def _tombstones(self, conn, naming_context, since_usn):
+        """
+        GUIDs of objects deleted since `since_usn`. Needs read access to the
+        Deleted Objects container; returns an empty list when it is not granted.
+        """
+        if not naming_context:
+            return []
+        try:
+            conn.search(naming_context, f'(&(isDeleted=TRUE)(uSNChanged>={since_usn + 1}))', search_scope=SUBTREE,
+                        attributes=['objectGUID'], controls=[(SHOW_DELETED_OID, True, None)])
+        except Exception as e:
+            logger.warning("Replica tombstone search failed: %s", e)
+            return []
+        return [guid for guid in (entry_to_dict(entry, ['objectGUID'])['objectGUID'] for entry in search_entries(conn)) if guid]
+
+    def sync(self, full=False):
+        """
+        Runs one sync pass: a full reload when forced, due, or on a new DC;
+        otherwise an incremental pull of objects changed since the last pass.
+        """
+        with self._sync_lock, self._connection() as conn:
+            started_seq = self._dirty_seq
+            highest_usn, dc, naming_context = self._read_dse(conn)
+            last_usn = self._get_state('highest_usn')
+            full = (full or last_usn is None or dc != self._get_state('dc')
+                    or self.last_full_sync is None
+                    or time.monotonic() - self.last_full_sync > self.full_sync_interval)
+            counts = {}
+            with self._write_lock:
+                db = self._db()
+                with db:
+                    if full:
+                        for kind in self.sources:
+                            counts[kind], seen = self._load(conn, db, kind)
+                            stale = [row[0] for row in db.execute('SELECT guid FROM objects WHERE kind = ?', (kind,))
+                                     if row[0] not in seen]
+                            self._delete_guids(db, stale)
+                    else:
+                        since = int(last_usn)
+                        for kind in self.sources:
+                            counts[kind], _ = self._load(conn, db, kind, f'(uSNChanged>={since + 1})')
+                        self._delete_guids(db, self._tombstones(conn, naming_context, since))
+                    self._set_state(db, 'highest_usn', highest_usn)
+                    self._set_state(db, 'dc', dc)
+            now = time.monotonic()
+            self.last_sync = now
+            if full:
+                self.last_full_sync = now
+            self._synced_seq = started_seq
+            self.last_error = None
+        return {'full': full, 'changed': counts, 'highest_usn': highest_usn}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Replica sync failed: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='directory-replica-sync', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def mark_dirty(self):
+        """
+        Records a write made through this process: reads fall back to live
+        until the next sync, which is started right away.
+        """
+        with self._dirty_lock:
+            self._dirty_seq += 1
+        self._wake.set()
+
+    def delete_dn(self, dn):
+        """
+        Drops an object this process just deleted so it cannot be served again.
+        """
+        with self._write_lock:
+            db = self._db()
+            with db:
+                guids = [row[0] for row in db.execute('SELECT guid FROM objects WHERE dn_lower = ?', (dn.lower(),))]
+                self._delete_guids(db, guids)
+
+    def version(self):
+        """
+        (dc, highest_usn) of the last sync; reads served from the replica change only when it does.
+        """
+        return self._get_state('dc'), self._get_state('highest_usn')
+
+    def is_fresh(self, max_staleness):
+        return (self.last_sync is not None
+                and self._synced_seq == self._dirty_seq
+                and time.monotonic() - self.last_sync <= max_staleness)
+
+    # -- reads -------------------------------------------------------------
+
+    def covers(self, kind, attributes):
+        """
+        True when every requested attribute is replicated for `kind`.
+        """
+        return set(attributes) <= set(self.sources[kind][2]) | set(_SYNC_ATTRIBUTES)
+
+    def _project(self, data, attributes):
+        item = self._deserialize(data)
+        if attributes is None:
+            return item
+        return {name: item[name] for name in attributes if name in item}
+
+    def iter_objects(self, kind, attributes=None):
+        for (data,) in self._db().execute('SELECT data FROM objects WHERE kind = ? ORDER BY rowid', (kind,)):
+            yield self._project(data, attributes)
+
+    def get_by_sam(self, kind, samaccountname, attributes=None):
+        row = self._db().execute('SELECT data FROM objects WHERE kind = ? AND sam_lower = ?',
+                                 (kind, samaccountname.lower())).fetchone()
+        return self._project(row[0], attributes) if row else None
+
+    def get_by_dns(self, dns, attributes=None):
+        """
+        The replicated objects among `dns`, keyed by lower-cased DN.
+        """
+        keys = list(dict.fromkeys(dn.lower() for dn in dns))
+        found = {}
+        # Stays below SQLite's limit on bound parameters
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._db().execute(
+                f'SELECT dn_lower, data FROM objects WHERE dn_lower IN ({", ".join("?" * len(chunk))})', chunk)
+            for dn_lower, data in rows:
+                found[dn_lower] = self._project(data, attributes)
+        return found
+
+    def groups_of(self, user_dn):
+        row = self._db().execute('SELECT data FROM objects WHERE kind = ? AND dn_lower = ?', ('user', user_dn.lower())).fetchone()
+        if row is None:
+            return []
+        return _as_list(self._deserialize(row[0]).get('memberOf'))
+
+    def status(self):
+        counts = dict(self._db().execute('SELECT kind, COUNT(*) FROM objects GROUP BY kind').fetchall())
+        return {
+            'path': self.path,
+            'objects': counts,
+            'highest_usn': self._get_state('highest_usn'),
+            'dc': self._get_state('dc'),
+            'seconds_since_sync': None if self.last_sync is None else round(time.monotonic() - self.last_sync, 3),
+            'pending_local_writes': self._synced_seq != self._dirty_seq,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DNResolver:
+    """
+    Resolves sAMAccountNames to DNs in bulk, behind a bounded LRU cache.
+
+    Names missing from the cache are looked up together through `lookup(kind,
+    names, conn)`, which yields (sAMAccountName, dn) pairs and is expected to
+    batch them into OR-filter searches. Names compare case-insensitively.
+    Entries expire after `ttl` seconds so changes made outside this backend are
+    picked up; write routes call `forget()`/`forget_dn()` on rename and delete.
+    """
+
+    def __init__(self, lookup, max_entries=10000, ttl=600):
+        self._lookup = lookup
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (kind, name_lower) -> (expires_at, dn)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'lookups': 0, 'evictions': 0}
+
+    def resolve(self, kind, names, conn=None):
+        """
+        Returns {name: dn} for every name in `names` that exists; unknown names are left out.
+        """
+        resolved, missing = {}, {}
+        now = time.monotonic()
+        with self._lock:
+            for name in names:
+                key = (kind, name.lower())
+                cached = self._entries.get(key)
+                if cached is not None and cached[0] > now:
+                    self._entries.move_to_end(key)
+                    resolved[name] = cached[1]
+                    self._stats['hits'] += 1
+                else:
+                    missing.setdefault(name.lower(), []).append(name)
+                    self._stats['misses'] += 1
+        if not missing:
+            return resolved
+
+        found = {}
+        for sam, dn in self._lookup(kind, [spellings[0] for spellings in missing.values()], conn):
+            found[sam.lower()] = dn
+        with self._lock:
+            self._stats['lookups'] += 1
+            expires_at = time.monotonic() + self.ttl
+            for name_lower, dn in found.items():
+                self._entries[(kind, name_lower)] = (expires_at, dn)
+                self._entries.move_to_end((kind, name_lower))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        for name_lower, spellings in missing.items():
+            if name_lower in found:
+                for name in spellings:
+                    resolved[name] = found[name_lower]
+        return resolved
+
+    def resolve_one(self, kind, name, conn=None):
+        return self.resolve(kind, [name], conn).get(name)
+
+    def forget(self, kind, name):
+        with self._lock:
+            self._entries.pop((kind, name.lower()), None)
+
+    def forget_dn(self, dn):
+        """
+        Drops every name that currently resolves to `dn` (after a rename or delete).
+        """
+        dn = dn.lower()
+        with self._lock:
+            for key in [key for key, (_, cached_dn) in self._entries.items() if cached_dn.lower() == dn]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), max_entries=self.max_entries, ttl=self.ttl)
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from ldap3 import BASE, NONE
+from ldap3.protocol.rfc4512 import DsaInfo, SchemaInfo
+
+logger = logging.getLogger(__name__)
+
+
+class ServerInfoCache:
+    """
+    Process-wide cache of the directory server's root DSE (DsaInfo) and schema (SchemaInfo).
+
+    The info is read from the server once, persisted to `path` and attached to
+    every ldap3 Server the backend creates, so connections are built with
+    get_info=NONE and never download the schema again. On later starts the
+    persisted copy is reused without contacting the server. `schema_changed()`
+    compares the live subschema modifyTimestamp with the cached one so a stale
+    copy can be detected and refreshed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dsa_info = None
+        self.schema_info = None
+        self.source = None  # 'file' or 'server'
+        self.fetched_at = None
+        self.last_checked = None
+        self._servers = []
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.dsa_info is not None and self.schema_info is not None
+
+    def load(self):
+        """
+        Loads a previously persisted copy from `path`.
+        Returns True if a usable copy was found.
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            dsa_info = DsaInfo.from_json(data['info'])
+            schema_info = SchemaInfo.from_json(data['schema'])
+        except Exception as e:
+            logger.warning("Ignoring unreadable schema cache %s: %s", self.path, e)
+            return False
+        with self._lock:
+            self.dsa_info = dsa_info
+            self.schema_info = schema_info
+            self.source = 'file'
+            self.fetched_at = data.get('fetched_at')
+            # Treat the file as freshly checked; the periodic check will catch schema changes.
+            self.last_checked = time.monotonic()
+        return True
+
+    def save(self):
+        data = {
+            'fetched_at': self.fetched_at,
+            'info': self.dsa_info.to_json(indent=None),
+            'schema': self.schema_info.to_json(indent=None),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def capture(self, server):
+        """
+        Stores the info a freshly bound get_info=ALL server just downloaded and persists it.
+        """
+        if server.info is None or server.schema is None:
+            return False
+        with self._lock:
+            self.dsa_info = server.info
+            self.schema_info = server.schema
+            self.source = 'server'
+            self.fetched_at = datetime.now(timezone.utc).isoformat()
+            self.last_checked = time.monotonic()
+            servers = list(self._servers)
+        for cached_server in servers:
+            self._attach(cached_server)
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning("Could not persist schema cache to %s: %s", self.path, e)
+        return True
+
+    def _attach(self, server):
+        # The info is already known, so binds on this server must not download it again
+        server.get_info = NONE
+        server.attach_dsa_info(self.dsa_info)
+        server.attach_schema_info(self.schema_info)
+
+    def attach(self, server):
+        """
+        Attaches the cached info to `server` and keeps a reference so a later
+        refresh is applied to it as well.
+        """
+        with self._lock:
+            if server not in self._servers:
+                self._servers.append(server)
+            if self.loaded:
+                self._attach(server)
+
+    def modify_timestamp(self):
+        """
+        The cached subschema modifyTimestamp as a raw string, or None.
+        """
+        if self.schema_info is None:
+            return None
+        for name, values in self.schema_info.raw.items():
+            if name.lower() == 'modifytimestamp' and values:
+                value = values[0]
+                return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+        return None
+
+    def schema_changed(self, conn):
+        """
+        Reads the live subschema modifyTimestamp over `conn` and compares it with the cached one.
+        Returns True when the server schema is newer than the cached copy.
+        """
+        self.last_checked = time.monotonic()
+        if self.schema_info is None:
+            return True
+        conn.search(self.schema_info.schema_entry, '(objectClass=subschema)',
+                    search_scope=BASE, attributes=['modifyTimestamp'])
+        if not conn.response:
+            return False
+        for name, values in conn.response[0].get('raw_attributes', {}).items():
+            if name.lower() == 'modifytimestamp' and values:
+                live = values[0].decode('utf-8') if isinstance(values[0], bytes) else str(values[0])
+                return live != self.modify_timestamp()
+        return False
+
+    def check_due(self, interval):
+        return self.last_checked is None or time.monotonic() - self.last_checked > interval
+
+    def status(self):
+        return {
+            'loaded': self.loaded,
+            'source': self.source,
+            'fetched_at': self.fetched_at,
+            'schema_modify_timestamp': self.modify_timestamp(),
+            'path': self.path,
+        }
@@ -0,0 +1,36 @@
+from ldap3.utils.conv import escape_filter_chars
+
+# Attributes a search can be scoped to; all indexed in AD, so `value*` is an index range scan
+SEARCHABLE_ATTRIBUTES = ('sAMAccountName', 'displayName', 'mail')
+
+
+def query_scope(names):
+    """
+    Canonical names of the comma-separated attributes in `names` (any case).
+    Raises ValueError for attributes that cannot be searched.
+    """
+    known = {name.lower(): name for name in SEARCHABLE_ATTRIBUTES}
+    scope = []
+    for name in (name.strip() for name in names.split(',')):
+        if not name:
+            continue
+        if name.lower() not in known:
+            raise ValueError(f"Cannot search by {name}; searchable attributes: {', '.join(SEARCHABLE_ATTRIBUTES)}")
+        scope.append(known[name.lower()])
+    return list(dict.fromkeys(scope))
+
+
+def query_filter(object_filter, query, scope=None, use_anr=True):
+    """
+    The LDAP filter for a search-box query, with `query` escaped.
+
+    Without a scope, AD's Ambiguous Name Resolution (`anr=`) matches the query
+    as a prefix of the names, mail addresses and "first last" combinations it
+    indexes for that. With a scope, or when ANR is off, it is an OR of prefix
+    matches on the scoped (default: all searchable) attributes.
+    """
+    value = escape_filter_chars(query)
+    if use_anr and not scope:
+        return f'(&{object_filter}(anr={value}))'
+    clauses = ''.join(f'({name}={value}*)' for name in scope or SEARCHABLE_ATTRIBUTES)
+    return f'(&{object_filter}(|{clauses}))'
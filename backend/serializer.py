@@ -0,0 +1,148 @@
+import base64
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider
+
+from util import attribute_types, multi_valued_attributes
+
+try:
+    import orjson
+except ImportError:  # Flask's standard library encoder is used instead
+    orjson = None
+
+_FILETIME_EPOCH = datetime(1601, 1, 1, tzinfo=timezone.utc)
+# FILETIME values that mean "not set" or "never" rather than a point in time
+_FILETIME_NEVER = (0, 0x7FFFFFFFFFFFFFFF)
+
+
+def _text(value):
+    try:
+        return value.decode('utf-8')
+    except UnicodeDecodeError:
+        return base64.b64encode(value).decode('ascii')
+
+
+def _guid(value):
+    if len(value) != 16:
+        return _text(value)
+    # Same '{...}' form ldap3 uses, so GUIDs stored by the replica keep matching
+    return '{' + str(uuid.UUID(bytes_le=value)) + '}'
+
+
+def _sid(value):
+    try:
+        sub_authorities = struct.unpack_from(f'<{value[1]}I', value, 8)
+    except (IndexError, struct.error):
+        return _text(value)
+    authority = int.from_bytes(value[2:8], 'big')
+    return f'S-{value[0]}-{authority}' + ''.join(f'-{sub}' for sub in sub_authorities)
+
+
+def _filetime(value):
+    """
+    100ns intervals since 1601-01-01 UTC (pwdLastSet, lastLogon, ...) as ISO 8601.
+    """
+    try:
+        ticks = int(value)
+        if ticks in _FILETIME_NEVER:
+            return None
+        return (_FILETIME_EPOCH + timedelta(microseconds=ticks // 10)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    except (ValueError, OverflowError):
+        return _text(value)
+
+
+def _generalized_time(value):
+    """
+    LDAP GeneralizedTime ('20240101120000.0Z') as ISO 8601, by slicing.
+    """
+    text = value.decode('ascii', 'replace')
+    if len(text) < 15 or text[-1] != 'Z' or not text[:14].isdigit():
+        return text
+    return f'{text[0:4]}-{text[4:6]}-{text[6:8]}T{text[8:10]}:{text[10:12]}:{text[12:14]}Z'
+
+
+def _integer(value):
+    try:
+        return int(value)
+    except ValueError:
+        return _text(value)
+
+
+_DECODERS = {
+    'guid': _guid,
+    'sid': _sid,
+    'filetime': _filetime,
+    'generalized_time': _generalized_time,
+    'integer': _integer,
+}
+_TYPES = {name.lower(): _DECODERS[kind] for name, kind in attribute_types.items()}
+_MULTI_VALUED = {name.lower() for name in multi_valued_attributes}
+
+
+@lru_cache(maxsize=256)
+def _plan(attributes):
+    """
+    {lower-cased name: (output name, decoder, multi-valued)} for one attribute projection.
+    """
+    return {name.lower(): (name, _TYPES.get(name.lower(), _text), name.lower() in _MULTI_VALUED)
+            for name in attributes}
+
+
+def search_entries(conn):
+    """
+    The entries of the last search on `conn` as raw response dicts, skipping referrals.
+    """
+    return [item for item in conn.response or [] if item.get('type') == 'searchResEntry']
+
+
+def entry_to_dict(entry, attributes):
+    """
+    Turns one raw search response entry into a JSON-ready dict of `attributes`.
+
+    Values are decoded straight from `raw_attributes` by attribute type
+    (util.attribute_types): GUIDs and SIDs become strings, FILETIME and
+    GeneralizedTime values become ISO 8601 UTC. Multi-valued attributes are
+    always lists; others are a single value. Requested attributes the entry
+    does not have come back as None (or an empty list).
+    """
+    plan = _plan(tuple(attributes))
+    item = {}
+    for raw_name, values in entry['raw_attributes'].items():
+        key = raw_name.lower()
+        step = plan.get(key)
+        if step is None:
+            name, decode, multi = raw_name, _TYPES.get(key, _text), key in _MULTI_VALUED
+        else:
+            name, decode, multi = step
+        decoded = [decode(value) for value in values or ()]
+        item[name] = decoded if multi or len(decoded) > 1 else (decoded[0] if decoded else None)
+    if len(item) < len(plan):
+        for name, _, multi in plan.values():
+            if name not in item:
+                item[name] = [] if multi else None
+    return item
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding with orjson when it is installed. Calls with
+    extra options (e.g. the indented output of debug mode) and values orjson
+    cannot encode go through Flask's own encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
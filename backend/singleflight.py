@@ -0,0 +1,65 @@
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs identical concurrent loads once. While a load for a key is in flight,
+    every other caller with the same key waits for it and gets its result (or
+    its exception) instead of starting its own. Nothing is kept after the load
+    returns, so this works the same with or without a cache in front of it.
+    Results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, load):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = load()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def forget(self):
+        """
+        Detaches the loads in flight: they still finish for their callers, but
+        later callers start a new load. Called after a write, so no one is
+        handed a result read before it.
+        """
+        with self._lock:
+            self._calls.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'leaders': self.leaders, 'shared': self.shared}
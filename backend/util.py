@@ -3,6 +3,7 @@ user_search_attributes = [
             "displayName",
             "distinguishedName",
             "givenName",
+            "lastLogon",
             "mail",
             "memberOf",
             "name",
@@ -11,6 +12,7 @@ user_search_attributes = [
             "pwdLastSet",
             "sAMAccountName",
             "sn",
+            "userAccountControl",
             "userPrincipalName",
             "whenCreated",
             "objectClass",
@@ -32,36 +34,30 @@ group_search_attributes=[
     "whenChanged"
 ]
 
-user_search_attributes = [
-            "cn",
-            "displayName",
-            "distinguishedName",
-            "givenName",
-            "mail",
-            "memberOf",
-            "name",
-            "objectCategory",
-            "objectGUID",
-            "pwdLastSet",
-            "sAMAccountName",
-            "sn",
-            "userPrincipalName",
-            "whenCreated",
-            "objectClass",
-            "whenChanged"
-        ]
+# How serializer.py decodes the raw values of these attributes; any other
+# attribute is UTF-8 text (base64 when it is binary)
+attribute_types = {
+    "objectGUID": "guid",
+    "objectSid": "sid",
+    "pwdLastSet": "filetime",
+    "lastLogon": "filetime",
+    "lastLogonTimestamp": "filetime",
+    "accountExpires": "filetime",
+    "badPasswordTime": "filetime",
+    "lockoutTime": "filetime",
+    "whenCreated": "generalized_time",
+    "whenChanged": "generalized_time",
+    "uSNCreated": "integer",
+    "uSNChanged": "integer",
+    "userAccountControl": "integer",
+    "groupType": "integer",
+    "badPwdCount": "integer"
+}
 
-group_search_attributes=[
-    "cn",
-    "distinguishedName",
-    "name",
-    "objectCategory",
-    "objectGUID",
-    "objectSid",
-    "description",
+# Always serialized as lists, even when they hold a single value
+multi_valued_attributes = [
     "member",
+    "memberOf",
     "objectClass",
-    "sAMAccountName",
-    "whenCreated",
-    "whenChanged"
+    "proxyAddresses"
 ]
\ No newline at end of file
@@ -9,6 +9,12 @@ export function fetchAllGroups() {
   return axiosInstance.get(`${BASEURL}/groups`);
 }
 
+export function searchGroups(q, limit) {
+  return axiosInstance.get(`${BASEURL}/groups/search`, {
+    params: { q, limit },
+  });
+}
+
 export function fetchOneGroup(name) {
   return axiosInstance.get(`${BASEURL}/groups/one`, {
     params: { name },
@@ -19,10 +25,20 @@ export function fetchAllUsers() {
   return axiosInstance.get(`${BASEURL}/users`);
 }
 
+export function searchUsers(q, limit) {
+  return axiosInstance.get(`${BASEURL}/users/search`, {
+    params: { q, limit },
+  });
+}
+
 export function assignUserToGroup({ user_dn, group_dn }) {
   return axiosInstance.post(`${BASEURL}/groups/members`, { user_dn, group_dn });
 }
 
+export function updateGroupMembers({ add = [], remove = [] }) {
+  return axiosInstance.post(`${BASEURL}/groups/members/batch`, { add, remove });
+}
+
 export function unassignUserFromGroup({ user_dn, group_dn }) {
   return axiosInstance.delete(`${BASEURL}/groups/members`, {
     params: { user_dn, group_dn },
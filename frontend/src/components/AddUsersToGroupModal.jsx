@@ -2,7 +2,7 @@ import { useState } from "react";
 import Loader from "./loader";
 import { useSearchHook } from "../hooks";
 import SearchInput from "./SearchInput";
-import { assignUserToGroup } from "../api";
+import { assignUserToGroup, updateGroupMembers } from "../api";
 import { getStatus, renderStatusComponent } from "../util";
 
 export default function AddUsersToGroupModal({
@@ -13,6 +13,7 @@ export default function AddUsersToGroupModal({
 }) {
   const [userAddedIds, setUserAddedIds] = useState([]);
   const [adding, setAdding] = useState(false);
+  const [selectedIds, setSelectedIds] = useState([]);
 
   const handleAddToGroup = (user) => {
     setAdding(true);
@@ -26,6 +27,46 @@ export default function AddUsersToGroupModal({
       .finally(() => setAdding(false));
   };
 
+  const toggleSelected = (user) =>
+    setSelectedIds((prev) =>
+      prev.includes(user.sAMAccountName)
+        ? prev.filter((id) => id !== user.sAMAccountName)
+        : [...prev, user.sAMAccountName]
+    );
+
+  // Adds every selected user with a single batch request
+  const handleAddSelected = () => {
+    const users = usersNotInGroup.filter((it) =>
+      selectedIds.includes(it.sAMAccountName)
+    );
+    if (!users.length) return;
+    setAdding(true);
+    const group_dn = group.distinguishedName;
+    updateGroupMembers({
+      add: users.map((user) => ({
+        user_dn: user.distinguishedName,
+        group_dn,
+      })),
+    })
+      .then(({ data }) => {
+        const done = data.results
+          .filter(
+            (it) => it.status === "added" || it.status === "already-member"
+          )
+          .map((it) => it.user_dn);
+        const added = users.filter((user) =>
+          done.includes(user.distinguishedName)
+        );
+        setUserAddedIds((prev) => [
+          ...prev,
+          ...added.map((it) => it.sAMAccountName),
+        ]);
+        setSelectedIds([]);
+        added.forEach((user) => onSuccess(user, group));
+      })
+      .finally(() => setAdding(false));
+  };
+
   const filtered = usersNotInGroup.filter(
     (it) => !userAddedIds.includes(it.sAMAccountName)
   );
@@ -37,6 +78,13 @@ export default function AddUsersToGroupModal({
         <div className="inline-headers">
           <h5>Add Users To Group</h5>
           <SearchInput value={value} onChange={onChange} />
+          <button
+            className="btnsmall"
+            disabled={adding || !selectedIds.length}
+            onClick={() => !adding && handleAddSelected()}
+          >
+            <b>Add selected ({selectedIds.length})</b>
+          </button>
           <button
             className="btnsmall grey small"
             onClick={() => !adding && onClose()}
@@ -48,6 +96,7 @@ export default function AddUsersToGroupModal({
           <table className="good-table">
             <thead>
               <tr>
+                <th></th>
                 <th>Name</th>
                 <th>SamAccountName</th>
                 <th>Status</th>
@@ -57,6 +106,14 @@ export default function AddUsersToGroupModal({
             <tbody>
               {data.map((member) => (
                 <tr key={member.sAMAccountName}>
+                  <td>
+                    <input
+                      type="checkbox"
+                      disabled={adding || !getStatus(member)}
+                      checked={selectedIds.includes(member.sAMAccountName)}
+                      onChange={() => toggleSelected(member)}
+                    />
+                  </td>
                   <td>{member.cn}</td>
                   <td>{member.sAMAccountName}</td>
                   <td>{renderStatusComponent(member)}</td>
@@ -138,6 +138,38 @@ export const useSearchHook = (listItems, key) => {
   return [newItems, value, handleChange, reset];
 };
 
+const SEARCH_DEBOUNCE_IN_MS = 250;
+
+// Like useSearchHook, but once something is typed the results come from the
+// server's search endpoint (`search`, e.g. searchUsers) instead of filtering
+// `listItems`, so searching does not depend on the whole directory being loaded
+export const useDirectorySearchHook = (listItems, search) => {
+  const [value, setValue] = useState("");
+  const [results, setResults] = useState(null);
+  const handleChange = (e) => setValue(e.target.value);
+
+  useEffect(() => {
+    const query = value.trim();
+    if (!query) {
+      setResults(null);
+      return;
+    }
+    let current = true;
+    const timer = setTimeout(() => {
+      search(query)
+        .then((res) => current && setResults(res.data.items))
+        .catch(() => current && setResults([]));
+    }, SEARCH_DEBOUNCE_IN_MS);
+    return () => {
+      current = false;
+      clearTimeout(timer);
+    };
+  }, [value]);
+
+  const reset = () => setValue("");
+  return [value.trim() && results ? results : listItems, value, handleChange, reset];
+};
+
 export const useUpdateGroupHook = () => {
   const { dispatch } = useStore();
   const addUserToGroup = ({ group, user }) =>
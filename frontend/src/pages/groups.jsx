@@ -1,5 +1,6 @@
 import { useState } from "react";
-import { useGroupsHook, useSearchHook } from "../hooks";
+import { useGroupsHook, useDirectorySearchHook } from "../hooks";
+import { searchGroups } from "../api";
 import Loader from "../components/loader";
 import Modal from "../components/AddGroupModal";
 import { Link } from "react-router-dom";
@@ -24,9 +25,9 @@ export default function Groups() {
 
   const [allGroups, groupLoading, groupFetchErr, refresh] = useGroupsHook();
   const [modal, setModal] = useState(false);
-  const [filteredGroups, searchValue, handleChange] = useSearchHook(
+  const [filteredGroups, searchValue, handleChange] = useDirectorySearchHook(
     allGroups,
-    "name"
+    searchGroups
   );
   return (
     <div className="container relative">
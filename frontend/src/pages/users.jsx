@@ -6,7 +6,8 @@ import UserIcon from "../components/UserIcon";
 import SearchInput from "../components/SearchInput";
 import ConfirmationModal from "../components/ConfirmationModal";
 
-import { useSearchHook, useUsersHook } from "../hooks";
+import { useDirectorySearchHook, useUsersHook } from "../hooks";
+import { searchUsers } from "../api";
 import { renderStatusComponent, formatDate, getStatus } from "../util";
 
 export default function Users() {
@@ -158,9 +159,9 @@ export default function Users() {
     );
   };
 
-  const [filteredUsersToShow, searchValue, handleChange] = useSearchHook(
+  const [filteredUsersToShow, searchValue, handleChange] = useDirectorySearchHook(
     users,
-    "cn"
+    searchUsers
   );
 
   return (
@@ -1,37 +1,263 @@
+"""
+create-users: creates users from batches of queue messages (SQS event source).
+
+Each message body is one JSON user with the same fields as the backend's
+POST /users. Users are created with the same semantics as create_user in
+backend/app.py: disabled, added to DEFAULT_GROUP_DN plus the groups named in
+memberOf (unknown names are ignored), and failed only when the add fails or
+no group could be joined.
+
+The handler returns the messages that failed as batchItemFailures, so only
+those are redelivered (the event source mapping needs ReportBatchItemFailures).
+A redelivered message whose user already exists is not an error: the existing
+user is put into its groups, so retries are safe.
+"""
+import time
+
+_import_started = time.perf_counter()
+
 import json
 import os
-from ldap3 import Server, Connection, ALL, SUBTREE
+import re
+import ssl
+
+from ldap3 import BASE, MODIFY_ADD, NONE, SUBTREE, Connection, Server, Tls
+from ldap3.core.exceptions import LDAPCommunicationError
+from ldap3.utils.conv import escape_filter_chars
+
+USER_DN = os.environ["USER_DN"]
+PASSWORD = os.environ["PASSWORD"]
+LDAP_SERVER = os.environ["SERVER_ADDRESS"]
+BASE_DN_USERS = os.environ["BASE_DN_USERS"]
+BASE_DN_GROUPS = os.environ["BASE_DN_GROUPS"]
+DEFAULT_GROUP_DN = os.environ["DEFAULT_GROUP_DN"]
+# Optional: UPN suffix for userPrincipalName (e.g., 'leapad.com')
+UPN_SUFFIX = os.environ.get("UPN_SUFFIX")
+
+# 'ldaps', 'starttls' or 'plain'; fixed up front so a cold start does not probe each transport
+LDAP_TRANSPORT = os.environ.get("LDAP_TRANSPORT", "ldaps")
+LDAP_SSL_PORT = int(os.environ.get("LDAP_SSL_PORT", "636"))
+LDAP_IGNORE_CERT = os.environ.get("LDAP_IGNORE_CERT", "false").lower() in ("1", "true", "yes")
+
+# Group names per OR-filter when resolving a batch's groups
+LDAP_OR_FILTER_CHUNK = int(os.environ.get("LDAP_OR_FILTER_CHUNK", "100"))
+
+REQUIRED_FIELDS = ['first_name', 'last_name', 'email', 'sAMAccountName']
+# Results of adding a member a group already has
+_ALREADY_MEMBER_RESULTS = ('attributeOrValueExists', 'entryAlreadyExists')
+# Characters AD does not allow in sAMAccountName
+_INVALID_SAM_CHARS = re.compile(r'["/\\\[\]:;|=,+*?<>@]')
+
+# Kept between invocations of a warm container
+_connection = None
+_cold_start = True
+
+
+class RecordError(Exception):
+    """
+    A message that cannot be turned into a user.
+    """
+
+
+def _connect():
+    """
+    Opens and binds a new connection with the configured transport.
+    """
+    if LDAP_TRANSPORT == 'ldaps':
+        tls = Tls(validate=ssl.CERT_NONE) if LDAP_IGNORE_CERT else Tls()
+        server = Server(LDAP_SERVER, port=LDAP_SSL_PORT, use_ssl=True, tls=tls, get_info=NONE, connect_timeout=5)
+        return Connection(server, user=USER_DN, password=PASSWORD, auto_bind=True)
+    server = Server(LDAP_SERVER, port=389, get_info=NONE, connect_timeout=5)
+    conn = Connection(server, user=USER_DN, password=PASSWORD, auto_bind=False)
+    conn.open()
+    if LDAP_TRANSPORT == 'starttls' and not conn.start_tls():
+        raise Exception("StartTLS not supported or failed")
+    if not conn.bind():
+        raise Exception(f"Bind failed: {conn.result['description']}")
+    return conn
+
+
+def get_connection():
+    """
+    The container's bound connection, opened only when there is none yet or the previous one was closed.
+    """
+    global _connection
+    if _connection is None or _connection.closed:
+        _connection = _connect()
+    return _connection
+
+
+def parse_record(record):
+    """
+    The user fields of one SQS record. Raises RecordError when they are unusable.
+    """
+    try:
+        row = json.loads(record.get('body') or '')
+    except ValueError as e:
+        raise RecordError(f"Body is not valid JSON: {e}")
+    if not isinstance(row, dict):
+        raise RecordError("Body is not a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if not isinstance(row.get(field), str) or not row[field].strip()]
+    if missing:
+        raise RecordError(f"Missing required fields: {', '.join(missing)}")
+    if len(row['sAMAccountName']) > 20 or _INVALID_SAM_CHARS.search(row['sAMAccountName']):
+        raise RecordError("sAMAccountName must be at most 20 characters without special characters")
+    groups = row.get('memberOf') or []
+    if not isinstance(groups, list) or not all(isinstance(name, str) for name in groups):
+        raise RecordError("memberOf must be a list of group names")
+    return row
+
+
+def resolve_groups(conn, names):
+    """
+    {lower-cased sAMAccountName: DN} for the groups among `names`, with one
+    OR-filter search per LDAP_OR_FILTER_CHUNK names.
+    """
+    names = list(dict.fromkeys(name.lower() for name in names))
+    group_dns = {}
+    for start in range(0, len(names), LDAP_OR_FILTER_CHUNK):
+        chunk = names[start:start + LDAP_OR_FILTER_CHUNK]
+        clauses = ''.join(f'(sAMAccountName={escape_filter_chars(name)})' for name in chunk)
+        conn.search(BASE_DN_GROUPS, f'(&(objectClass=group)(|{clauses}))',
+                    search_scope=SUBTREE, attributes=['sAMAccountName'])
+        for entry in conn.response or []:
+            if entry.get('type') == 'searchResEntry':
+                sam = entry['raw_attributes']['sAMAccountName'][0].decode('utf-8')
+                group_dns[sam.lower()] = entry['dn']
+    return group_dns
+
+
+def _existing_sam(conn, user_dn):
+    conn.search(user_dn, '(objectClass=user)', search_scope=BASE, attributes=['sAMAccountName'])
+    for entry in conn.response or []:
+        if entry.get('type') == 'searchResEntry':
+            values = entry['raw_attributes'].get('sAMAccountName')
+            return values[0].decode('utf-8') if values else None
+    return None
+
+
+def create_user(conn, row, group_dns):
+    """
+    Creates one user and adds it to its groups, as POST /users does.
+    Returns the outcome: { status: created|existing|failed, ... }
+    """
+    first_name = row['first_name']
+    last_name = row['last_name']
+    email = row['email']
+    sAMAccountName = row['sAMAccountName']
+    full_name = f"{first_name} {last_name}"
+    user_dn = f"CN={full_name},{BASE_DN_USERS}"
+    outcome = {'sAMAccountName': sAMAccountName, 'distinguishedName': user_dn}
+
+    # Derive userPrincipalName: prefer configured UPN suffix; fall back to email
+    if UPN_SUFFIX:
+        user_principal_name = f"{sAMAccountName}@{UPN_SUFFIX}"
+    else:
+        user_principal_name = email
+
+    attributes = {
+        'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+        'cn': full_name,
+        'sn': last_name,
+        'givenName': first_name,
+        'displayName': full_name,
+        'userPrincipalName': user_principal_name,
+        'mail': email,
+        'sAMAccountName': sAMAccountName,
+        # Create as disabled account without password; can be enabled after setting password
+        'userAccountControl': 546,
+    }
+
+    conn.add(user_dn, attributes=attributes)
+    result = conn.result['description']
+    if result == 'entryAlreadyExists':
+        # A redelivered message: carry on with the memberships of the user it created
+        existing = _existing_sam(conn, user_dn)
+        if existing is None or existing.lower() != sAMAccountName.lower():
+            return dict(outcome, status='failed', error=f"Failed to add user: {result}")
+        outcome['status'] = 'existing'
+    elif result != 'success':
+        return dict(outcome, status='failed', error=f"Failed to add user: {result}")
+    else:
+        outcome['status'] = 'created'
+
+    requested = row.get('memberOf') or []
+    target_group_dns = {group_dns[name.lower()] for name in requested if name.lower() in group_dns}
+    target_group_dns.add(DEFAULT_GROUP_DN)
+    outcome['unknown_groups'] = [name for name in requested if name.lower() not in group_dns]
+
+    added_groups = []
+    failed_groups = []
+    for grp_dn in sorted(target_group_dns):
+        conn.modify(grp_dn, {'member': [(MODIFY_ADD, [user_dn])]})
+        if conn.result['description'] == 'success' or conn.result['description'] in _ALREADY_MEMBER_RESULTS:
+            added_groups.append(grp_dn)
+        else:
+            failed_groups.append({'group_dn': grp_dn, 'error': conn.result['description']})
+    outcome.update(added_groups=added_groups, failed_groups=failed_groups)
+    if failed_groups and not added_groups:
+        return dict(outcome, status='failed', error='User created, but failed to add to any groups')
+    return outcome
 
 
 def handler(event, context):
     """
     Lambda handler for create-users function
-    
+
     Args:
-        event: Lambda event
+        event: Lambda event with a `Records` array (SQS), one user per message body
         context: Lambda context
-        
+
     Returns:
-        Lambda response
+        { batchItemFailures: [{ itemIdentifier: messageId }, ...] } for the messages to redeliver
     """
+    global _connection, _cold_start
+    started = time.perf_counter()
+    summary = {'cold_start': _cold_start, 'records': 0, 'created': 0, 'existing': 0, 'failed': 0}
+    if _cold_start:
+        summary['import_ms'] = IMPORT_MS
+        _cold_start = False
+
+    rows = {}
+    outcomes = {}
+    for record in (event or {}).get('Records') or []:
+        message_id = record.get('messageId')
+        try:
+            rows[message_id] = parse_record(record)
+        except RecordError as e:
+            outcomes[message_id] = {'status': 'failed', 'error': str(e)}
+    summary['records'] = len(rows) + len(outcomes)
+
     try:
-        # Your function logic here
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'message': 'Success from create-users'})
-        }
+        conn = get_connection()
+        # Every group named anywhere in the batch, in one lookup
+        group_dns = resolve_groups(conn, [name for row in rows.values() for name in row.get('memberOf') or []])
     except Exception as e:
-        print(f"Error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
+        if isinstance(e, LDAPCommunicationError):
+            _connection = None
+        for message_id in rows:
+            outcomes[message_id] = {'status': 'failed', 'error': f"An error occurred: {str(e)}"}
+        rows = {}
+
+    for message_id, row in rows.items():
+        try:
+            outcomes[message_id] = create_user(get_connection(), row, group_dns)
+        except Exception as e:
+            if isinstance(e, LDAPCommunicationError):
+                # The next record reconnects; this one is redelivered
+                _connection = None
+            outcomes[message_id] = {'sAMAccountName': row['sAMAccountName'], 'status': 'failed',
+                                    'error': f"An error occurred: {str(e)}"}
+
+    failures = []
+    for message_id, outcome in outcomes.items():
+        summary[outcome['status']] += 1
+        if outcome['status'] == 'failed':
+            failures.append({'itemIdentifier': message_id})
+        print(json.dumps({'message': 'create-users record', 'messageId': message_id, **outcome}))
+    summary['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    print(json.dumps({'message': 'create-users invocation', **summary}))
+    return {'batchItemFailures': failures}
+
+
+IMPORT_MS = round((time.perf_counter() - _import_started) * 1000, 2)
@@ -0,0 +1,97 @@
+"""
+Runs the handler on an event file against an in-memory mock directory:
+
+    python local.py events/sqs.json
+
+The mock (ldap3 MOCK_SYNC) holds the users and groups OUs, DEFAULT_GROUP_DN
+and the groups given with --group (by default Engineering and VPN-Users).
+The event is handled twice, the second time as a redelivery, and the
+resulting group members are printed.
+"""
+import argparse
+import json
+import os
+
+DOMAIN_DN = 'DC=leapad,DC=local'
+
+os.environ.setdefault('USER_DN', f'CN=svc-leapad,CN=Users,{DOMAIN_DN}')
+os.environ.setdefault('PASSWORD', 'password')
+os.environ.setdefault('SERVER_ADDRESS', 'mock-dc')
+os.environ.setdefault('BASE_DN_USERS', f'OU=Users,OU=LeapAD,{DOMAIN_DN}')
+os.environ.setdefault('BASE_DN_GROUPS', f'OU=Groups,OU=LeapAD,{DOMAIN_DN}')
+os.environ.setdefault('DEFAULT_GROUP_DN', f"CN=Employees,{os.environ['BASE_DN_GROUPS']}")
+
+from ldap3 import MODIFY_ADD, MOCK_SYNC, OFFLINE_AD_2012_R2, Connection, Server  # noqa: E402
+from ldap3.utils.conv import to_raw  # noqa: E402
+from ldap3.utils.dn import safe_dn  # noqa: E402
+
+from app import main  # noqa: E402
+
+
+DEFAULT_GROUPS = ['Engineering', 'VPN-Users']
+
+
+class DirectoryConnection(Connection):
+    """
+    A mock connection that, like a DC, answers attributeOrValueExists when a
+    modify adds a value the attribute already holds. MOCK_SYNC alone would
+    store the value a second time.
+    """
+
+    def modify(self, dn, changes, controls=None):
+        entry = self.server.dit.get(safe_dn(dn), {})
+        for attribute, change_list in changes.items():
+            held = next((values for name, values in entry.items() if name.lower() == attribute.lower()), [])
+            held = {value.lower() for value in held}
+            for operation, values in [change_list] if isinstance(change_list, tuple) else change_list:
+                if operation == MODIFY_ADD and any(to_raw(value).lower() in held for value in values):
+                    self.result = {'result': 20, 'description': 'attributeOrValueExists', 'dn': '',
+                                   'message': f'{attribute} already holds the value', 'referrals': None,
+                                   'type': 'modifyResponse'}
+                    return False
+        return super().modify(dn, changes, controls)
+
+
+def mock_directory(groups):
+    server = Server('mock-dc', get_info=OFFLINE_AD_2012_R2)
+    conn = Connection(server, user=os.environ['USER_DN'], password=os.environ['PASSWORD'], client_strategy=MOCK_SYNC)
+    conn.strategy.add_entry(os.environ['USER_DN'], {'objectClass': ['top', 'person', 'user'], 'userPassword': os.environ['PASSWORD']})
+    for ou in (f'OU=LeapAD,{DOMAIN_DN}', os.environ['BASE_DN_USERS'], os.environ['BASE_DN_GROUPS']):
+        conn.strategy.add_entry(ou, {'objectClass': ['top', 'organizationalUnit'], 'ou': ou.split(',')[0][3:]})
+    for name in ['Employees'] + groups:
+        dn = f"CN={name},{os.environ['BASE_DN_GROUPS']}"
+        conn.strategy.add_entry(dn, {'objectClass': ['top', 'group'], 'cn': name, 'sAMAccountName': name})
+    return server
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('event', help='JSON event file, e.g. events/sqs.json')
+    parser.add_argument('--group', action='append', default=None,
+                        help=f"group to create in the mock directory (repeatable; default: {', '.join(DEFAULT_GROUPS)})")
+    args = parser.parse_args()
+    with open(args.event) as f:
+        event = json.load(f)
+
+    server = mock_directory(args.group or DEFAULT_GROUPS)
+
+    def connect():
+        # The mock ignores auto_bind
+        conn = DirectoryConnection(server, user=os.environ['USER_DN'], password=os.environ['PASSWORD'], client_strategy=MOCK_SYNC)
+        conn.bind()
+        return conn
+
+    main._connect = connect
+    for attempt in ('first delivery', 'redelivery'):
+        print(f'--- {attempt}')
+        print(json.dumps(main.handler(event, None), indent=2))
+
+    conn = main.get_connection()
+    conn.search(os.environ['BASE_DN_GROUPS'], '(objectClass=group)', attributes=['cn', 'member'])
+    print('--- groups')
+    for entry in conn.entries:
+        print(entry.cn.value, entry.member.values)
+
+
+if __name__ == '__main__':
+    main_()
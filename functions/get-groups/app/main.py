@@ -1,37 +1,324 @@
+"""
+get-groups: the same group listing as the backend's GET /groups.
+
+Everything that is expensive to set up lives at module scope, so a warm
+container reuses it: the imports, the Server and the bound Connection. The
+connection is opened with get_info=NONE, so a cold start is one bind and no
+schema download, and values are decoded from their raw bytes instead.
+"""
+import time
+
+_import_started = time.perf_counter()
+
+import base64
+import hashlib
 import json
 import os
-from ldap3 import Server, Connection, ALL, SUBTREE
+import ssl
+import struct
+import uuid
+
+from ldap3 import NONE, SUBTREE, Connection, Server, Tls
+from ldap3.core.exceptions import LDAPCommunicationError
+
+USER_DN = os.environ["USER_DN"]
+PASSWORD = os.environ["PASSWORD"]
+LDAP_SERVER = os.environ["SERVER_ADDRESS"]
+BASE_DN_GROUPS = os.environ["BASE_DN_GROUPS"]
+
+# 'ldaps', 'starttls' or 'plain'; fixed up front so a cold start does not probe each transport
+LDAP_TRANSPORT = os.environ.get("LDAP_TRANSPORT", "ldaps")
+LDAP_SSL_PORT = int(os.environ.get("LDAP_SSL_PORT", "636"))
+LDAP_IGNORE_CERT = os.environ.get("LDAP_IGNORE_CERT", "false").lower() in ("1", "true", "yes")
+
+# Page size used when walking the whole listing, and the largest page a client may request
+LDAP_PAGE_SIZE = int(os.environ.get("LDAP_PAGE_SIZE", "500"))
+LDAP_MAX_PAGE_SIZE = int(os.environ.get("LDAP_MAX_PAGE_SIZE", "1000"))
+
+GROUP_FILTER = '(objectClass=group)'
+PAGED_RESULTS_OID = '1.2.840.113556.1.4.319'
+
+# Same projection as the backend's util.group_search_attributes
+group_search_attributes = [
+    "cn",
+    "distinguishedName",
+    "name",
+    "objectCategory",
+    "objectGUID",
+    "objectSid",
+    "description",
+    "member",
+    "objectClass",
+    "sAMAccountName",
+    "whenCreated",
+    "whenChanged"
+]
+
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+# `fields` may only name these, in any case
+_KNOWN_ATTRIBUTES = {name.lower(): name for name in group_search_attributes}
+
+# Kept between invocations of a warm container
+_connection = None
+_cold_start = True
+
+
+def _text(value):
+    try:
+        return value.decode('utf-8')
+    except UnicodeDecodeError:
+        return base64.b64encode(value).decode('ascii')
+
+
+def _guid(value):
+    if len(value) != 16:
+        return _text(value)
+    return '{' + str(uuid.UUID(bytes_le=value)) + '}'
+
+
+def _sid(value):
+    try:
+        sub_authorities = struct.unpack_from(f'<{value[1]}I', value, 8)
+    except (IndexError, struct.error):
+        return _text(value)
+    authority = int.from_bytes(value[2:8], 'big')
+    return f'S-{value[0]}-{authority}' + ''.join(f'-{sub}' for sub in sub_authorities)
+
+
+def _generalized_time(value):
+    text = value.decode('ascii', 'replace')
+    if len(text) < 15 or text[-1] != 'Z' or not text[:14].isdigit():
+        return text
+    return f'{text[0:4]}-{text[4:6]}-{text[6:8]}T{text[8:10]}:{text[10:12]}:{text[12:14]}Z'
+
+
+# Decoded like the backend's serializer.py; anything else is UTF-8 text
+_DECODERS = {
+    'objectguid': _guid,
+    'objectsid': _sid,
+    'whencreated': _generalized_time,
+    'whenchanged': _generalized_time,
+}
+_MULTI_VALUED = {'member', 'memberof', 'objectclass', 'proxyaddresses'}
+
+
+def entry_to_dict(entry, attributes):
+    """
+    One raw search response entry as a JSON-ready dict of `attributes`.
+    """
+    item = {}
+    names = {name.lower(): name for name in attributes}
+    for raw_name, values in entry['raw_attributes'].items():
+        key = raw_name.lower()
+        decode = _DECODERS.get(key, _text)
+        decoded = [decode(value) for value in values or ()]
+        multi = key in _MULTI_VALUED
+        item[names.get(key, raw_name)] = decoded if multi or len(decoded) > 1 else (decoded[0] if decoded else None)
+    for key, name in names.items():
+        if name not in item:
+            item[name] = [] if key in _MULTI_VALUED else None
+    return item
+
+
+def _connect():
+    """
+    Opens and binds a new connection with the configured transport.
+    """
+    if LDAP_TRANSPORT == 'ldaps':
+        tls = Tls(validate=ssl.CERT_NONE) if LDAP_IGNORE_CERT else Tls()
+        server = Server(LDAP_SERVER, port=LDAP_SSL_PORT, use_ssl=True, tls=tls, get_info=NONE, connect_timeout=5)
+        return Connection(server, user=USER_DN, password=PASSWORD, auto_bind=True)
+    server = Server(LDAP_SERVER, port=389, get_info=NONE, connect_timeout=5)
+    conn = Connection(server, user=USER_DN, password=PASSWORD, auto_bind=False)
+    conn.open()
+    if LDAP_TRANSPORT == 'starttls' and not conn.start_tls():
+        raise Exception("StartTLS not supported or failed")
+    if not conn.bind():
+        raise Exception(f"Bind failed: {conn.result['description']}")
+    return conn
+
+
+def get_connection(timings):
+    """
+    The container's bound connection, opened (and timed in `timings`) only when
+    there is none yet or the previous one was closed.
+    """
+    global _connection
+    if _connection is None or _connection.closed:
+        started = time.perf_counter()
+        _connection = _connect()
+        timings['bind_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return _connection
+
+
+def search_page(conn, attributes, page_size, cookie=None):
+    """
+    One Simple Paged Results page of groups: (groups, next_cookie).
+    """
+    conn.search(BASE_DN_GROUPS, GROUP_FILTER, search_scope=SUBTREE, attributes=attributes,
+                paged_size=page_size, paged_cookie=cookie)
+    groups = [entry_to_dict(entry, attributes) for entry in conn.response or [] if entry.get('type') == 'searchResEntry']
+    controls = conn.result.get('controls') or {}
+    next_cookie = controls.get(PAGED_RESULTS_OID, {}).get('value', {}).get('cookie')
+    return groups, next_cookie or None
+
+
+def fetch_groups(attributes, page_size=None, cookie=None, timings=None):
+    """
+    Every group, or with `page_size` a single page: (groups, next_cookie).
+    A connection the DC dropped while the container was frozen is replaced
+    and the search retried once.
+    """
+    global _connection
+    timings = {} if timings is None else timings
+    for attempt in (1, 2):
+        conn = get_connection(timings)
+        started = time.perf_counter()
+        try:
+            if page_size is not None:
+                groups, next_cookie = search_page(conn, attributes, page_size, cookie)
+            else:
+                groups, next_cookie = [], None
+                while True:
+                    page, next_cookie = search_page(conn, attributes, LDAP_PAGE_SIZE, next_cookie)
+                    groups.extend(page)
+                    if not next_cookie:
+                        break
+        except LDAPCommunicationError:
+            _connection = None
+            if attempt == 2:
+                raise
+            continue
+        timings['search_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return groups, next_cookie
+
+
+def parse_fields(fields):
+    """
+    The attributes named in the comma-separated `fields`, or the default projection.
+    Raises ValueError for attributes outside the default projection.
+    """
+    if not fields:
+        return group_search_attributes
+    attributes = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    unknown = [name for name in attributes if name.lower() not in _KNOWN_ATTRIBUTES]
+    if unknown:
+        raise ValueError(f"Unknown attribute(s) in fields: {', '.join(unknown)}")
+    return attributes
+
+
+def _query_key(attributes):
+    raw = json.dumps([BASE_DN_GROUPS, GROUP_FILTER, sorted(name.lower() for name in attributes)], separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(cookie, page_size, attributes):
+    """
+    Wraps a paged-results cookie into an opaque, URL-safe cursor bound to the
+    page size and attributes of the search that produced it.
+    """
+    payload = {
+        'c': base64.b64encode(cookie).decode('ascii'),
+        's': page_size,
+        'q': _query_key(attributes),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, attributes):
+    """
+    (cookie, page_size) of a cursor issued by encode_cursor for the same attributes.
+    Raises ValueError for a malformed cursor or one issued for another query.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode((cursor + '=' * (-len(cursor) % 4)).encode('ascii')))
+        cookie = base64.b64decode(payload['c'], validate=True)
+        page_size = int(payload['s'])
+        query_key = payload['q']
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if not cookie or query_key != _query_key(attributes):
+        raise ValueError("Cursor does not belong to this query")
+    return cookie, page_size
+
+
+def parse_paging(params, attributes):
+    """
+    (page_size, cookie) from the `page_size` and `cursor` query parameters;
+    page_size is None when the whole listing was asked for.
+    Raises ValueError for an invalid page size or cursor.
+    """
+    page_size = params.get('page_size')
+    cursor = params.get('cursor')
+    cookie = None
+    if page_size is not None:
+        try:
+            page_size = int(page_size)
+        except (TypeError, ValueError):
+            raise ValueError("page_size must be an integer")
+    if cursor:
+        cookie, cursor_page_size = decode_cursor(cursor, attributes)
+        if page_size is not None and page_size != cursor_page_size:
+            raise ValueError(f"Cursor was issued for page_size {cursor_page_size}")
+        page_size = cursor_page_size
+    if page_size is None:
+        return None, None
+    if not 1 <= page_size <= LDAP_MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {LDAP_MAX_PAGE_SIZE}")
+    return page_size, cookie
+
+
+def response(status, body):
+    return {
+        'statusCode': status,
+        'headers': HEADERS,
+        'body': json.dumps(body)
+    }
 
 
 def handler(event, context):
     """
     Lambda handler for get-groups function
-    
+
+    Query string parameters, as for GET /groups:
+        page_size, cursor: return one page as { items: [...], next_cursor: str|null }
+        fields: comma-separated attributes (out of the default projection) to return instead of all of it
+
     Args:
-        event: Lambda event
+        event: Lambda event (API Gateway proxy)
         context: Lambda context
-        
+
     Returns:
         Lambda response
     """
+    global _cold_start
+    timings = {'cold_start': _cold_start}
+    if _cold_start:
+        timings['import_ms'] = IMPORT_MS
+        _cold_start = False
+    started = time.perf_counter()
     try:
-        # Your function logic here
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'message': 'Success from get-groups'})
-        }
+        params = (event or {}).get('queryStringParameters') or {}
+        attributes = parse_fields(params.get('fields'))
+        page_size, cookie = parse_paging(params, attributes)
+        groups, next_cookie = fetch_groups(attributes, page_size, cookie, timings)
+        timings['groups'] = len(groups)
+        if page_size is None:
+            return response(200, groups)
+        next_cursor = encode_cursor(next_cookie, page_size, attributes) if next_cookie else None
+        return response(200, {'items': groups, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return response(400, {'error': str(e)})
     except Exception as e:
         print(f"Error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
+        return response(500, {'error': str(e)})
+    finally:
+        timings['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        print(json.dumps({'message': 'get-groups invocation', **timings}))
+
+
+IMPORT_MS = round((time.perf_counter() - _import_started) * 1000, 2)